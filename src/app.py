@@ -1,6 +1,7 @@
 import sys
 import platform
 import os
+import multiprocessing
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtCore import Qt
 import qt_main_window as mw
@@ -31,4 +32,6 @@ def main():
     os.environ["APP_INSTANCE_RUNNING"] = "0"
 
 if __name__ == "__main__":
+    # Lets the frozen executable act as a spawned training worker
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
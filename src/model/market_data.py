@@ -0,0 +1,179 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import pandas as pd
+import yfinance as yf
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), 'market_cache')
+DEFAULT_TTL = timedelta(hours=12)
+MEMORY_CACHE_SIZE = 256
+# Seconds Yahoo Finance gets to answer a single history request
+FETCH_TIMEOUT = 10
+
+PERIODS = {
+    '1d': pd.DateOffset(days=1),
+    '5d': pd.DateOffset(days=5),
+    '1mo': pd.DateOffset(months=1),
+    '3mo': pd.DateOffset(months=3),
+    '6mo': pd.DateOffset(months=6),
+    '1y': pd.DateOffset(years=1),
+    '2y': pd.DateOffset(years=2),
+    '5y': pd.DateOffset(years=5),
+}
+
+# In-process LRU of cache entries keyed by (ticker, interval). Each entry is a dict with
+# the fetched frame, the date range it covers and when it was fetched.
+_memory_cache = OrderedDict()
+_memory_lock = threading.Lock()
+_key_locks = {}
+
+def _normalize_date(value):
+    if value is None:
+        return None
+    value = pd.Timestamp(value)
+    if value.tzinfo is not None:
+        value = value.tz_localize(None)
+    return value.normalize()
+
+def _cache_path(ticker, interval, cache_dir):
+    safe_ticker = ticker.replace('^', '_').replace('/', '_')
+    return os.path.join(cache_dir, f"{safe_ticker}_{interval}.pkl")
+
+def _key_lock(key):
+    with _memory_lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+def _remember(key, entry):
+    with _memory_lock:
+        _memory_cache[key] = entry
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+
+def _recall(key):
+    with _memory_lock:
+        entry = _memory_cache.get(key)
+        if entry is not None:
+            _memory_cache.move_to_end(key)
+        return entry
+
+def _is_fresh(entry, ttl):
+    # Entries expire after the ttl and never outlive the day they were fetched on
+    now = datetime.now()
+    fetched_at = entry['fetched_at']
+    return fetched_at.date() == now.date() and now - fetched_at < ttl
+
+def _covers(entry, start, end):
+    if start is not None and (entry['start'] is None or start < entry['start']):
+        return False
+    if entry['end'] is None:
+        return True
+    return end is not None and end <= entry['end']
+
+def _slice(data, start, end):
+    if data.empty:
+        return data
+    index = data.index
+    if index.tz is not None:
+        start = start.tz_localize(index.tz) if start is not None else None
+        end = end.tz_localize(index.tz) if end is not None else None
+    mask = pd.Series(True, index=index)
+    if start is not None:
+        mask &= index >= start
+    if end is not None:
+        mask &= index < end
+    return data[mask.values].copy()
+
+def fetch_history(ticker, start=None, end=None, interval='1d', timeout=FETCH_TIMEOUT) -> pd.DataFrame:
+    '''
+    Requests price history from Yahoo Finance, bypassing the cache. Raises when the
+    request fails or returns no bars, which yfinance otherwise reports as an empty frame.
+    '''
+    kwargs = {'interval': interval, 'timeout': timeout, 'raise_errors': True}
+    if start is not None:
+        kwargs['start'] = start.strftime('%Y-%m-%d')
+    else:
+        kwargs['period'] = 'max'
+    if end is not None:
+        kwargs['end'] = end.strftime('%Y-%m-%d')
+    data = yf.Ticker(ticker).history(**kwargs)
+    if data.empty:
+        raise ValueError(f"No price history returned for {ticker}")
+    return data
+
+def get_history(ticker, start=None, end=None, interval='1d', period=None, ttl=DEFAULT_TTL, cache_dir=CACHE_DIR, timeout=FETCH_TIMEOUT) -> pd.DataFrame:
+    '''
+    Returns price history for a ticker between start (inclusive) and end (exclusive),
+    or for a yfinance style period such as "1mo" ending today.
+    Results are served from an in-process LRU, then from the on-disk cache, and only
+    fetched from Yahoo Finance when neither holds a fresh entry covering the range.
+    A failed or empty fetch raises and is never cached.
+    '''
+    if period is not None:
+        if period not in PERIODS:
+            raise ValueError(f"Unsupported period: {period}")
+        start = _normalize_date(datetime.now()) - PERIODS[period]
+        end = None
+    start = _normalize_date(start)
+    end = _normalize_date(end)
+
+    key = (ticker, interval)
+    with _key_lock(key):
+        entry = _recall(key)
+        if entry is None or not _is_fresh(entry, ttl):
+            path = _cache_path(ticker, interval, cache_dir)
+            if os.path.exists(path):
+                try:
+                    entry = pd.read_pickle(path)
+                except Exception as e:
+                    print(f"Could not read cached history for {ticker}: {e}")
+
+        if entry is not None and _is_fresh(entry, ttl) and _covers(entry, start, end):
+            _remember(key, entry)
+            return _slice(entry['data'], start, end)
+
+        # Widen the request to also cover what is already cached so the new entry
+        # serves every range requested so far today
+        fetch_start, fetch_end = start, end
+        if entry is not None and _is_fresh(entry, ttl):
+            if fetch_start is not None and entry['start'] is not None:
+                fetch_start = min(fetch_start, entry['start'])
+            else:
+                fetch_start = None
+            if fetch_end is not None and entry['end'] is not None:
+                fetch_end = max(fetch_end, entry['end'])
+            else:
+                fetch_end = None
+
+        data = fetch_history(ticker, fetch_start, fetch_end, interval, timeout=timeout)
+        entry = {
+            'data': data,
+            'start': fetch_start,
+            'end': fetch_end,
+            'fetched_at': datetime.now(),
+        }
+        _remember(key, entry)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            pd.to_pickle(entry, _cache_path(ticker, interval, cache_dir))
+        except Exception as e:
+            print(f"Could not cache history for {ticker}: {e}")
+        return _slice(data, start, end)
+
+def get_latest_close(ticker, **kwargs) -> float:
+    '''
+    Returns the most recent close for a ticker using the cached 1 month history
+    '''
+    try:
+        hist = get_history(ticker, period='1mo', **kwargs)
+    except Exception as e:
+        print(f"Could not fetch the latest close for {ticker}: {e}")
+        return 0
+    if hist.empty:
+        return 0
+    return float(hist['Close'].iloc[-1])
+
+def clear_memory_cache():
+    with _memory_lock:
+        _memory_cache.clear()
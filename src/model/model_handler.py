@@ -1,20 +1,31 @@
 import os
+import time
 import logging
 import pickle
+import numpy as np
 import pandas as pd
-import yfinance as yf
-from model.quantitative.quant_model import preprocess_ticker_data
+from datetime import timedelta
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait
+from model import market_data
+from model.quantitative import feature_state, price_store
+from model.quantitative.quant_model import preprocess_ticker_data, preprocess_panel, FEATURE_COLUMNS
 
 # Suppress TensorFlow logs
 import absl.logging
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 absl.logging.set_verbosity(absl.logging.ERROR)
 
+PREFETCH_WORKERS = 16
+FETCH_RETRIES = 3
+BACKOFF_BASE = 2.0
+# History the one-month fallback in feature_matrix and latest_features needs
+RECENT_PERIOD = pd.DateOffset(months=1)
+
 def get_recent_data(ticker, period="1mo"):
     """Fetch the last 30 days of stock data for the given ticker."""
     try:
-        stock = yf.Ticker(ticker)
-        hist = stock.history(period=period)
+        hist = market_data.get_history(ticker, period=period)
         if hist.empty:
             raise ValueError(f"No data found for ticker {ticker}")
         return hist
@@ -30,20 +41,151 @@ def preprocess_for_prediction(recent_data):
 
     processed_data = preprocess_ticker_data(recent_data)
 
-    feature_columns = ['Return_Lag1', 'Return_Lag2', 'Return_Lag3', 'Return_Lag4',
-                       'ROC_5', 'MA_Return_5', 'Volatility_5', 'Volatility_10',
-                       'RSI', 'OBV', 'MACD', 'MACD_Signal']
+    feature_columns = FEATURE_COLUMNS
     latest_features = processed_data[feature_columns].iloc[-1]
 
     return pd.DataFrame([latest_features], columns=feature_columns)  # Return as DataFrame
 
+def preprocess_panel_for_prediction(recent_data):
+    """Build the latest feature row for every ticker in a {ticker: history} dict at once."""
+    panel = preprocess_panel(recent_data)
+    latest_features = {ticker: frame[FEATURE_COLUMNS].iloc[-1] for ticker, frame in panel.items() if not frame.empty}
+    return pd.DataFrame.from_dict(latest_features, orient='index', columns=FEATURE_COLUMNS)
+
+def incremental_features(ticker):
+    """Advance the saved feature state by the bars since its last date and return the latest features."""
+    state = feature_state.load_state(ticker)
+    if state is None:
+        state = feature_state.init_state(price_store.read_ticker(ticker))
+
+    start = pd.Timestamp(state['last_date']) + timedelta(days=1)
+    new_bars = pd.DataFrame(columns=['Close', 'Volume'])
+    if start <= pd.Timestamp.today().normalize():
+        new_bars = market_data.get_history(ticker, start=start)
+    committed, latest = feature_state.apply_bars(state, new_bars)
+    feature_state.save_state(ticker, committed)
+    return pd.DataFrame([feature_state.state_features(latest)], columns=FEATURE_COLUMNS)
+
+def latest_features(ticker):
+    """Return the latest feature row for a ticker, incrementally when possible."""
+    try:
+        return incremental_features(ticker)
+    except Exception as e:
+        # No usable state or stored history, recompute from the last month instead
+        logging.warning(f"Incremental features unavailable for {ticker}, recomputing: {e}")
+        recent_data = get_recent_data(ticker)
+        return preprocess_for_prediction(recent_data)
+
 def predict_ticker(ticker, model):
     """Fetch, preprocess, and predict for a single ticker."""
     try:
-        recent_data = get_recent_data(ticker)
-        input_features = preprocess_for_prediction(recent_data)
+        input_features = latest_features(ticker)
         prediction = model.predict(input_features)[0]
         return prediction
     except Exception as e:
         logging.error(f"Error predicting for {ticker}: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def prefetch_start(ticker, manifest=None):
+    """First date whose bars the features of a ticker need, covering the one-month fallback too."""
+    today = pd.Timestamp.today().normalize()
+    start = today - RECENT_PERIOD
+    state = feature_state.load_state(ticker)
+    last_date = state['last_date'] if state else price_store.last_date(ticker, manifest=manifest)
+    if last_date is not None:
+        start = min(start, pd.Timestamp(last_date) + timedelta(days=1))
+    return start
+
+def fetch_recent(ticker, retries=FETCH_RETRIES, timeout=market_data.FETCH_TIMEOUT, manifest=None):
+    """Fetch the recent bars of a ticker into the market data cache, retrying failed requests."""
+    start = time.perf_counter()
+    for attempt in range(1, retries + 1):
+        try:
+            bars = market_data.get_history(ticker, start=prefetch_start(ticker, manifest), timeout=timeout)
+            elapsed = time.perf_counter() - start
+            logging.info(f"Prefetched {len(bars)} bars for {ticker} in {elapsed:.2f}s (attempt {attempt})")
+            return elapsed
+        except Exception as e:
+            if attempt == retries:
+                raise
+            logging.warning(f"Fetch for {ticker} failed on attempt {attempt}, retrying: {e}")
+            time.sleep(BACKOFF_BASE ** (attempt - 1))
+
+def _seconds_left(deadline):
+    return None if deadline is None else max(0.0, (deadline - datetime.now()).total_seconds())
+
+def prefetch(tickers, max_workers=PREFETCH_WORKERS, retries=FETCH_RETRIES, timeout=market_data.FETCH_TIMEOUT, deadline=None):
+    """
+    Fetch the recent bars of every ticker concurrently so building features only reads the cache.
+    Fetches still running at the deadline are abandoned.
+    Returns the fetch latency in seconds of every ticker that succeeded.
+    """
+    tickers = list(tickers)
+    if not tickers:
+        return {}
+    start = time.perf_counter()
+    latencies = {}
+    manifest = price_store.read_manifest()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {ticker: executor.submit(fetch_recent, ticker, retries, timeout, manifest) for ticker in tickers}
+    wait(futures.values(), timeout=_seconds_left(deadline))
+    for ticker, future in futures.items():
+        if not future.done():
+            logging.warning(f"Prefetch for {ticker} did not finish before the deadline")
+            continue
+        try:
+            latencies[ticker] = future.result()
+        except Exception as e:
+            logging.error(f"Could not prefetch data for {ticker}: {e}")
+    # Do not block on fetches that outlived the deadline
+    executor.shutdown(wait=deadline is None, cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    if latencies:
+        values = np.array(list(latencies.values()))
+        logging.info(f"Prefetched {len(latencies)}/{len(tickers)} tickers in {elapsed:.1f}s, latency "
+                     f"p50 {np.percentile(values, 50):.2f}s, p95 {np.percentile(values, 95):.2f}s, max {values.max():.2f}s")
+    return latencies
+
+def feature_matrix(tickers, prefetch_data=True, deadline=None):
+    """
+    Build the latest feature row of every ticker into one frame indexed by ticker.
+    Tickers without usable feature state are recomputed from their last month together, as one panel.
+    """
+    if prefetch_data:
+        fetched = prefetch(tickers, deadline=deadline)
+        if deadline is not None and datetime.now() >= deadline:
+            # Only what is already cached can still be used
+            tickers = [ticker for ticker in tickers if ticker in fetched]
+    rows = {}
+    recent_data = {}
+    for ticker in tickers:
+        try:
+            rows[ticker] = incremental_features(ticker).iloc[0]
+        except Exception as e:
+            logging.warning(f"Incremental features unavailable for {ticker}, recomputing: {e}")
+            try:
+                recent_data[ticker] = get_recent_data(ticker)
+            except Exception as e:
+                logging.error(f"Error preparing features for {ticker}: {e}")
+    if recent_data:
+        try:
+            recomputed = preprocess_panel_for_prediction(recent_data)
+        except Exception as e:
+            logging.error(f"Error recomputing features for {len(recent_data)} tickers: {e}")
+            recomputed = pd.DataFrame(columns=FEATURE_COLUMNS)
+        for ticker in recent_data:
+            if ticker in recomputed.index:
+                rows[ticker] = recomputed.loc[ticker]
+            else:
+                logging.error(f"Error preparing features for {ticker}: too little recent history")
+    ordered = [ticker for ticker in tickers if ticker in rows]
+    return pd.DataFrame([rows[ticker] for ticker in ordered], index=ordered, columns=FEATURE_COLUMNS)
+
+def predict_global(tickers, model, deadline=None, features=None):
+    """Predict every ticker with the global model in a single predict call, on features from feature_matrix when given."""
+    input_features = feature_matrix(tickers, deadline=deadline) if features is None else features
+    if input_features.empty:
+        return {}
+    predictions = model.predict(input_features)
+    return dict(zip(input_features.index, predictions))
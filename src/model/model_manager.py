@@ -1,30 +1,138 @@
 import pandas as pd
+import numpy as np
 import os
 import pickle
 import logging
 #import model_handler as mh
 from model import model_handler as mh
+from model.quantitative import model_store
 import sys
+from datetime import datetime
 
 # Ensure logs directory exists
 LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'logs')
 os.makedirs(LOG_DIR, exist_ok=True)
 
+# Tickers scored and written together before the deadline is checked again
+DECISION_CHUNK_SIZE = 50
+
 class ModelManager:
-    def __init__(self, sentiment_file, quant_model_dir, quant_weight=0.85, qual_weight=0.15):
+    def __init__(self, sentiment_file, quant_model_dir, quant_weight=0.85, qual_weight=0.15, use_global_model=False):
         self.sentiment_file = sentiment_file
         self.quant_model_dir = quant_model_dir
+        self.use_global_model = use_global_model
         self.quant_weight = quant_weight
         self.qual_weight = qual_weight
         self.sentiments = self.load_sentiments()
+        self.global_model = None
+
+    def model_tickers(self):
+        """Tickers with a trained per-ticker model."""
+        return [f.split("_")[0] for f in os.listdir(self.quant_model_dir) if f.endswith('.pkl')]
 
-    def model_generator(self):
-        """Generator to load models one by one."""
+    def model_generator(self, tickers=None):
+        """Generator to load models one by one, from the compact format when it is up to date."""
+        compact_dir = os.path.join(self.quant_model_dir, 'compact')
         model_files = [f for f in os.listdir(self.quant_model_dir) if f.endswith('.pkl')]
         for file in model_files:
             ticker = file.split("_")[0]
-            with open(os.path.join(self.quant_model_dir, file), 'rb') as f:
-                yield ticker, pickle.load(f)
+            if tickers is not None and ticker not in tickers:
+                continue
+            pickle_path = os.path.join(self.quant_model_dir, file)
+            model = None
+            if model_store.is_current(ticker, pickle_path, compact_dir):
+                try:
+                    model = model_store.load_compact(ticker, compact_dir)
+                except Exception as e:
+                    logging.warning(f"Could not load compact model for {ticker}, using the pickle: {e}")
+            if model is None:
+                with open(pickle_path, 'rb') as f:
+                    model = pickle.load(f)
+            yield ticker, model
+
+    def load_global_model(self):
+        """Load the single model trained on every ticker."""
+        path = os.path.join(self.quant_model_dir, 'global', 'global_quant_model.pkl')
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Global model not found: {path}")
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def universe(self):
+        """Tickers that decisions can be made for."""
+        if self.use_global_model:
+            if self.global_model is None:
+                self.global_model = self.load_global_model()
+            return list(self.global_model.tickers)
+        return self.model_tickers()
+
+    def prioritize(self, tickers, priority_tickers=None, previous_file=None):
+        """
+        Order tickers by urgency: the given priority tickers (e.g. open positions) first,
+        then by the strength of their last decision score, then the rest.
+        """
+        priority_tickers = [str(ticker) for ticker in (priority_tickers or [])]
+        last_scores = pd.Series(dtype=float)
+        if previous_file and os.path.exists(previous_file):
+            try:
+                previous = pd.read_csv(previous_file)
+                last_scores = previous.set_index(previous['ticker'].astype(str))['decision_score'].abs()
+            except Exception as e:
+                logging.warning(f"Could not read previous decisions for prioritizing: {e}")
+
+        order = pd.DataFrame({'ticker': [str(ticker) for ticker in tickers]})
+        order['held'] = order['ticker'].isin(priority_tickers)
+        order['last_score'] = order['ticker'].map(last_scores).fillna(-1)
+        # Stable sort keeps the model directory order among equals
+        order = order.sort_values(['held', 'last_score'], ascending=False, kind='stable')
+        return list(order['ticker'])
+
+    def predictions(self, tickers=None, deadline=None, features=None):
+        """
+        Predict the next-day return of the given tickers (default all), returned as a Series indexed by ticker.
+        features is the mh.feature_matrix frame of the tickers, built here when it is not given.
+        """
+        tickers = list(tickers) if tickers is not None else self.universe()
+        if self.use_global_model:
+            if self.global_model is None:
+                self.global_model = self.load_global_model()
+            return pd.Series(mh.predict_global(tickers, self.global_model, deadline=deadline, features=features), dtype=float)
+
+        # Build every feature row first so no model waits on a fetch
+        if features is None:
+            features = mh.feature_matrix(tickers, deadline=deadline)
+        predictions = {}
+        for ticker, model in self.model_generator(tickers):
+            ticker = str(ticker)
+            if ticker not in features.index:
+                continue
+            try:
+                predictions[ticker] = model.predict(features.loc[[ticker]])[0]
+            except Exception as e:
+                logging.error(f"Error predicting for {ticker}: {e}")
+        return pd.Series(predictions, dtype=float)
+
+    def score_decisions(self, predictions):
+        """Blend predicted returns with sentiment scores and pick an action for every ticker at once."""
+        decisions = pd.DataFrame({'next_day_return': predictions})
+        decisions['sentiment_score'] = self.sentiments['sentiment_score'].reindex(decisions.index)
+
+        missing = decisions.index[decisions['sentiment_score'].isna()]
+        for ticker in missing:
+            logging.warning(f"No sentiment score found for {ticker}. Skipping.")
+        decisions = decisions.drop(missing)
+
+        decisions['decision_score'] = (
+            self.quant_weight * (decisions['next_day_return'] * 100) +
+            self.qual_weight * decisions['sentiment_score']
+        )
+        decisions['action'] = np.select(
+            [decisions['decision_score'] > 1, decisions['decision_score'] < 0],
+            ["Buy", "Sell"],
+            default="Hold"
+        )
+        decisions.index.name = 'ticker'
+        return decisions.reset_index()
 
     def load_sentiments(self):
         """Load sentiment scores from the CSV."""
@@ -36,49 +144,42 @@ class ModelManager:
         print(f"Loaded sentiment scores for {len(sentiments)} tickers. Index type: {sentiments.index.dtype}")
         return sentiments
 
-    def make_decisions(self, output_file):
-        """Make buy/sell/hold decisions and save them incrementally."""
+    def make_decisions(self, output_file, deadline=None, priority_tickers=None, chunk_size=DECISION_CHUNK_SIZE):
+        """
+        Make buy/sell/hold decisions in priority order. The bars of every ticker are fetched
+        concurrently and their features built once, within the deadline (a datetime), then
+        tickers are predicted and streamed to the CSV chunk by chunk. Once the deadline passes
+        no new chunk is started, so the decisions written so far can be handed off on time.
+        The global model predicts every ticker in one call up front.
+        Returns the number of decisions written.
+        """
+        tickers = self.prioritize(self.universe(), priority_tickers, output_file)
+        features = mh.feature_matrix(tickers, deadline=deadline)
+        if self.use_global_model:
+            all_predictions = self.predictions(tickers, deadline, features)
+        written = 0
         with open(output_file, 'w') as f:
             # Write header
             f.write("ticker,next_day_return,sentiment_score,decision_score,action\n")
-            
-            # Process models one by one
-            for ticker, model in self.model_generator():
-                ticker = str(ticker)
-                print(f"Processing model for ticker: {ticker}")
-                try:
-                    # Predict next-day return
-                    next_day_return = mh.predict_ticker(ticker, model)
-                    print(f"Predicted next day return for {ticker} is {next_day_return*100}%")
-                except Exception as e:
-                    logging.error(f"Error predicting for {ticker}: {e}")
-                    continue
+            f.flush()
 
-                # Get sentiment score
-                try:
-                    sentiment_score = self.sentiments.loc[ticker, 'sentiment_score']
-                    print(f"News sentiment score for {ticker} is {sentiment_score}")
-                except KeyError:
-                    logging.warning(f"No sentiment score found for {ticker}. Skipping.")
-                    continue
-
-                # Compute decision score
-                decision_score = (
-                    self.quant_weight * (next_day_return*100) +
-                    self.qual_weight * sentiment_score
-                )
-                print(f"Decision score for {ticker} is {decision_score}")
-
-                # Determine action
-                if decision_score > 1:
-                    action = "Buy"
-                elif decision_score < 0:
-                    action = "Sell"
+            for i in range(0, len(tickers), chunk_size):
+                if i > 0 and deadline is not None and datetime.now() >= deadline:
+                    logging.warning(f"Decision deadline reached, handing off {written} decisions "
+                                    f"with {len(tickers) - i} tickers left unprocessed")
+                    break
+                chunk = tickers[i:i + chunk_size]
+                if self.use_global_model:
+                    predictions = all_predictions.reindex(chunk)
                 else:
-                    action = "Hold"
+                    predictions = self.predictions(chunk, deadline, features[features.index.isin(chunk)])
+                decisions = self.score_decisions(predictions.dropna())
+                f.write(decisions.to_csv(header=False, index=False, lineterminator='\n'))
+                f.flush()
+                written += len(decisions)
 
-                # Write decision to file
-                f.write(f"{ticker},{next_day_return},{sentiment_score},{decision_score},{action}\n")
+        print(f"Scored decisions for {written} of {len(tickers)} tickers")
+        return written
 
 if __name__ == "__main__" and not hasattr(sys, 'frozen'):
     try:
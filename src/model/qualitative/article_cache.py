@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime, timedelta
+
+CACHE_PATH = os.path.join(os.path.dirname(__file__), 'article_cache.sqlite')
+# Entries not seen in an RSS feed for this long are evicted
+MAX_AGE = timedelta(days=14)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    link TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    article_text TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    last_seen TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sentiments (
+    content_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    label TEXT NOT NULL,
+    score REAL,
+    last_seen TEXT NOT NULL,
+    PRIMARY KEY (content_hash, model)
+);
+CREATE TABLE IF NOT EXISTS ticker_articles (
+    ticker TEXT NOT NULL,
+    link TEXT NOT NULL,
+    published REAL NOT NULL,
+    polarity INTEGER NOT NULL,
+    confidence REAL NOT NULL,
+    PRIMARY KEY (ticker, link)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ticker_sentiment (
+    ticker TEXT PRIMARY KEY,
+    weighted_sum REAL NOT NULL,
+    weight_total REAL NOT NULL,
+    as_of REAL NOT NULL
+);
+"""
+
+def content_hash(text:str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+class ArticleCache:
+    '''
+    Persistent cache of cleaned article texts keyed by link, and of sentiment results
+    keyed by the hash of the text, so an article listed under several tickers or on
+    several days is only downloaded and scored once. Safe to share between threads.
+    '''
+    def __init__(self, path=CACHE_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def get_text(self, link:str):
+        '''
+        Returns the cached text of an article, or None if it has not been fetched
+        '''
+        with self.lock, self.connection:
+            row = self.connection.execute("SELECT article_text FROM articles WHERE link = ?", (link,)).fetchone()
+            if row is not None:
+                self.connection.execute("UPDATE articles SET last_seen = ? WHERE link = ?", (_now(), link))
+        return row[0] if row is not None else None
+
+    def put_text(self, link:str, article_text:str):
+        now = _now()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO articles (link, content_hash, article_text, fetched_at, last_seen) VALUES (?, ?, ?, ?, ?)",
+                (link, content_hash(article_text), article_text, now, now))
+
+    def get_sentiments(self, hashes, model:str) -> dict:
+        '''
+        Returns {content_hash: {'label', 'score'}} for the hashes already scored by the model,
+        a key naming both the model and the backend it ran on
+        '''
+        hashes = list(set(hashes))
+        found = {}
+        now = _now()
+        with self.lock, self.connection:
+            # Stay well below SQLite's bound parameter limit
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self.connection.execute(
+                    f"SELECT content_hash, label, score FROM sentiments WHERE model = ? AND content_hash IN ({placeholders})",
+                    [model] + chunk).fetchall()
+                found.update({row[0]: {'label': row[1], 'score': row[2]} for row in rows})
+                self.connection.execute(
+                    f"UPDATE sentiments SET last_seen = ? WHERE model = ? AND content_hash IN ({placeholders})",
+                    [now, model] + chunk)
+        return found
+
+    def put_sentiments(self, results:dict, model:str):
+        '''
+        Stores {content_hash: {'label', 'score'}} sentiment results for a model
+        '''
+        now = _now()
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO sentiments (content_hash, model, label, score, last_seen) VALUES (?, ?, ?, ?, ?)",
+                [(key, model, result['label'], result.get('score'), now) for key, result in results.items()])
+
+    def add_ticker_articles(self, ticker:str, articles, now=None, max_age=MAX_AGE):
+        '''
+        Records the scored articles of a ticker, a frame with link, published (unix seconds),
+        polarity and confidence columns, and returns the rows that were not recorded before.
+        Articles published before the eviction cutoff are left out, evict() would drop their
+        rows again while the feed keeps listing them and they would be counted every run.
+        '''
+        now = datetime.now().timestamp() if now is None else now
+        articles = articles[articles['published'] >= now - max_age.total_seconds()]
+        links = articles['link'].tolist()
+        with self.lock, self.connection:
+            known = set()
+            for i in range(0, len(links), 500):
+                chunk = links[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                known.update(row[0] for row in self.connection.execute(
+                    f"SELECT link FROM ticker_articles WHERE ticker = ? AND link IN ({placeholders})", [ticker] + chunk))
+            new = articles[~articles['link'].isin(known)].drop_duplicates('link')
+            self.connection.executemany(
+                "INSERT INTO ticker_articles (ticker, link, published, polarity, confidence) VALUES (?, ?, ?, ?, ?)",
+                [(ticker, row.link, float(row.published), int(row.polarity), float(row.confidence)) for row in new.itertuples()])
+        return new
+
+    def get_ticker_state(self, ticker:str):
+        '''
+        Returns the (weighted_sum, weight_total, as_of) sentiment state of a ticker, or None
+        '''
+        with self.lock:
+            return self.connection.execute(
+                "SELECT weighted_sum, weight_total, as_of FROM ticker_sentiment WHERE ticker = ?", (ticker,)).fetchone()
+
+    def put_ticker_state(self, ticker:str, weighted_sum:float, weight_total:float, as_of:float):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO ticker_sentiment (ticker, weighted_sum, weight_total, as_of) VALUES (?, ?, ?, ?)",
+                (ticker, weighted_sum, weight_total, as_of))
+
+    def evict(self, max_age=MAX_AGE, now=None) -> int:
+        '''
+        Drops entries not seen within max_age and returns how many were removed
+        '''
+        cutoff_time = (now or datetime.now()) - max_age
+        cutoff = cutoff_time.isoformat(timespec='seconds')
+        with self.lock, self.connection:
+            removed = self.connection.execute("DELETE FROM articles WHERE last_seen < ?", (cutoff,)).rowcount
+            removed += self.connection.execute("DELETE FROM sentiments WHERE last_seen < ?", (cutoff,)).rowcount
+            # Their weight has decayed to almost nothing by now, and add_ticker_articles
+            # does not record them again
+            removed += self.connection.execute("DELETE FROM ticker_articles WHERE published < ?", (cutoff_time.timestamp(),)).rowcount
+        return removed
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,97 @@
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+# Requests in flight across every ticker
+MAX_CONNECTIONS = 32
+# Requests in flight to any one site, which also caps its keep-alive pool
+MAX_PER_HOST = 4
+# Larger pages are cut off, article paragraphs come well before this
+MAX_RESPONSE_BYTES = 2_000_000
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 10
+CHUNK_SIZE = 64 * 1024
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/87.0.4280.88 Safari/537.36"
+}
+
+class FetchResponse:
+    def __init__(self, status_code, text, truncated=False):
+        self.status_code = status_code
+        self.text = text
+        self.truncated = truncated
+
+class ArticleFetcher:
+    '''
+    One pooled HTTP session and worker pool shared by every ticker's article downloads.
+    Connections are kept alive per host, and both the total and the per-host number of
+    requests in flight are bounded.
+    '''
+    def __init__(self, max_connections=MAX_CONNECTIONS, max_per_host=MAX_PER_HOST,
+                 max_bytes=MAX_RESPONSE_BYTES, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_per_host)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_connections)
+        self.host_limits = defaultdict(lambda: threading.BoundedSemaphore(max_per_host))
+        self.lock = threading.Lock()
+
+    def _host_limit(self, url):
+        with self.lock:
+            return self.host_limits[urlsplit(url).netloc]
+
+    def get(self, url, on_chunk=None, on_encoding=None) -> FetchResponse:
+        '''
+        Downloads a page, reading at most max_bytes of the body. on_chunk(bytes) is called
+        with each chunk as it arrives and stops the download early by returning True.
+        on_encoding(name) is called before the first chunk when the server declares a charset.
+        '''
+        with self._host_limit(url):
+            with self.session.get(url, timeout=self.timeout, stream=True) as response:
+                if response.status_code != 200:
+                    return FetchResponse(response.status_code, "")
+                # Without a declared charset requests assumes ISO-8859-1 for any text type
+                if on_encoding and response.encoding and 'charset' in response.headers.get('Content-Type', '').lower():
+                    on_encoding(response.encoding)
+                body = bytearray()
+                truncated = False
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    chunk = chunk[:self.max_bytes - len(body)]
+                    body.extend(chunk)
+                    if len(body) >= self.max_bytes or (on_chunk and on_chunk(chunk)):
+                        truncated = True
+                        break
+                encoding = response.encoding or 'utf-8'
+                return FetchResponse(response.status_code, bytes(body).decode(encoding, errors='replace'), truncated)
+
+    def map(self, func, items, on_done=None) -> list:
+        '''
+        Runs func over items on the shared worker pool and returns the results in order.
+        on_done(completed, total) is called as each item finishes.
+        '''
+        items = list(items)
+        results = [None] * len(items)
+        futures = {self.executor.submit(func, item): i for i, item in enumerate(items)}
+        for completed, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]] = future.result()
+            if on_done:
+                on_done(completed, len(items))
+        return results
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,16 +1,56 @@
-import requests
 from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
 from yahoo_fin import news
-from transformers import pipeline
+import torch
 import warnings
 import pandas as pd
-import concurrent.futures
 import unicodedata
+import codecs
 import re
 import pandas as pd
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future
+from collections import defaultdict
 import os
+import threading
+import queue
+import numpy as np
+import time
+from time import perf_counter
+from datetime import timedelta
 from random import uniform
+from model.qualitative import article_cache, sentiment_backends
+from model.qualitative.article_fetcher import ArticleFetcher
+
+SENTIMENT_MODEL = "distilbert/distilbert-base-uncased-finetuned-sst-2-english"
+# DistilBERT's maximum sequence length
+MAX_TOKENS = 512
+SENTIMENT_BATCH_SIZE = 32
+# 'cpu', 'cuda' or 'cuda:<n>', CUDA falls back to the CPU on machines without a GPU
+SENTIMENT_DEVICE = os.environ.get('SENTIMENT_DEVICE', 'cpu')
+# Inference backend, one of sentiment_backends.BACKENDS
+SENTIMENT_BACKEND = os.environ.get('SENTIMENT_BACKEND', 'pytorch')
+SCORES_PATH = os.path.join(os.path.dirname(__file__), 'sentiment_scores.csv')
+# Tickers waiting between two stages of the scoring pipeline
+QUEUE_SIZE = 32
+RSS_WORKERS = 8
+# Tickers whose articles are being downloaded at once, the downloads share the fetcher's pool
+ARTICLE_WORKERS = 4
+# Articles gathered across tickers before the model runs
+SCORE_BATCH = 4 * SENTIMENT_BATCH_SIZE
+# Tickers completed between checkpoints of the scores file
+CHECKPOINT_EVERY = 25
+# Age at which an article counts half as much as a fresh one
+SENTIMENT_HALF_LIFE = timedelta(days=3)
+# Weight of the neutral pseudo-article every ticker's score starts from
+SENTIMENT_PRIOR_WEIGHT = 1.0
+POLARITY = {'POSITIVE': 1, 'NEGATIVE': -1}
+# How article text is pulled out of a page: 'bs4', 'lxml' or 'stream'
+EXTRACTION_BACKEND = os.environ.get('ARTICLE_EXTRACTION_BACKEND', 'lxml')
+# Text the 'stream' backend collects before it stops, comfortably more than the
+# 512 tokens the sentiment model reads
+MAX_ARTICLE_CHARS = 8 * MAX_TOKENS
+STREAM_CHUNK_SIZE = 16 * 1024
 
 filler_texts = [
     "We are experiencing some temporary issues." ,
@@ -36,55 +76,235 @@ filler_texts = [
     "Sign in to access your portfolio"
 ]
 
+# Marks the end of a pipeline stage's input
+_DONE = object()
+
 def news_fetcher_helper(ticker):
     stock_news = news.get_yf_rss(ticker)
     return ticker, pd.DataFrame(stock_news)
 
-def fetch_news():
+def load_tickers() -> list:
     parent_dir = os.path.dirname(os.path.dirname(__file__))
-    ticker_list = None
-
     with open(os.path.join(parent_dir, 'tickers.txt'), 'r') as f:
-        ticker_list = f.read()
-
-    ticker_list = ticker_list.split('\n')
-    ticker_list = [symb.strip() for symb in ticker_list]
-    sn_frames = {}
+        ticker_list = f.read().split('\n')
+    # Blank lines would otherwise be scored as a ticker
+    return [symb.strip() for symb in ticker_list if symb.strip()]
 
-    # Run the news fetching in parallel
-    with ThreadPoolExecutor() as executor:
-        futures = {executor.submit(news_fetcher_helper, t): t for t in ticker_list}
-        for future in as_completed(futures):
-            ticker, df = future.result()
-            sn_frames[ticker] = df
-    return sn_frames
+# After ASCII folding only these bytes are kept: letters, digits, basic punctuation
+# and whitespace. bytes.translate drops the rest in one C pass instead of a regex.
+_DISALLOWED_BYTES = bytes(c for c in range(128) if not (chr(c).isalnum() or chr(c) in ".,;:!?'\"()" or chr(c).isspace()))
+# Alternation in list order, so the first listed filler wins where several match at one position
+FILLER_PATTERN = re.compile('|'.join(map(re.escape, filler_texts)))
 
 def basic_cleanup(text):
-    cleaned_text = unicodedata.normalize('NFKD', text).encode('ascii','ignore').decode('utf-8', 'ignore')
-    cleaned_text = re.sub(r'[^a-zA-Z0-9.,;:!?\'\"()\s]', '', cleaned_text)
-    cleaned_text = re.sub(r'\s+', ' ', cleaned_text).strip()
-    # Create a single regular expression pattern that matches any of the filler texts
-    filler_pattern = '|'.join(map(re.escape, filler_texts))
-    # Pattern to match unnecessary whitespace, tabs, and escape characters
-    whitespace_pattern = r'\s+'
-    cleaned_text = re.sub(whitespace_pattern, ' ', re.sub(filler_pattern,'',cleaned_text)).strip() if isinstance(cleaned_text, str) else cleaned_text
+    ascii_bytes = unicodedata.normalize('NFKD', text).encode('ascii','ignore')
+    cleaned_text = ascii_bytes.translate(None, _DISALLOWED_BYTES).decode('ascii')
+    # Collapse whitespace runs and trim, like re.sub(r'\s+', ' ', text).strip()
+    cleaned_text = ' '.join(cleaned_text.split())
+    cleaned_text, removed = FILLER_PATTERN.subn('', cleaned_text)
+    if removed:
+        cleaned_text = ' '.join(cleaned_text.split())
     return cleaned_text
 
-def add_sentiment(df:pd.DataFrame, sentiment_pipeline):
-    setiments = df['article_text'].apply(lambda text: sentiment_pipeline(text[:1024])[0]['label'] if text != "N/A" else "UNKNOWN")
-    df['sentiment'] = setiments
+def resolve_device(device=None) -> int:
+    '''
+    Turns a device setting into the index the pipeline takes, -1 being the CPU
+    '''
+    device = SENTIMENT_DEVICE if device is None else device
+    if isinstance(device, int):
+        index = device
+    elif device == 'cpu':
+        return -1
+    elif device == 'cuda' or device.startswith('cuda:'):
+        index = int(device.partition(':')[2] or 0)
+    else:
+        raise ValueError(f"Unknown sentiment device: {device}")
+    if index >= 0 and index >= torch.cuda.device_count():
+        print(f"CUDA device {index} is not available, running sentiment on the CPU")
+        return -1
+    return index
+
+def sentiment_key(backend=None, model=SENTIMENT_MODEL) -> str:
+    '''
+    Identifies what produced a sentiment result in the article cache: the model, the backend
+    and for OpenVINO its inference precision, as the backends' scores differ slightly
+    '''
+    backend = backend or SENTIMENT_BACKEND
+    if backend == 'openvino':
+        backend = f"{backend}-{sentiment_backends.OPENVINO_PRECISION}"
+    return f"{model}:{backend}"
+
+def load_sentiment_pipeline(batch_size=SENTIMENT_BATCH_SIZE, device=None, backend=None, model=SENTIMENT_MODEL):
+    '''
+    Builds the sentiment classifier on the configured device and backend. Inputs are truncated to
+    the model's 512 tokens and run in batches of batch_size when it is given a list of texts.
+    '''
+    return sentiment_backends.load_backend(backend or SENTIMENT_BACKEND, model, batch_size,
+                                           resolve_device(device), MAX_TOKENS)
+
+def classify_texts(texts:list, sentiment_pipeline) -> list:
+    '''
+    Returns the sentiment {'label', 'score'} of every text. Texts are fed in order of token
+    length so each batch pads to similar lengths, and the results are put back in input order.
+    '''
+    if not texts:
+        return []
+    tokenizer = getattr(sentiment_pipeline, 'tokenizer', None)
+    if tokenizer is not None:
+        lengths = [len(ids) for ids in tokenizer(texts, truncation=True, max_length=MAX_TOKENS)['input_ids']]
+    else:
+        lengths = [len(text) for text in texts]
+    order = np.argsort(lengths, kind='stable')
+
+    start = perf_counter()
+    results = sentiment_pipeline([texts[i] for i in order])
+    elapsed = perf_counter() - start
+    print(f"Scored {len(texts)} articles in {elapsed:.1f}s ({len(texts) / max(elapsed, 1e-9):.1f} articles/sec)")
+
+    ordered = [None] * len(texts)
+    for i, result in zip(order, results):
+        ordered[i] = {'label': result['label'], 'score': result.get('score')}
+    return ordered
+
+def add_sentiment(df:pd.DataFrame, sentiment_pipeline, cache=None):
+    df['sentiment'] = "UNKNOWN"
+    df['confidence'] = np.nan
+    has_text = df['article_text'] != "N/A"
+    texts = df.loc[has_text, 'article_text'].tolist()
+    hashes = [article_cache.content_hash(text) for text in texts]
+
+    # Only articles the model has not scored before go through the pipeline, each text once.
+    # The pipeline, in process or in the sentiment worker, runs on the configured backend.
+    key = sentiment_key()
+    known = cache.get_sentiments(hashes, key) if cache is not None else {}
+    texts_by_hash = dict(zip(hashes, texts))
+    missing = [key for key in texts_by_hash if key not in known]
+    if known:
+        print(f"Reusing cached sentiment for {len(texts_by_hash) - len(missing)} of {len(texts_by_hash)} articles")
+    scored = dict(zip(missing, classify_texts([texts_by_hash[key] for key in missing], sentiment_pipeline)))
+    if cache is not None and scored:
+        cache.put_sentiments(scored, key)
+
+    results = [known.get(key) or scored[key] for key in hashes]
+    df.loc[has_text, 'sentiment'] = [result['label'] for result in results]
+    df.loc[has_text, 'confidence'] = [result['score'] for result in results]
     return df
 
-def get_article_text(url):
+_default_fetcher = None
+_default_fetcher_lock = threading.Lock()
+
+def default_fetcher() -> ArticleFetcher:
+    '''
+    Shared fetcher for callers that do not manage their own
+    '''
+    global _default_fetcher
+    with _default_fetcher_lock:
+        if _default_fetcher is None:
+            _default_fetcher = ArticleFetcher()
+        return _default_fetcher
+
+_UTF8_HTML_PARSER = lxml.html.HTMLParser(encoding='utf-8')
+
+class ParagraphStream:
+    '''
+    Incrementally parses HTML bytes and collects <p> text until max_chars are gathered.
+    Bytes are decoded here, so undecodable ones become replacement characters instead
+    of failing the whole page.
+    '''
+    def __init__(self, max_chars=MAX_ARTICLE_CHARS, encoding='utf-8'):
+        self.max_chars = max_chars
+        self.parser = etree.HTMLPullParser(events=('end',), tag='p')
+        self.paragraphs = []
+        self.chars = 0
+        self.fed = False
+        self.set_encoding(encoding)
+
+    def set_encoding(self, encoding):
+        '''
+        Switches the charset the page is decoded with, before anything has been fed
+        '''
+        if self.fed:
+            return
+        try:
+            self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        except LookupError:
+            print(f"Unknown page encoding {encoding}, decoding as utf-8")
+            self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    def _collect(self):
+        for _, element in self.parser.read_events():
+            if self.chars >= self.max_chars:
+                break
+            text = ''.join(element.itertext())
+            self.paragraphs.append(text)
+            self.chars += len(text)
+        return self.chars >= self.max_chars
+
+    def feed(self, chunk:bytes) -> bool:
+        '''
+        Parses a chunk and returns True once enough text has been collected
+        '''
+        self.fed = True
+        self.parser.feed(self.decoder.decode(chunk))
+        return self._collect()
+
+    def close(self) -> bool:
+        '''
+        Ends the page, collecting a trailing paragraph that was never closed
+        '''
+        self.parser.feed(self.decoder.decode(b'', final=True))
+        try:
+            self.parser.close()
+        except etree.XMLSyntaxError:
+            # Raised for a page without any markup
+            pass
+        return self._collect()
+
+    def text(self) -> str:
+        return ' '.join(self.paragraphs)
+
+def extract_paragraphs(html, backend=None, max_chars=MAX_ARTICLE_CHARS) -> str:
+    '''
+    Joins the text of every <p> on a page. 'bs4' is the reference parser, 'lxml' parses
+    the same page several times faster and 'stream' stops once max_chars are collected.
+    '''
+    backend = backend or EXTRACTION_BACKEND
+    if backend == 'bs4':
+        soup = BeautifulSoup(html, 'html.parser')
+        return ' '.join([p.get_text() for p in soup.find_all('p')])
+    if backend == 'lxml':
+        try:
+            # Encoded first, lxml refuses str pages that declare their own encoding
+            document = lxml.html.document_fromstring(html.encode('utf-8'), parser=_UTF8_HTML_PARSER)
+        except etree.ParserError:
+            # Nothing to parse
+            return ''
+        return ' '.join([p.text_content() for p in document.iter('p')])
+    if backend == 'stream':
+        stream = ParagraphStream(max_chars)
+        data = html.encode('utf-8') if isinstance(html, str) else html
+        for start in range(0, len(data), STREAM_CHUNK_SIZE):
+            if stream.feed(data[start:start + STREAM_CHUNK_SIZE]):
+                break
+        else:
+            stream.close()
+        return stream.text()
+    raise ValueError(f"Unknown extraction backend: {backend}")
+
+def get_article_text(url, fetcher=None, backend=None):
     try:     
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/87.0.4280.88 Safari/537.36"
-        }
-        response = requests.get(url, headers=headers, timeout=10)
+        fetcher = fetcher or default_fetcher()
+        backend = backend or EXTRACTION_BACKEND
+        if backend == 'stream':
+            # Parse while downloading and stop reading once the sentiment window is covered
+            stream = ParagraphStream()
+            response = fetcher.get(url, on_chunk=stream.feed, on_encoding=stream.set_encoding)
+            if response.status_code == 200 and stream.chars < stream.max_chars:
+                stream.close()
+        else:
+            response = fetcher.get(url)
         if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            paragprahs = soup.find_all('p')
-            article_text = ' '.join([p.get_text() for p in paragprahs])
+            article_text = stream.text() if backend == 'stream' else extract_paragraphs(response.text, backend)
             article_text = basic_cleanup(article_text)
             return article_text
         else:
@@ -94,68 +314,347 @@ def get_article_text(url):
         print(f"Failed to get article text from {url}: {e}")
         return "N/A"
 
-def preprocess_data(df:pd.DataFrame, sentiment_pipeline) -> pd.DataFrame:
-    try:
-        df = df[['summary', 'link', 'published', 'title']]
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            article_texts = list(executor.map(get_article_text, df['link']))
-        df['article_text'] = article_texts
-        df = add_sentiment(df, sentiment_pipeline)
-        return df
-    except Exception as e:
-        return f"Could not process data {e}"
-    
-def preprocess_and_update(ticker, data, sentiment_pipeline):
-    df = preprocess_data(data, sentiment_pipeline)
-    if isinstance(df, str):
-        print(df)
-    return ticker, df if not isinstance(df, str) else None
-
-def determine_sentiments(progress_callback=None):
-    sentiment_pipeline = pipeline("sentiment-analysis", model="distilbert/distilbert-base-uncased-finetuned-sst-2-english", device=0)
-
-    stock_news_frames = fetch_news()
-    total_tickers = len(stock_news_frames)
-    
-    # Counter for progress tracking
-    completed_tickers = 0
-
-    def update_progress():
-        if progress_callback and total_tickers > 0:
-            progress_callback((completed_tickers / total_tickers) * 100)
-
-    # Run preprocessing in parallel
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        futures = {
-            executor.submit(preprocess_and_update, ticker, data, sentiment_pipeline): ticker 
-            for ticker, data in stock_news_frames.items()
-        }
-        
-        for future in as_completed(futures):
-            ticker, result = future.result()
-            stock_news_frames[ticker] = result
-            
-            # Increment the progress counter and update progress
-            completed_tickers += 1
-            update_progress()
-
-    # Calculate sentiment scores
-    sentiment_scores = {}
+def cached_article_text(url, cache=None, fetcher=None):
+    '''
+    Returns the article text from the cache, fetching and caching it on a miss
+    '''
+    if cache is not None:
+        article_text = cache.get_text(url)
+        if article_text is not None:
+            return article_text
+    article_text = get_article_text(url, fetcher)
+    # Failed fetches are retried on the next run
+    if cache is not None and article_text != "N/A":
+        cache.put_text(url, article_text)
+    return article_text
+
+def add_sentiments(stock_news_frames:dict, sentiment_pipeline, cache=None) -> dict:
+    '''
+    Scores the articles of every ticker in one batched pass
+    '''
+    frames = {}
     for ticker, frame in stock_news_frames.items():
-        if frame is not None and ticker is not None and ticker != '':
-            scores = []
-            for sentiment in frame['sentiment']:
-                if sentiment == 'NEGATIVE':
-                    scores.append(-1)
-                elif sentiment == 'POSITIVE':
-                    scores.append(1)
-            sentiment_scores[ticker] = sum(scores) / len(scores) if scores else 0
+        if frame is None:
+            continue
+        if frame.empty:
+            stock_news_frames[ticker] = frame.assign(sentiment=pd.Series(dtype=object), confidence=pd.Series(dtype=float))
         else:
-            sentiment_scores[ticker] = 0
+            frames[ticker] = frame
+    if not frames:
+        return stock_news_frames
+    articles = add_sentiment(pd.concat(frames, names=['ticker', None]), sentiment_pipeline, cache)
+    for ticker in frames:
+        stock_news_frames[ticker] = articles.loc[ticker]
+    return stock_news_frames
 
-    # Save sentiment scores to a CSV file
+def determine_sentiments(progress_callback=None, batch_size=SENTIMENT_BATCH_SIZE, cache_path=None, sentiment_pipeline=None):
+    '''
+    Scores the news of every ticker and returns a summary of the run. sentiment_pipeline may be
+    a loaded pipeline or a client of the sentiment worker, the model is loaded here if neither is given.
+    '''
+    if sentiment_pipeline is None:
+        sentiment_pipeline = load_sentiment_pipeline(batch_size)
+    cache = article_cache.ArticleCache(cache_path or article_cache.CACHE_PATH)
+    print(f"Evicted {cache.evict()} stale article cache entries")
+    try:
+        with ArticleFetcher() as fetcher:
+            return _determine_sentiments(sentiment_pipeline, cache, fetcher, progress_callback)
+    finally:
+        cache.close()
+
+def article_table(frame, now:float) -> pd.DataFrame:
+    '''
+    The scored articles of a ticker as a compact typed table: link, published (unix seconds,
+    the run time when missing or unparseable), polarity (+1/-1) and confidence
+    '''
+    if frame is None or frame.empty:
+        scored = pd.DataFrame(columns=['link', 'published', 'sentiment', 'confidence'])
+    else:
+        scored = frame[frame['sentiment'].isin(list(POLARITY))]
+    published = pd.to_datetime(scored['published'], utc=True, errors='coerce', format='mixed')
+    return pd.DataFrame({
+        'link': scored['link'].astype(str).to_numpy(),
+        'published': (published.astype('int64') / 1e9).where(published.notna(), now).to_numpy(dtype=np.float64),
+        'polarity': scored['sentiment'].map(POLARITY).to_numpy(dtype=np.int8),
+        # Results without a score count fully
+        'confidence': pd.to_numeric(scored['confidence'], errors='coerce').fillna(1.0).to_numpy(dtype=np.float32),
+    })
+
+def decay(age_seconds, half_life=SENTIMENT_HALF_LIFE):
+    '''
+    Exponential decay factor for an age, 0.5 at half_life
+    '''
+    return np.exp(-np.log(2) * np.maximum(age_seconds, 0) / half_life.total_seconds())
+
+def update_ticker_sentiment(ticker, frame, cache=None, now=None, half_life=SENTIMENT_HALF_LIFE, prior_weight=SENTIMENT_PRIOR_WEIGHT) -> float:
+    '''
+    Recency and confidence weighted sentiment of a ticker in [-1, 1]. Every article counts
+    polarity * confidence, decayed by its age. The ticker's running sums live in the cache,
+    so only articles it has not seen before are added, and the sums are decayed to now.
+    prior_weight is a neutral pseudo-article that pulls thin or stale news toward 0.
+    '''
+    now = time.time() if now is None else now
+    articles = article_table(frame, now)
+    if cache is None:
+        state = None
+    else:
+        articles = cache.add_ticker_articles(ticker, articles, now)
+        state = cache.get_ticker_state(ticker)
+    weighted_sum, weight_total, as_of = state or (0.0, 0.0, now)
+
+    carried = decay(now - as_of, half_life)
+    weights = articles['confidence'].to_numpy(dtype=np.float64) * decay(now - articles['published'].to_numpy(), half_life)
+    weighted_sum = weighted_sum * carried + float(np.dot(weights, articles['polarity'].to_numpy()))
+    weight_total = weight_total * carried + float(weights.sum())
+    if cache is not None:
+        cache.put_ticker_state(ticker, weighted_sum, weight_total, now)
+    return weighted_sum / (weight_total + prior_weight)
+
+def write_scores(sentiment_scores:dict, output_path=SCORES_PATH):
+    '''
+    Replaces the scores file in one step so readers never see a half written file
+    '''
     final_scores = pd.DataFrame.from_dict(sentiment_scores, orient='index', columns=['sentiment_score'])
-    final_scores.to_csv(os.path.join(os.path.dirname(__file__), 'sentiment_scores.csv'), index=True)
+    tmp_path = output_path + '.tmp'
+    final_scores.to_csv(tmp_path, index=True)
+    os.replace(tmp_path, output_path)
+
+def read_scores(output_path=SCORES_PATH) -> dict:
+    try:
+        return pd.read_csv(output_path, index_col=0)['sentiment_score'].to_dict()
+    except Exception:
+        return {}
+
+class _Stopped(Exception):
+    pass
+
+def _put(q, item, stop):
+    # A bounded put that gives up once the pipeline is stopping
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+    raise _Stopped()
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    raise _Stopped()
+
+def _start_stage(name, func, inbox, outbox, workers, stop, errors):
+    '''
+    Runs func over the items of inbox on worker threads and puts the results in outbox.
+    _DONE is passed on once every worker has seen it, and an error stops the whole pipeline.
+    '''
+    def work():
+        try:
+            while True:
+                item = _get(inbox, stop)
+                if item is _DONE:
+                    # Leave it for the other workers of this stage
+                    _put(inbox, _DONE, stop)
+                    return
+                for result in func(item):
+                    _put(outbox, result, stop)
+        except _Stopped:
+            pass
+        except Exception as e:
+            errors.append(RuntimeError(f"{name} stage failed: {e}"))
+            stop.set()
+
+    threads = [threading.Thread(target=work, name=f"sentiment-{name}-{i}", daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    def close():
+        for thread in threads:
+            thread.join()
+        try:
+            _put(outbox, _DONE, stop)
+        except _Stopped:
+            pass
+    closer = threading.Thread(target=close, name=f"sentiment-{name}-close", daemon=True)
+    closer.start()
+    return closer
+
+class ArticleIndex:
+    '''
+    Link -> tickers index of one run. An article listed under several tickers is fetched
+    once, tickers asking for a link already in flight wait for that download, and later
+    ones get the result kept in memory for the rest of the run. Failed fetches ("N/A"),
+    which the article cache does not keep, are not retried within the run either.
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tickers = defaultdict(set)
+        self.in_flight = {}
+        self.texts = {}
+        self.listings = 0
+
+    def text(self, link, ticker, fetch):
+        with self.lock:
+            self.listings += 1
+            self.tickers[link].add(ticker)
+            if link in self.texts:
+                return self.texts[link]
+            future = self.in_flight.get(link)
+            owner = future is None
+            if owner:
+                future = self.in_flight[link] = Future()
+        if not owner:
+            return future.result()
+        try:
+            article_text = fetch(link)
+            future.set_result(article_text)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[link]
+                if future.exception() is None:
+                    self.texts[link] = article_text
+        return article_text
+
+    def summary(self) -> dict:
+        with self.lock:
+            unique_links = len(self.tickers)
+            return {
+                'listings': self.listings,
+                'unique_links': unique_links,
+                'shared_links': sum(len(tickers) > 1 for tickers in self.tickers.values()),
+                # Article listings per unique article, 1.0 means no duplicates
+                'dedup_ratio': self.listings / unique_links if unique_links else 1.0,
+            }
+
+def stream_sentiments(tickers:list, sentiment_pipeline, cache, fetcher, output_path=SCORES_PATH, progress_callback=None,
+                      queue_size=QUEUE_SIZE, score_batch=SCORE_BATCH, checkpoint_every=CHECKPOINT_EVERY, index=None) -> dict:
+    '''
+    Scores every ticker's news in a pipeline of RSS fetch -> article fetch and cleanup -> batched
+    sentiment scoring -> aggregation. The article stage fetches every link once per run through
+    index, however many tickers list it. The stages run at the same time and hand tickers on through
+    queues of at most queue_size entries, so memory does not grow with the number of tickers.
+    Scores are checkpointed to output_path as tickers complete, on top of the previous run's scores
+    for tickers not done yet, and the final file holds this run's score for every ticker.
+    '''
+    stop = threading.Event()
+    errors = []
+    index = index or ArticleIndex()
+    ticker_queue, news_queue, text_queue, scored_queue = (queue.Queue(queue_size) for _ in range(4))
+
+    def fetch_rss(ticker):
+        try:
+            yield news_fetcher_helper(ticker)
+        except Exception as e:
+            print(f"Could not fetch news for {ticker}: {e}")
+            yield ticker, None
+
+    def fetch_texts(item):
+        ticker, data = item
+        frame = None
+        if data is not None:
+            try:
+                frame = data[['summary', 'link', 'published', 'title']].copy()
+                fetch = lambda link: cached_article_text(link, cache, fetcher)
+                # Each link once per ticker, the index dedups it across tickers
+                links = list(frame['link'].drop_duplicates())
+                texts = fetcher.map(lambda link: index.text(link, ticker, fetch), links)
+                frame['article_text'] = frame['link'].map(dict(zip(links, texts)))
+            except Exception as e:
+                print(f"Could not process data for {ticker}: {e}")
+                frame = None
+        yield ticker, frame
+
+    def score(item):
+        # Gather whatever else is waiting so the model runs full batches across tickers
+        pending = [item]
+        articles = len(item[1]) if item[1] is not None else 0
+        while articles < score_batch:
+            try:
+                extra = text_queue.get_nowait()
+            except queue.Empty:
+                break
+            if extra is _DONE:
+                text_queue.put(_DONE)
+                break
+            pending.append(extra)
+            articles += len(extra[1]) if extra[1] is not None else 0
+        frames = add_sentiments(dict(pending), sentiment_pipeline, cache)
+        for ticker, _ in pending:
+            yield ticker, frames[ticker]
+
+    stages = [
+        _start_stage('rss', fetch_rss, ticker_queue, news_queue, RSS_WORKERS, stop, errors),
+        _start_stage('articles', fetch_texts, news_queue, text_queue, ARTICLE_WORKERS, stop, errors),
+        # One scorer, the model is not shared between threads
+        _start_stage('scoring', score, text_queue, scored_queue, 1, stop, errors),
+    ]
+
+    def feed():
+        try:
+            for ticker in tickers:
+                _put(ticker_queue, ticker, stop)
+            _put(ticker_queue, _DONE, stop)
+        except _Stopped:
+            pass
+    threading.Thread(target=feed, name="sentiment-feed", daemon=True).start()
+
+    checkpoint = read_scores(output_path)
+    sentiment_scores = {}
+    now = time.time()
+
+    def aggregate(item):
+        ticker, frame = item
+        sentiment_scores[ticker] = update_ticker_sentiment(ticker, frame, cache, now)
+        checkpoint[ticker] = sentiment_scores[ticker]
+        if len(sentiment_scores) % checkpoint_every == 0:
+            write_scores(checkpoint, output_path)
+        if progress_callback:
+            progress_callback(len(sentiment_scores) / len(tickers) * 100)
+
+    try:
+        while True:
+            item = _get(scored_queue, stop)
+            if item is _DONE:
+                break
+            aggregate(item)
+    except _Stopped:
+        # Another stage failed, keep the tickers that were scored before it did
+        while True:
+            try:
+                item = scored_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _DONE:
+                aggregate(item)
+    finally:
+        stop.set()
+        for stage in stages:
+            stage.join()
+    if errors:
+        write_scores(checkpoint, output_path)
+        raise errors[0]
+
+    write_scores({ticker: sentiment_scores[ticker] for ticker in tickers if ticker in sentiment_scores}, output_path)
+    return sentiment_scores
+
+def _determine_sentiments(sentiment_pipeline, cache, fetcher, progress_callback=None) -> dict:
+    tickers = load_tickers()
+    index = ArticleIndex()
+    started = perf_counter()
+    scores = stream_sentiments(tickers, sentiment_pipeline, cache, fetcher, SCORES_PATH, progress_callback, index=index)
+    if progress_callback:
+        progress_callback(100.0)
+    summary = {'tickers': len(scores), 'seconds': perf_counter() - started, **index.summary()}
+    print(f"Scored news for {summary['tickers']} tickers in {summary['seconds']:.1f}s, "
+          f"{summary['listings']} article listings were {summary['unique_links']} unique articles "
+          f"(dedup ratio {summary['dedup_ratio']:.2f}, {summary['shared_links']} listed under several tickers)")
+    return summary
 
 if __name__ == "__main__":
     warnings.filterwarnings('ignore')
@@ -0,0 +1,109 @@
+import os
+import re
+import hashlib
+import numpy as np
+import torch
+import openvino as ov
+from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer, pipeline
+
+# 'pytorch' runs the transformers pipeline as is, 'int8' the same pipeline with dynamically
+# quantized linear layers, and 'openvino' the model compiled for the CPU by OpenVINO
+BACKENDS = ('pytorch', 'int8', 'openvino')
+# Converted OpenVINO models, one directory per source model revision
+OPENVINO_DIR = os.path.join(os.path.dirname(__file__), 'openvino_models')
+# OpenVINO otherwise picks bf16 on CPUs that support it, which moves scores off the
+# PyTorch reference. 'bf16' trades that parity for speed.
+OPENVINO_PRECISION = 'f32'
+
+class OpenVinoSentimentPipeline:
+    '''
+    Scores texts with a compiled OpenVINO model. Takes a list of texts and returns
+    one {'label', 'score'} per text, like the transformers pipeline.
+    '''
+    def __init__(self, compiled_model, tokenizer, id2label, batch_size, max_length):
+        self.compiled_model = compiled_model
+        self.tokenizer = tokenizer
+        self.id2label = id2label
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.device = 'openvino:CPU'
+
+    def __call__(self, texts):
+        if isinstance(texts, str):
+            texts = [texts]
+        results = []
+        for start in range(0, len(texts), self.batch_size):
+            encoded = self.tokenizer(texts[start:start + self.batch_size], truncation=True,
+                                     max_length=self.max_length, padding=True, return_tensors='np')
+            logits = self.compiled_model([encoded['input_ids'], encoded['attention_mask']])[0]
+            # Softmax, as the pipeline applies for single label classification
+            probabilities = np.exp(logits - logits.max(axis=1, keepdims=True))
+            probabilities /= probabilities.sum(axis=1, keepdims=True)
+            for row in probabilities:
+                best = int(row.argmax())
+                results.append({'label': self.id2label[best], 'score': float(row[best])})
+        return results
+
+def model_revision(model_name, config) -> str:
+    '''
+    Short hash identifying the revision of a model: its config together with the hub
+    commit it was downloaded at, or the size and modification time of its local weights
+    '''
+    digest = hashlib.sha1(config.to_json_string().encode('utf-8'))
+    commit_hash = getattr(config, '_commit_hash', None)
+    if commit_hash:
+        digest.update(commit_hash.encode('utf-8'))
+    elif os.path.isdir(model_name):
+        for name in sorted(os.listdir(model_name)):
+            if name.endswith(('.safetensors', '.bin')):
+                stat = os.stat(os.path.join(model_name, name))
+                digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+def openvino_model_path(model_name, revision, model_dir=OPENVINO_DIR) -> str:
+    name = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name.strip('/'))
+    return os.path.join(model_dir, f"{name}-{revision}", 'model.xml')
+
+def export_openvino(model, tokenizer, path):
+    '''
+    Converts a transformers classifier to OpenVINO IR with dynamic batch and sequence length
+    '''
+    example = tokenizer(["Shares rose after the earnings report."], return_tensors='pt')
+    with torch.no_grad():
+        ov_model = ov.convert_model(model, example_input=(example['input_ids'], example['attention_mask']))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Kept in fp32, fp16 weights cost accuracy and do not speed up CPU inference
+    ov.save_model(ov_model, path, compress_to_fp16=False)
+
+def quantize_int8(model):
+    '''
+    Dynamic int8 quantization of the linear layers, which hold nearly all of DistilBERT's compute
+    '''
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def load_backend(backend, model_name, batch_size, device, max_length, model_dir=OPENVINO_DIR, precision=OPENVINO_PRECISION):
+    '''
+    Builds the sentiment classifier for a backend. int8 and openvino run on the CPU only,
+    openvino at the given inference precision.
+    '''
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown sentiment backend: {backend}")
+    if backend == 'pytorch':
+        return pipeline("sentiment-analysis", model=model_name, framework='pt', device=device,
+                        truncation=True, max_length=max_length, batch_size=batch_size)
+    if device != -1:
+        print(f"The {backend} sentiment backend runs on the CPU, ignoring device {device}")
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if backend == 'int8':
+        model = quantize_int8(AutoModelForSequenceClassification.from_pretrained(model_name).eval())
+        return pipeline("sentiment-analysis", model=model, tokenizer=tokenizer, framework='pt', device=-1,
+                        truncation=True, max_length=max_length, batch_size=batch_size)
+
+    config = AutoConfig.from_pretrained(model_name)
+    path = openvino_model_path(model_name, model_revision(model_name, config), model_dir)
+    if not os.path.exists(path):
+        print(f"Converting {model_name} to OpenVINO")
+        export_openvino(AutoModelForSequenceClassification.from_pretrained(model_name).eval(), tokenizer, path)
+    compiled_model = ov.Core().compile_model(path, 'CPU', {'INFERENCE_PRECISION_HINT': precision})
+    return OpenVinoSentimentPipeline(compiled_model, tokenizer, config.id2label, batch_size, max_length)
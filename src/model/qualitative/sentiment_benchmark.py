@@ -0,0 +1,81 @@
+import os
+import sys
+import argparse
+from time import perf_counter
+import numpy as np
+import pandas as pd
+from model.qualitative.qual_model import load_sentiment_pipeline, classify_texts, SENTIMENT_MODEL, SENTIMENT_BATCH_SIZE
+from model.qualitative.sentiment_backends import BACKENDS
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'sentiment_fixture.csv')
+
+def load_fixture(path=FIXTURE_PATH) -> pd.DataFrame:
+    '''
+    Labeled financial news sentences, columns text and label
+    '''
+    return pd.read_csv(path)
+
+def article_corpus(sentences:list, n_articles=200, sentences_per_article=20, seed=0) -> list:
+    '''
+    Article-length texts stitched together from the fixture sentences, for throughput
+    '''
+    rng = np.random.default_rng(seed)
+    return [' '.join(rng.choice(sentences, sentences_per_article)) for _ in range(n_articles)]
+
+def benchmark_backend(backend, fixture:pd.DataFrame, articles:list, model=SENTIMENT_MODEL, batch_size=SENTIMENT_BATCH_SIZE) -> dict:
+    start = perf_counter()
+    sentiment_pipeline = load_sentiment_pipeline(batch_size, device='cpu', backend=backend, model=model)
+    load_seconds = perf_counter() - start
+
+    results = classify_texts(fixture['text'].tolist(), sentiment_pipeline)
+    # One warm-up batch, the first call of a runtime pays for its setup
+    classify_texts(articles[:batch_size], sentiment_pipeline)
+    start = perf_counter()
+    classify_texts(articles, sentiment_pipeline)
+    elapsed = perf_counter() - start
+    return {
+        'backend': backend,
+        'load_seconds': load_seconds,
+        'articles_per_sec': len(articles) / elapsed,
+        'labels': [result['label'] for result in results],
+        'scores': np.array([result['score'] for result in results]),
+        'accuracy': np.mean([result['label'] == label for result, label in zip(results, fixture['label'])]),
+    }
+
+def compare_backends(backends=BACKENDS, fixture=None, n_articles=200, model=SENTIMENT_MODEL, batch_size=SENTIMENT_BATCH_SIZE) -> pd.DataFrame:
+    '''
+    Runs every backend over the labeled fixture and an article corpus and reports
+    throughput, accuracy and agreement with the first backend
+    '''
+    fixture = load_fixture() if fixture is None else fixture
+    articles = article_corpus(fixture['text'].tolist(), n_articles)
+    runs = [benchmark_backend(backend, fixture, articles, model, batch_size) for backend in backends]
+    reference = runs[0]
+    report = pd.DataFrame([{
+        'backend': run['backend'],
+        'load_seconds': run['load_seconds'],
+        'articles_per_sec': run['articles_per_sec'],
+        'speedup': run['articles_per_sec'] / reference['articles_per_sec'],
+        'accuracy': run['accuracy'],
+        'label_agreement': np.mean([a == b for a, b in zip(run['labels'], reference['labels'])]),
+        'max_score_difference': np.abs(run['scores'] - reference['scores']).max(),
+    } for run in runs])
+    print(f"Sentiment backends on {len(fixture)} labeled sentences and {len(articles)} articles, "
+          f"compared with {reference['backend']}")
+    print(report.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the sentiment inference backends")
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=BACKENDS,
+                        help="Backends to run, the first is the reference for parity")
+    parser.add_argument('--articles', type=int, default=200)
+    parser.add_argument('--model', default=SENTIMENT_MODEL, help="Model name or local directory")
+    parser.add_argument('--fixture', default=FIXTURE_PATH)
+    args = parser.parse_args()
+
+    fixture = load_fixture(args.fixture)
+    if fixture.empty:
+        print("The fixture has no labeled texts")
+        sys.exit(1)
+    compare_backends(args.backends, fixture, args.articles, args.model)
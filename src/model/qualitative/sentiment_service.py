@@ -0,0 +1,154 @@
+import multiprocessing
+import secrets
+import threading
+from multiprocessing.connection import Listener, Client
+from model.qualitative import qual_model
+
+HOST = '127.0.0.1'
+# The first start may download the model
+START_TIMEOUT = 600
+STOP_TIMEOUT = 10
+
+def serve(ready, authkey, device=None, batch_size=qual_model.SENTIMENT_BATCH_SIZE, loader=None):
+    '''
+    Body of the worker process. Loads the sentiment model once, sends its listening
+    address through ready and then answers one request per connection until stopped.
+    '''
+    loader = loader or qual_model.load_sentiment_pipeline
+    try:
+        sentiment_pipeline = loader(batch_size, device)
+        listener = Listener((HOST, 0), authkey=authkey)
+    except Exception as e:
+        ready.send(('error', str(e)))
+        ready.close()
+        return
+    ready.send(('ok', listener.address))
+    ready.close()
+
+    info = {'model': qual_model.SENTIMENT_MODEL, 'device': str(getattr(sentiment_pipeline, 'device', device)),
+            'batch_size': batch_size}
+    with listener:
+        while True:
+            try:
+                connection = listener.accept()
+            except Exception as e:
+                # A client that fails the handshake must not take the worker down
+                print(f"Rejected sentiment worker connection: {e}")
+                continue
+            with connection:
+                try:
+                    command, payload = connection.recv()
+                except EOFError:
+                    continue
+                if command == 'stop':
+                    connection.send(('ok', None))
+                    return
+                try:
+                    if command == 'classify':
+                        connection.send(('ok', qual_model.classify_texts(payload, sentiment_pipeline)))
+                    elif command == 'ping':
+                        connection.send(('ok', info))
+                    else:
+                        connection.send(('error', f"Unknown command {command}"))
+                except Exception as e:
+                    connection.send(('error', str(e)))
+
+class SentimentClient:
+    '''
+    Talks to a running sentiment worker. Called with a list of texts it returns one
+    {'label', 'score'} per text, so it can stand in for the pipeline in classify_texts.
+    '''
+    # The worker orders texts by token length itself
+    tokenizer = None
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+
+    def request(self, command, payload=None):
+        with Client(self.address, authkey=self.authkey) as connection:
+            connection.send((command, payload))
+            status, result = connection.recv()
+        if status != 'ok':
+            raise RuntimeError(f"Sentiment worker failed: {result}")
+        return result
+
+    def __call__(self, texts):
+        return self.request('classify', list(texts))
+
+    def ping(self) -> dict:
+        return self.request('ping')
+
+class SentimentWorker:
+    '''
+    A separate process holding the sentiment model in memory. The model is loaded on
+    the configured device once and reused by every scoring run until stop() is called.
+    '''
+    def __init__(self, device=None, batch_size=qual_model.SENTIMENT_BATCH_SIZE, loader=None, timeout=START_TIMEOUT):
+        context = multiprocessing.get_context('spawn')
+        authkey = secrets.token_bytes(32)
+        receiver, sender = context.Pipe(duplex=False)
+        self.process = context.Process(target=serve, args=(sender, authkey, device, batch_size, loader),
+                                       name='sentiment-worker', daemon=True)
+        self.process.start()
+        sender.close()
+        try:
+            if not receiver.poll(timeout):
+                raise TimeoutError(f"Sentiment worker did not start within {timeout}s")
+            status, value = receiver.recv()
+        except (TimeoutError, EOFError) as e:
+            self.process.terminate()
+            raise RuntimeError(f"Sentiment worker failed to start: {e or 'process exited'}") from e
+        finally:
+            receiver.close()
+        if status != 'ok':
+            self.process.join(STOP_TIMEOUT)
+            raise RuntimeError(f"Sentiment worker failed to start: {value}")
+        self.client = SentimentClient(value, authkey)
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def stop(self):
+        if self.is_alive():
+            try:
+                self.client.request('stop')
+            except Exception as e:
+                print(f"Could not stop sentiment worker cleanly: {e}")
+        self.process.join(STOP_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def ensure_worker(device=None, batch_size=qual_model.SENTIMENT_BATCH_SIZE) -> SentimentClient:
+    '''
+    Returns a client for the shared worker, starting it if it is not running
+    '''
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = SentimentWorker(device, batch_size)
+            print(f"Sentiment worker started: {_worker.client.ping()}")
+        return _worker.client
+
+def stop_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is not None:
+            _worker.stop()
+            _worker = None
+
+def determine_sentiments(progress_callback=None):
+    '''
+    Runs qual_model.determine_sentiments on the shared worker, loading the model in
+    this process instead if the worker cannot be started, and returns its run summary
+    '''
+    try:
+        client = ensure_worker()
+    except Exception as e:
+        print(f"Scoring sentiment in process, the sentiment worker is unavailable: {e}")
+        client = None
+    return qual_model.determine_sentiments(progress_callback, sentiment_pipeline=client)
@@ -0,0 +1,118 @@
+import os
+import re
+import sys
+import argparse
+import unicodedata
+from time import perf_counter
+import numpy as np
+from model.qualitative.qual_model import basic_cleanup, filler_texts, extract_paragraphs, MAX_ARTICLE_CHARS
+
+WORDS = ("shares rose fell percent quarter revenue earnings guidance analysts expect growth "
+         "margin outlook investors stock market company reported billion million sales").split()
+UNICODE_NOISE = ["’", "“", "”", "—", "–", "½", "é", "ü", "€", " ", " ", "\U0001F4C8"]
+
+def legacy_basic_cleanup(text):
+    '''
+    basic_cleanup as it was before the patterns were precompiled, kept as the baseline
+    '''
+    cleaned_text = unicodedata.normalize('NFKD', text).encode('ascii','ignore').decode('utf-8', 'ignore')
+    cleaned_text = re.sub(r'[^a-zA-Z0-9.,;:!?\'\"()\s]', '', cleaned_text)
+    cleaned_text = re.sub(r'\s+', ' ', cleaned_text).strip()
+    filler_pattern = '|'.join(map(re.escape, filler_texts))
+    whitespace_pattern = r'\s+'
+    cleaned_text = re.sub(whitespace_pattern, ' ', re.sub(filler_pattern,'',cleaned_text)).strip()
+    return cleaned_text
+
+def synthetic_article(rng) -> str:
+    '''
+    Builds a news page with navigation, scripts, boilerplate and a body of paragraphs
+    '''
+    paragraphs = []
+    for _ in range(rng.integers(5, 60)):
+        words = list(rng.choice(WORDS, rng.integers(20, 120)))
+        for _ in range(rng.integers(0, 4)):
+            words.insert(rng.integers(0, len(words)), rng.choice(UNICODE_NOISE))
+        if rng.random() < 0.2:
+            words.append(rng.choice(filler_texts))
+        paragraphs.append(f"<p>{' '.join(words).capitalize()}.</p>")
+    nav = ''.join(f'<li><a href="/section/{i}">Section {i}</a></li>' for i in range(rng.integers(20, 200)))
+    script = "<script>var data = {" + ",".join(f'"k{i}": {i}' for i in range(rng.integers(100, 2000))) + "};</script>"
+    return (f"<html><head><title>Article</title>{script}</head><body><nav><ul>{nav}</ul></nav>"
+            f"<article>{''.join(paragraphs)}</article><footer><p>{filler_texts[5]}</p></footer></body></html>")
+
+def load_corpus(html_dir=None, n_articles=200, seed=0) -> list:
+    '''
+    Returns saved article HTML from html_dir, or a synthetic corpus when none is given
+    '''
+    if html_dir:
+        pages = []
+        for name in sorted(os.listdir(html_dir)):
+            if name.endswith(('.html', '.htm')):
+                with open(os.path.join(html_dir, name), 'r', encoding='utf-8', errors='replace') as f:
+                    pages.append(f.read())
+        return pages
+    rng = np.random.default_rng(seed)
+    return [synthetic_article(rng) for _ in range(n_articles)]
+
+def paragraph_text(html:str) -> str:
+    return extract_paragraphs(html, 'bs4')
+
+def time_per_item(func, items, repeat=3) -> float:
+    '''
+    Best of `repeat` runs over all items, in microseconds per item
+    '''
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, perf_counter() - start)
+    return best / max(len(items), 1) * 1e6
+
+def benchmark_cleanup(texts:list, repeat=3) -> dict:
+    before = time_per_item(legacy_basic_cleanup, texts, repeat)
+    after = time_per_item(basic_cleanup, texts, repeat)
+    mismatches = sum(basic_cleanup(text) != legacy_basic_cleanup(text) for text in texts)
+    print(f"basic_cleanup over {len(texts)} articles (avg {np.mean([len(t) for t in texts]):.0f} chars)")
+    print(f"  before: {before:.1f} us/article")
+    print(f"  after:  {after:.1f} us/article ({before / after:.1f}x faster)")
+    print(f"  output mismatches: {mismatches}")
+    return {'before_us': before, 'after_us': after, 'mismatches': mismatches}
+
+def benchmark_extraction(pages:list, repeat=3) -> dict:
+    '''
+    Times each extraction backend against BeautifulSoup and checks the cleaned text
+    matches it, in full for lxml and up to the cut-off for the streaming parser
+    '''
+    reference = [basic_cleanup(paragraph_text(html)) for html in pages]
+    bs4_us = time_per_item(paragraph_text, pages, repeat)
+    print(f"Paragraph extraction over {len(pages)} pages (avg {np.mean([len(p) for p in pages]) / 1000:.0f} kB)")
+    print(f"  bs4:    {bs4_us:.1f} us/page")
+    results = {'bs4_us': bs4_us}
+    for backend in ['lxml', 'stream']:
+        elapsed = time_per_item(lambda html: extract_paragraphs(html, backend), pages, repeat)
+        outputs = [basic_cleanup(extract_paragraphs(html, backend)) for html in pages]
+        if backend == 'stream':
+            # The stream stops after MAX_ARTICLE_CHARS, so only the part it kept is compared
+            mismatches = sum(not (ref.startswith(out) and (out == ref or len(out) >= MAX_ARTICLE_CHARS // 2))
+                             for ref, out in zip(reference, outputs))
+        else:
+            mismatches = sum(out != ref for ref, out in zip(reference, outputs))
+        print(f"  {backend + ':':7} {elapsed:.1f} us/page ({bs4_us / elapsed:.1f}x faster), output mismatches: {mismatches}")
+        results[f'{backend}_us'] = elapsed
+        results[f'{backend}_mismatches'] = mismatches
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark article text processing")
+    parser.add_argument('--html-dir', help="Directory of saved article HTML files, defaults to a synthetic corpus")
+    parser.add_argument('--articles', type=int, default=200, help="Size of the synthetic corpus")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.html_dir, args.articles)
+    if not corpus:
+        print("No articles to benchmark")
+        sys.exit(1)
+    benchmark_extraction(corpus, args.repeat)
+    benchmark_cleanup([paragraph_text(html) for html in corpus], args.repeat)
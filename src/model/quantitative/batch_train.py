@@ -3,35 +3,130 @@ import sys
 import matplotlib
 import platform
 import warnings
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from model.quantitative import quant_model as qm
+from model.quantitative import price_store
+from model.quantitative import training_manifest
+from model.quantitative import global_model
+from model.quantitative import model_store
 from tensorflow.keras import backend as K
 from memory_profiler import profile
 import gc
 
+# Cores each concurrently trained ticker gets for its hyperparameter searches by default
+CORES_PER_TICKER = 4
+
 @profile
-def batch_train(t, d):
+def batch_train(t, d, n_jobs=-1, warm_start=None):
     """
-    Train the quantitative model for a given ticker and its data.
+    Train the quantitative model for a given ticker and its preprocessed feature data.
+    warm_start holds the previous run's best parameters to search around, if any.
+    Returns the model's training summary, or None if training failed.
     """
-    results = qm.build_quant_model(t, d, force_rebuild=True)
+    results = qm.build_quant_model(t, d, force_rebuild=True, preprocessed=True, n_jobs=n_jobs, warm_start=warm_start)
+    summary = getattr(results, 'training_summary_', None)
     if results:
         print(f"Successfully built model for {t}")
+        # Compact copy that ModelManager loads instead of the pickle
+        model_store.save_compact(t, results)
     K.clear_session()
     del results
-    
+    return summary
+
+def split_core_budget(total_cores=None, max_workers=None, n_tickers=None):
+    """
+    Split the core budget between tickers trained concurrently (outer) and the
+    hyperparameter searches inside each ticker (inner).
+
+    Returns:
+        tuple: (number of ticker worker processes, n_jobs for each ticker's searches)
+    """
+    total_cores = total_cores or os.cpu_count() or 1
+    if max_workers is None:
+        max_workers = max(1, total_cores // CORES_PER_TICKER)
+    if n_tickers:
+        max_workers = min(max_workers, n_tickers)
+    max_workers = max(1, min(max_workers, total_cores))
+    return max_workers, max(1, total_cores // max_workers)
+
+def _init_worker():
+    warnings.filterwarnings('ignore')
+    matplotlib.use('Agg')
 
-def train_models(pull_data=True, progress_callback=None):
+def _train_in_pool(ticker_data, max_workers, inner_jobs, on_done, warm_starts=None):
+    """
+    Train tickers in a process pool, calling on_done(ticker, error, summary) as each finishes.
+    warm_starts maps tickers to the parameters their searches start from.
+    Returns the tickers whose worker process died and took the pool down with it.
+    """
+    # Spawned workers do not inherit TensorFlow/joblib state from this process
+    context = multiprocessing.get_context('spawn')
+    warm_starts = warm_starts or {}
+    broken = []
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=_init_worker) as executor:
+        futures = {executor.submit(batch_train, ticker, data, inner_jobs, warm_starts.get(ticker)): ticker for ticker, data in ticker_data.items()}
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                on_done(ticker, None, future.result())
+            except BrokenProcessPool:
+                broken.append(ticker)
+            except Exception as e:
+                on_done(ticker, e, None)
+    return broken
+
+def select_tickers(raw_data, feature_data, manifest, policy=None):
+    """
+    Apply the retraining policy and return the feature data of the tickers that need a new model.
+    """
+    selected = {}
+    for ticker_symbol, features in feature_data.items():
+        try:
+            reason = training_manifest.retrain_reason(ticker_symbol, manifest.get(ticker_symbol), raw_data[ticker_symbol], features, policy)
+        except Exception as e:
+            reason = f"could not check existing model: {e}"
+        if reason:
+            print(f"Retraining {ticker_symbol}: {reason}")
+            selected[ticker_symbol] = features
+    print(f"Skipping {len(feature_data) - len(selected)} unchanged tickers")
+    return selected
+
+def train_global(ticker_data, manifest, total_cores=None):
+    """
+    Train the single global model on every ticker's features and report it against the per ticker models.
+    """
+    sectors = global_model.load_sectors(list(ticker_data))
+    model = global_model.build_global_model(ticker_data, sectors, n_jobs=total_cores or -1)
+    comparison = global_model.compare_models(model.training_summary_, manifest)
+    global_model.write_comparison_report(comparison, model.training_summary_, manifest)
+    return model
+
+def train_models(pull_data=True, progress_callback=None, full_refresh=False, max_workers=None, total_cores=None, retrain='auto', policy=None, warm_start=True, mode='per_ticker', search_policy=None):
     """
     Train quantitative models for all stocks in the dataset.
-    
+
     Args:
         pull_data (bool): Whether to pull fresh data before training.
         progress_callback (function): A callback function to emit progress updates (percentage).
+        full_refresh (bool): Re-download the full price history instead of only the missing bars.
+        max_workers (int): Tickers trained concurrently, each in its own process. Defaults to
+            one per CORES_PER_TICKER cores. Use 1 to train in this process one ticker at a time.
+        total_cores (int): Core budget shared by all workers. Defaults to every core.
+        retrain (str): 'auto' only retrains tickers the retraining policy selects, 'all' retrains every ticker.
+        policy (dict): Overrides for training_manifest.DEFAULT_POLICY.
+        warm_start (bool): Search only around each ticker's previous best parameters when it
+            has them. Set to False to run the full hyperparameter search for every ticker.
+        search_policy (dict): Overrides for training_manifest.DEFAULT_SEARCH_POLICY, which
+            decides when a warm-started ticker gets a full search again.
+        mode (str): 'per_ticker' trains a stacking model for each ticker, 'global' trains one
+            model on the stacked features of all tickers and writes a comparison report.
     """
     if pull_data:
         from model.quantitative.data_download import get_data
         print("Pulling data using data_download.py...")
-        get_data()
+        get_data(full_refresh=full_refresh)
 
     warnings.filterwarnings('ignore')
     if os.name == "posix":
@@ -40,27 +135,77 @@ def train_models(pull_data=True, progress_callback=None):
             os.system("export QT_QPA_PLATFORM_PLUGIN_PATH=/usr/lib/x86_64-linux-gnu/qt5/plugins/platforms")
     matplotlib.use('Agg')
 
-    filepath = os.path.join(os.path.dirname(__file__), 'all_stock_data.csv')
-    ticker_data = qm.preprocess_all_stocks_data(filepath=filepath)
+    raw_data = price_store.load_all()
+    if not raw_data:
+        # Migrate the legacy wide CSV into the price store on first run
+        filepath = os.path.join(os.path.dirname(__file__), 'all_stock_data.csv')
+        print("Price store is empty, importing all_stock_data.csv...")
+        price_store.write_all(qm.preprocess_all_stocks_data(filepath=filepath))
+        raw_data = price_store.load_all()
+
+    # Build the features for the whole universe in one vectorized pass
+    ticker_data = qm.preprocess_panel(raw_data)
+
+    manifest = training_manifest.load_manifest()
+    if mode == 'global':
+        train_global(ticker_data, manifest, total_cores)
+        if progress_callback:
+            progress_callback(100)
+        print("Global model trained successfully.")
+        return
+
+    if retrain == 'auto':
+        ticker_data = select_tickers(raw_data, ticker_data, manifest, policy)
+
+    warm_starts = {}
+    if warm_start:
+        for ticker_symbol in ticker_data:
+            params = training_manifest.warm_start_params(manifest.get(ticker_symbol), search_policy)
+            if params:
+                warm_starts[ticker_symbol] = params
+        print(f"Warm starting the search for {len(warm_starts)} of {len(ticker_data)} tickers")
 
     # Initialize progress tracking
     total = len(ticker_data)
-    if progress_callback and total > 0:
-        step = 0
-    
-    for ticker_symbol, data in ticker_data.items():
-        try:
-            #Process each symbol one by one then
-            #clear keras backend before moving to next letter
-            batch_train(ticker_symbol, data)
-        except Exception as e:
-            print(f"Error training model for {ticker_symbol}: {e}")
-        finally:
-            if progress_callback and total > 0:
-                step += 1
-                progress_callback(step / total * 100)
-        gc.collect()
+    step = 0
+
+    def on_done(ticker_symbol, error, summary):
+        nonlocal step
+        if error is not None:
+            print(f"Error training model for {ticker_symbol}: {error}")
+        elif summary:
+            training_manifest.record_training(manifest, ticker_symbol, raw_data[ticker_symbol], summary)
+            training_manifest.save_manifest(manifest)
+        if progress_callback and total > 0:
+            step += 1
+            progress_callback(step / total * 100)
+
+    max_workers, inner_jobs = split_core_budget(total_cores, max_workers, total)
+    print(f"Training {total} tickers with {max_workers} worker(s), {inner_jobs} core(s) each")
+
+    if max_workers == 1:
+        for ticker_symbol, data in ticker_data.items():
+            error, summary = None, None
+            try:
+                #Process each symbol one by one then
+                #clear keras backend before moving to next letter
+                summary = batch_train(ticker_symbol, data, n_jobs=inner_jobs, warm_start=warm_starts.get(ticker_symbol))
+            except Exception as e:
+                error = e
+            finally:
+                on_done(ticker_symbol, error, summary)
+            gc.collect()
+    else:
+        broken = _train_in_pool(ticker_data, max_workers, inner_jobs, on_done, warm_starts)
+        if broken:
+            # A crashed worker fails every ticker in flight, give them one more try
+            print(f"Worker pool failed, retrying {len(broken)} tickers")
+            retry_data = {ticker: ticker_data[ticker] for ticker in broken}
+            for ticker_symbol in _train_in_pool(retry_data, max_workers, inner_jobs, on_done, warm_starts):
+                on_done(ticker_symbol, RuntimeError("worker process crashed"), None)
+    if progress_callback and total == 0:
+        progress_callback(100)
     print("All models trained successfully.")
 
 if __name__ == "__main__":
-    train_models(pull_data=True)
\ No newline at end of file
+    train_models(pull_data=True)
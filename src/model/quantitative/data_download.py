@@ -3,11 +3,66 @@ import numpy as np
 import matplotlib.pyplot as plt
 import yfinance as yf
 import os
-from datetime import datetime, timedelta 
-from time import sleep
+import sys
+import threading
+from model.quantitative import price_store, feature_state
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from time import sleep, monotonic
 
-def get_data():
-    end_date = (datetime.today() - timedelta(days=1)).strftime('%Y-%m-%d')
+HISTORY_START = '2013-01-01'
+BATCH_SIZE = 50
+MAX_CONCURRENT_BATCHES = 4
+REQUESTS_PER_SECOND = 2.0
+MAX_RETRIES = 3
+BACKOFF_BASE = 2.0
+# Substrings of the per-ticker errors yfinance records when Yahoo throttles us
+RATE_LIMIT_MARKERS = ('rate limit', 'too many requests', '429')
+# yf.download collects its results and errors in module level dicts that every call
+# resets, so concurrent batches must not overlap between the call and reading them
+_DOWNLOAD_LOCK = threading.Lock()
+
+class RateLimiter:
+    '''
+    Token bucket shared by all download threads. Tokens refill at `rate` per second up
+    to `capacity`. The rate is halved whenever a request looks throttled and recovers
+    gradually as requests succeed.
+    '''
+    def __init__(self, rate=REQUESTS_PER_SECOND, capacity=None, min_rate=0.1):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            sleep(wait)
+
+    def slow_down(self):
+        with self.lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def speed_up(self):
+        with self.lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate * 1.25)
+
+def read_tickers():
     parent_dir = os.path.dirname(os.path.dirname(__file__))
 
     ticker_list = None
@@ -15,20 +70,147 @@ def get_data():
         ticker_list = f.read()
 
     ticker_list = ticker_list.split('\n')
-    ticker_list = [symb.strip() for symb in ticker_list]
+    return [symb.strip() for symb in ticker_list if symb.strip()]
 
-    all_data = {}
-    for ticker in ticker_list:
+def split_batch(data:pd.DataFrame, tickers:list) -> dict:
+    '''
+    Splits a multi-ticker yf.download frame into one frame per ticker, dropping
+    tickers that came back empty
+    '''
+    frames = {}
+    if data is None or data.empty:
+        return frames
+    available = set(data.columns.get_level_values(0)) if isinstance(data.columns, pd.MultiIndex) else set()
+    for ticker in tickers:
+        if ticker not in available:
+            continue
+        frame = data[ticker].dropna(how='all')
+        if not frame.empty:
+            frames[ticker] = frame
+    return frames
+
+def throttled_tickers(tickers:list) -> list:
+    '''
+    The tickers yf.download recorded a rate limit error for. yfinance keeps these errors in
+    a module level dict that each download resets, so this must run right after the call
+    while _DOWNLOAD_LOCK is still held.
+    '''
+    errors = getattr(yf.shared, '_ERRORS', {}) or {}
+    return [t for t in tickers
+            if any(marker in str(errors.get(t.upper(), '')).lower() for marker in RATE_LIMIT_MARKERS)]
+
+def download_batch(tickers:list, start_date:str, end_date:str, limiter:RateLimiter, max_retries=MAX_RETRIES) -> tuple:
+    '''
+    Downloads one batch of tickers with a single request. When the request raises, or
+    yfinance reports a ticker as rate limited, those tickers are retried with exponential
+    backoff and the shared rate is lowered. A ticker that simply comes back empty has no
+    bars in the range (a holiday, a same day rerun, a delisted symbol) and is not retried.
+    Returns the frames and the wall time the batch took.
+    '''
+    started = monotonic()
+    frames = {}
+    pending = list(tickers)
+    no_data = []
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
         try:
-            print(f"downloading data for {ticker}")
-            data = yf.download(ticker, start='2013-01-01', end=end_date)
-            all_data[ticker] = data
-            sleep(1)
+            with _DOWNLOAD_LOCK:
+                data = yf.download(pending, start=start_date, end=end_date, group_by='ticker',
+                                   threads=False, progress=False)
+                throttled = throttled_tickers(pending)
+            frames.update(split_batch(data, pending))
+            retry = [t for t in throttled if t not in frames]
         except Exception as e:
-            print(f"could not get data for {ticker}: {e}")
+            print(f"batch download failed for {len(pending)} tickers: {e}")
+            retry = [t for t in pending if t not in frames]
+
+        no_data.extend(t for t in pending if t not in frames and t not in retry)
+        pending = retry
+        if not pending:
+            limiter.speed_up()
+            break
+        limiter.slow_down()
+        if attempt < max_retries:
+            delay = BACKOFF_BASE ** attempt
+            print(f"retrying {len(pending)} tickers in {delay:.0f}s (attempt {attempt + 2}/{max_retries + 1})")
+            sleep(delay)
+
+    if no_data:
+        print(f"no data from {start_date} for {', '.join(no_data)}")
+    if pending:
+        print(f"could not get data for {', '.join(pending)}")
+    return frames, monotonic() - started
+
+def plan_batches(ticker_list:list, manifest:dict, end_date:str, full_refresh=False, batch_size=BATCH_SIZE) -> list:
+    '''
+    Groups tickers by the date their download should start from and chunks each group
+    into batches of at most batch_size. Returns (start_date, tickers, is_new) tuples.
+    '''
+    groups = {}
+    for ticker in ticker_list:
+        last_stored = None if full_refresh else price_store.last_date(ticker, manifest=manifest)
+        if last_stored is None:
+            start_date, is_new = HISTORY_START, True
+        else:
+            start_date, is_new = (last_stored + timedelta(days=1)).strftime('%Y-%m-%d'), False
+            if start_date >= end_date:
+                continue
+        groups.setdefault((start_date, is_new), []).append(ticker)
+
+    batches = []
+    for (start_date, is_new), tickers in sorted(groups.items()):
+        for i in range(0, len(tickers), batch_size):
+            batches.append((start_date, tickers[i:i + batch_size], is_new))
+    return batches
+
+def get_data(full_refresh=False, batch_size=BATCH_SIZE, max_workers=MAX_CONCURRENT_BATCHES, requests_per_second=REQUESTS_PER_SECOND):
+    '''
+    Downloads OHLCV data for every ticker into the price store.
+    By default only the bars after each ticker's last stored date are requested and
+    appended. Pass full_refresh=True to re-download the whole history, e.g. after
+    splits or dividends have changed past adjusted prices.
+    Tickers are requested in batches through a shared token bucket rate limiter. Up to
+    max_workers batches are in flight, their backoff waits overlap but yf.download calls
+    run one at a time, yfinance keeps each call's results in shared module state.
+    '''
+    end_date = (datetime.today() - timedelta(days=1)).strftime('%Y-%m-%d')
+    ticker_list = read_tickers()
+
+    if full_refresh:
+        # Saved prediction state was built from the old adjusted history
+        feature_state.clear_states()
+
+    manifest = price_store.read_manifest()
+    batches = plan_batches(ticker_list, manifest, end_date, full_refresh, batch_size)
+    print(f"{len(ticker_list) - sum(len(b[1]) for b in batches)} tickers up to date, "
+          f"downloading {len(batches)} batches")
+
+    limiter = RateLimiter(rate=requests_per_second)
+    run_start = monotonic()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for batch_num, (start_date, tickers, is_new) in enumerate(batches, start=1):
+            future = executor.submit(download_batch, tickers, start_date, end_date, limiter)
+            futures[future] = (batch_num, tickers, is_new)
+
+        # Store writes stay on this thread so the manifest is only touched here
+        for future in as_completed(futures):
+            batch_num, tickers, is_new = futures[future]
+            frames, elapsed = future.result()
+            elapsed = max(elapsed, 1e-6)
+            print(f"batch {batch_num}/{len(batches)}: {len(frames)}/{len(tickers)} tickers in "
+                  f"{elapsed:.1f}s ({len(frames) / elapsed:.1f} tickers/s)")
+            for ticker, data in frames.items():
+                try:
+                    if is_new:
+                        price_store.write_ticker(ticker, data, manifest=manifest)
+                    else:
+                        price_store.append_ticker(ticker, data, manifest=manifest)
+                except Exception as e:
+                    print(f"could not store data for {ticker}: {e}")
 
-    combined_data = pd.concat(all_data, axis=1)
-    combined_data.to_csv(os.path.join(os.path.dirname(__file__),'all_stock_data.csv'))
+    price_store.write_manifest(manifest)
+    print(f"downloaded {len(batches)} batches in {monotonic() - run_start:.1f}s")
 
 if __name__ == "__main__":
-    get_data()
\ No newline at end of file
+    get_data(full_refresh='--full-refresh' in sys.argv)
@@ -0,0 +1,143 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from model.quantitative.quant_model import compute_obv, FEATURE_COLUMNS
+
+STATE_DIR = os.path.join(os.path.dirname(__file__), 'feature_state')
+SHORT_SPAN = 12
+LONG_SPAN = 26
+SIGNAL_SPAN = 9
+RSI_PERIOD = 14
+# Enough closes for the 14 deltas behind RSI, which is the longest rolling window
+CLOSE_BUFFER = RSI_PERIOD + 1
+
+def _alpha(span):
+    return 2 / (span + 1)
+
+def _state_path(ticker, state_dir=STATE_DIR):
+    return os.path.join(state_dir, f"{ticker}.json")
+
+def _bar_date(value) -> str:
+    return pd.Timestamp(value).strftime('%Y-%m-%d')
+
+def load_state(ticker:str, state_dir=STATE_DIR):
+    path = _state_path(ticker, state_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_state(ticker:str, state:dict, state_dir=STATE_DIR):
+    os.makedirs(state_dir, exist_ok=True)
+    path = _state_path(ticker, state_dir)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+def clear_states(state_dir=STATE_DIR):
+    '''
+    Drops every saved state, e.g. after a full price refresh changed past closes
+    '''
+    if os.path.exists(state_dir):
+        shutil.rmtree(state_dir)
+
+def init_state(data:pd.DataFrame) -> dict:
+    '''
+    Builds the feature state at the last bar of a full OHLCV history
+    '''
+    data = data[['Close', 'Volume']].apply(pd.to_numeric, errors='coerce')
+    data = data[data['Close'].notna()]
+    if len(data) < CLOSE_BUFFER:
+        raise ValueError(f"Need at least {CLOSE_BUFFER} bars to build feature state, got {len(data)}")
+
+    close = data['Close']
+    short_ema = close.ewm(span=SHORT_SPAN, adjust=False).mean()
+    long_ema = close.ewm(span=LONG_SPAN, adjust=False).mean()
+    signal = (short_ema - long_ema).ewm(span=SIGNAL_SPAN, adjust=False).mean()
+    obv = compute_obv(close, data['Volume'])
+
+    return {
+        'last_date': _bar_date(data.index[-1]),
+        'closes': close.iloc[-CLOSE_BUFFER:].tolist(),
+        'short_ema': float(short_ema.iloc[-1]),
+        'long_ema': float(long_ema.iloc[-1]),
+        'signal': float(signal.iloc[-1]),
+        'obv': float(obv.iloc[-1]),
+        'prev_obv': float(obv.iloc[-2]),
+    }
+
+def advance(state:dict, bar_date, close:float, volume:float) -> dict:
+    '''
+    Returns a new state with one more bar applied. Only the fixed size close buffer and
+    the running EMA and OBV totals are touched, so each step is O(1).
+    '''
+    prev_close = state['closes'][-1]
+    short_ema = state['short_ema'] + _alpha(SHORT_SPAN) * (close - state['short_ema'])
+    long_ema = state['long_ema'] + _alpha(LONG_SPAN) * (close - state['long_ema'])
+    macd = short_ema - long_ema
+    signal = state['signal'] + _alpha(SIGNAL_SPAN) * (macd - state['signal'])
+
+    return {
+        'last_date': _bar_date(bar_date),
+        'closes': (state['closes'] + [float(close)])[-CLOSE_BUFFER:],
+        'short_ema': short_ema,
+        'long_ema': long_ema,
+        'signal': signal,
+        'obv': state['obv'] + np.sign(close - prev_close) * volume,
+        'prev_obv': state['obv'],
+    }
+
+def apply_bars(state:dict, bars:pd.DataFrame, commit_before=None):
+    '''
+    Applies every bar newer than the state. Returns (committed, latest) where committed
+    only includes bars dated before commit_before (default today), so a partial
+    intraday bar is used for prediction but never saved.
+    '''
+    commit_before = _bar_date(commit_before if commit_before is not None else pd.Timestamp.today())
+    committed = latest = state
+    for bar_date, bar in bars.iterrows():
+        date_str = _bar_date(bar_date)
+        if date_str <= latest['last_date'] or pd.isnull(bar['Close']):
+            continue
+        latest = advance(latest, bar_date, float(bar['Close']), float(bar['Volume']))
+        if date_str < commit_before:
+            committed = latest
+    return committed, latest
+
+def state_features(state:dict) -> dict:
+    '''
+    Returns the model features for the last bar in the state
+    '''
+    closes = np.asarray(state['closes'], dtype='f8')
+    if len(closes) < CLOSE_BUFFER:
+        raise ValueError("Feature state does not hold enough closes")
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = closes[1:] / closes[:-1] - 1
+        deltas = np.diff(closes)
+        gain = np.where(deltas > 0, deltas, 0).mean()
+        loss = np.where(deltas < 0, -deltas, 0).mean()
+        rsi = 100 - (100 / (1 + gain / loss))
+
+        macd = state['short_ema'] - state['long_ema']
+        features = {
+            'Return_Lag1': returns[-2],
+            'Return_Lag2': returns[-3],
+            'Return_Lag3': returns[-4],
+            'Return_Lag4': returns[-5],
+            'ROC_5': closes[-1] / closes[-6] - 1,
+            'MA_Return_5': returns[-5:].mean(),
+            'Volatility_5': returns[-5:].std(ddof=1),
+            'Volatility_10': returns[-10:].std(ddof=1),
+            'RSI': rsi / 100.0,
+            'OBV': state['obv'] / state['prev_obv'] - 1,
+            'MACD': macd,
+            'MACD_Signal': state['signal'],
+        }
+
+    if not np.all(np.isfinite(list(features.values()))):
+        raise ValueError("Feature state produced non-finite features")
+    return {col: float(features[col]) for col in FEATURE_COLUMNS}
@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from xgboost import XGBRegressor
+from sklearn.metrics import root_mean_squared_error
+from model.quantitative import quant_model as qm
+
+GLOBAL_MODEL_DIR = os.path.join(qm.MODEL_DIR, 'global')
+GLOBAL_MODEL_PATH = os.path.join(GLOBAL_MODEL_DIR, 'global_quant_model.pkl')
+SECTOR_FILE = os.path.join(os.path.dirname(__file__), 'sectors.json')
+REPORT_PATH = os.path.join(os.path.dirname(__file__), 'model_performance', 'global_model_comparison.md')
+UNKNOWN_SECTOR = 'Unknown'
+# Same chronological split as the per ticker models so both are scored on the same rows
+TEST_SIZE = 0.2
+
+GLOBAL_PARAMS = {
+    'n_estimators': 600,
+    'learning_rate': 0.05,
+    'max_depth': 7,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'reg_lambda': 1,
+}
+
+class GlobalQuantModel:
+    '''
+    One gradient boosted model for every ticker. The ticker and its sector are
+    categorical features, so a single predict call scores the whole universe.
+    '''
+    def __init__(self, model, tickers, sectors):
+        self.model = model
+        self.tickers = sorted(tickers)
+        self.sectors = {ticker: sectors.get(ticker, UNKNOWN_SECTOR) for ticker in self.tickers}
+        self.sector_names = sorted(set(self.sectors.values()) | {UNKNOWN_SECTOR})
+
+    def design_matrix(self, features:pd.DataFrame, tickers) -> pd.DataFrame:
+        X = features[qm.FEATURE_COLUMNS].reset_index(drop=True)
+        tickers = pd.Series(list(tickers))
+        # Tickers unseen in training fall back to their sector and the shared trees
+        X['Ticker'] = pd.Categorical(tickers, categories=self.tickers)
+        X['Sector'] = pd.Categorical(tickers.map(self.sectors).fillna(UNKNOWN_SECTOR), categories=self.sector_names)
+        return X
+
+    def predict(self, features:pd.DataFrame) -> np.ndarray:
+        '''
+        Predicts next day returns for a frame of feature rows indexed by ticker
+        '''
+        return self.model.predict(self.design_matrix(features, features.index))
+
+def load_sectors(tickers, path=SECTOR_FILE, fetch=True) -> dict:
+    '''
+    Returns {ticker: sector}, looking up tickers missing from the cached file on Yahoo Finance
+    '''
+    sectors = {}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            sectors = json.load(f)
+
+    missing = [ticker for ticker in tickers if ticker not in sectors]
+    if fetch and missing:
+        print(f"Looking up sectors for {len(missing)} tickers...")
+        for ticker in missing:
+            try:
+                sectors[ticker] = yf.Ticker(ticker).info.get('sector') or UNKNOWN_SECTOR
+            except Exception as e:
+                print(f"Could not look up the sector of {ticker}: {e}")
+        with open(path, 'w') as f:
+            json.dump(sectors, f, indent=2, sort_keys=True)
+    return {ticker: sectors.get(ticker, UNKNOWN_SECTOR) for ticker in tickers}
+
+def split_panel(feature_data:dict, test_size=TEST_SIZE):
+    '''
+    Stacks the per ticker feature frames into train and test frames, holding out the
+    last test_size of every ticker's history
+    '''
+    train, test = [], []
+    for ticker, frame in feature_data.items():
+        if len(frame) < 2:
+            continue
+        split = len(frame) - int(np.ceil(len(frame) * test_size))
+        train.append(frame.iloc[:split].assign(Ticker=ticker))
+        test.append(frame.iloc[split:].assign(Ticker=ticker))
+    return pd.concat(train), pd.concat(test)
+
+def build_global_model(feature_data:dict, sectors=None, n_jobs=-1, params=None) -> GlobalQuantModel:
+    '''
+    Fits one model on the stacked features of every ticker and saves it. The held out
+    RMSE of each ticker is kept in the model's training summary.
+    '''
+    sectors = sectors if sectors is not None else {}
+    train, test = split_panel(feature_data)
+    model = GlobalQuantModel(XGBRegressor(tree_method='hist', enable_categorical=True, random_state=42,
+                                          n_jobs=n_jobs, **{**GLOBAL_PARAMS, **(params or {})}),
+                             feature_data.keys(), sectors)
+
+    print(f"Training the global model on {len(train)} rows from {train['Ticker'].nunique()} tickers...")
+    start = time.perf_counter()
+    model.model.fit(model.design_matrix(train, train['Ticker']), train['Daily_Return'])
+    train_seconds = time.perf_counter() - start
+
+    y_pred = model.model.predict(model.design_matrix(test, test['Ticker']))
+    scored = pd.DataFrame({'Ticker': test['Ticker'].values, 'actual': test['Daily_Return'].values, 'predicted': y_pred})
+    ticker_rmse = {ticker: float(root_mean_squared_error(rows['actual'], rows['predicted']))
+                   for ticker, rows in scored.groupby('Ticker', sort=True)}
+    rmse = float(root_mean_squared_error(scored['actual'], scored['predicted']))
+    print(f"Global model trained in {train_seconds:.1f}s, RMSE {rmse:.4f}")
+
+    model.training_summary_ = {
+        'feature_version': qm.FEATURE_VERSION,
+        'rmse': rmse,
+        'ticker_rmse': ticker_rmse,
+        'train_seconds': train_seconds,
+        'train_rows': len(train),
+        'test_rows': len(test),
+    }
+    qm.save_model(model, GLOBAL_MODEL_PATH)
+    return model
+
+def load_global_model(path=GLOBAL_MODEL_PATH):
+    return qm.load_model(path)
+
+def compare_models(summary:dict, manifest:dict) -> pd.DataFrame:
+    '''
+    Lines up the held out RMSE of the global model with each ticker's own model
+    '''
+    rows = []
+    for ticker, global_rmse in summary['ticker_rmse'].items():
+        ticker_rmse = (manifest.get(ticker) or {}).get('rmse')
+        rows.append({'ticker': ticker, 'per_ticker_rmse': ticker_rmse, 'global_rmse': global_rmse})
+    comparison = pd.DataFrame(rows, columns=['ticker', 'per_ticker_rmse', 'global_rmse'])
+    comparison['difference'] = comparison['global_rmse'] - comparison['per_ticker_rmse']
+    return comparison
+
+def write_comparison_report(comparison:pd.DataFrame, summary:dict, manifest:dict, path=REPORT_PATH):
+    '''
+    Writes the side by side accuracy of the global and per ticker models to Markdown
+    '''
+    both = comparison.dropna(subset=['per_ticker_rmse'])
+    per_ticker_seconds = sum((entry.get('search_seconds') or 0) for entry in manifest.values())
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w+') as f:
+        f.write("# Global Model vs Per Ticker Models\n\n")
+        f.write("## Summary\n")
+        f.write(f"- **Global model RMSE**: {summary['rmse']:.4f} over {summary['test_rows']} held out rows\n")
+        f.write(f"- **Global model training time**: {summary['train_seconds']:.1f}s\n")
+        if per_ticker_seconds:
+            f.write(f"- **Per ticker search time (last runs)**: {per_ticker_seconds:.1f}s\n")
+        if not both.empty:
+            f.write(f"- **Median RMSE**: global {both['global_rmse'].median():.4f}, per ticker {both['per_ticker_rmse'].median():.4f}\n")
+            f.write(f"- **Global model better for**: {(both['difference'] < 0).sum()} of {len(both)} tickers\n")
+        f.write("\n## By Ticker\n")
+        f.write("| Ticker | Per Ticker RMSE | Global RMSE | Difference |\n")
+        f.write("|---|---|---|---|\n")
+        for row in comparison.itertuples():
+            per_ticker = f"{row.per_ticker_rmse:.4f}" if pd.notna(row.per_ticker_rmse) else "n/a"
+            difference = f"{row.difference:+.4f}" if pd.notna(row.difference) else "n/a"
+            f.write(f"| {row.ticker} | {per_ticker} | {row.global_rmse:.4f} | {difference} |\n")
+    print(f"Comparison report written to {path}")
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import pickle
+import numpy as np
+import pandas as pd
+from xgboost import Booster
+from model.quantitative import quant_model as qm
+
+COMPACT_DIR = os.path.join(qm.MODEL_DIR, 'compact')
+REPORT_PATH = os.path.join(os.path.dirname(__file__), 'model_performance', 'model_format_report.md')
+XGB_FILE = 'xgb.ubj'
+FOREST_FILE = 'rf_nodes.npy'
+ROOTS_FILE = 'rf_roots.npy'
+META_FILE = 'meta.json'
+
+# Every tree of the random forest flattened into one node table. Child indices point
+# into the whole table and are -1 on leaves, so the file can be memory-mapped and
+# walked for all trees at once.
+NODE_DTYPE = np.dtype([
+    ('left', 'i4'),
+    ('right', 'i4'),
+    ('feature', 'i4'),
+    ('threshold', 'f8'),
+    ('value', 'f8'),
+])
+
+class CompactStackingModel:
+    '''
+    Predicts like the pickled StackingRegressor of XGBoost, random forest and a linear
+    meta-model, from the native XGBoost booster, the flattened forest and the meta-model
+    coefficients.
+    '''
+    def __init__(self, booster, nodes, roots, coef, intercept, feature_names, training_summary=None):
+        self.booster = booster
+        self.nodes = nodes
+        self.roots = roots
+        self.coef = np.asarray(coef, dtype='f8')
+        self.intercept = float(intercept)
+        self.feature_names = feature_names
+        self.training_summary_ = training_summary
+
+    def predict_forest(self, X) -> np.ndarray:
+        # Trees split float32 features, as sklearn does
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))
+        node = np.repeat(np.asarray(self.roots)[:, np.newaxis], len(X), axis=1)
+        left = self.nodes['left'][node]
+        # Walk one level per step, parking the rows that reached a leaf
+        while (left >= 0).any():
+            go_left = X[rows, self.nodes['feature'][node]] <= self.nodes['threshold'][node]
+            node = np.where(left < 0, node, np.where(go_left, left, self.nodes['right'][node]))
+            left = self.nodes['left'][node]
+        return self.nodes['value'][node].mean(axis=0)
+
+    def predict(self, X) -> np.ndarray:
+        X = pd.DataFrame(np.asarray(X, dtype='f8'), columns=self.feature_names)
+        xgb_pred = self.booster.inplace_predict(X)
+        rf_pred = self.predict_forest(X.to_numpy())
+        return np.column_stack([xgb_pred, rf_pred]) @ self.coef + self.intercept
+
+def compact_path(ticker:str, model_dir=COMPACT_DIR) -> str:
+    return os.path.join(model_dir, ticker)
+
+def flatten_forest(forest) -> tuple:
+    '''
+    Returns the node table and root offsets of a fitted RandomForestRegressor
+    '''
+    tables, roots = [], []
+    offset = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        table = np.empty(tree.node_count, dtype=NODE_DTYPE)
+        leaf = tree.children_left < 0
+        table['left'] = np.where(leaf, -1, tree.children_left + offset)
+        table['right'] = np.where(leaf, -1, tree.children_right + offset)
+        table['feature'] = np.where(leaf, 0, tree.feature)
+        table['threshold'] = tree.threshold
+        table['value'] = tree.value[:, 0, 0]
+        tables.append(table)
+        roots.append(offset)
+        offset += tree.node_count
+    return np.concatenate(tables), np.asarray(roots, dtype='i4')
+
+def save_compact(ticker:str, model, model_dir=COMPACT_DIR):
+    '''
+    Writes a fitted stacking model in the compact format, replacing any previous one
+    '''
+    xgb_model = model.named_estimators_['xgb']
+    rf_model = model.named_estimators_['rf']
+    meta_model = model.final_estimator_
+    nodes, roots = flatten_forest(rf_model)
+
+    path = compact_path(ticker, model_dir)
+    tmp_path = path + '.tmp'
+    os.makedirs(tmp_path, exist_ok=True)
+    with open(os.path.join(tmp_path, XGB_FILE), 'wb') as f:
+        f.write(xgb_model.get_booster().save_raw(raw_format='ubj'))
+    np.save(os.path.join(tmp_path, FOREST_FILE), nodes)
+    np.save(os.path.join(tmp_path, ROOTS_FILE), roots)
+    with open(os.path.join(tmp_path, META_FILE), 'w') as f:
+        json.dump({
+            'feature_names': list(model.feature_names_in_),
+            'coef': meta_model.coef_.tolist(),
+            'intercept': float(meta_model.intercept_),
+            'training_summary': getattr(model, 'training_summary_', None),
+        }, f, default=str)
+
+    if os.path.exists(path):
+        old_path = path + '.old'
+        os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        for name in os.listdir(old_path):
+            os.remove(os.path.join(old_path, name))
+        os.rmdir(old_path)
+    else:
+        os.replace(tmp_path, path)
+
+def load_compact(ticker:str, model_dir=COMPACT_DIR, mmap=True) -> CompactStackingModel:
+    path = compact_path(ticker, model_dir)
+    with open(os.path.join(path, META_FILE), 'r') as f:
+        meta = json.load(f)
+    booster = Booster()
+    booster.load_model(os.path.join(path, XGB_FILE))
+    mmap_mode = 'r' if mmap else None
+    nodes = np.load(os.path.join(path, FOREST_FILE), mmap_mode=mmap_mode)
+    roots = np.load(os.path.join(path, ROOTS_FILE), mmap_mode=mmap_mode)
+    return CompactStackingModel(booster, nodes, roots, meta['coef'], meta['intercept'],
+                                meta['feature_names'], meta['training_summary'])
+
+def is_current(ticker:str, pickle_path:str, model_dir=COMPACT_DIR) -> bool:
+    '''
+    True when the compact model exists and is not older than the pickled one
+    '''
+    meta_path = os.path.join(compact_path(ticker, model_dir), META_FILE)
+    return os.path.exists(meta_path) and os.path.getmtime(meta_path) >= os.path.getmtime(pickle_path)
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+def convert_all(pickle_dir=qm.MODEL_DIR, model_dir=COMPACT_DIR, report_path=REPORT_PATH) -> pd.DataFrame:
+    '''
+    Converts every pickled model to the compact format and reports the size and load
+    time of both formats, checking they predict the same
+    '''
+    rows = []
+    model_files = sorted(f for f in os.listdir(pickle_dir) if f.endswith('_quant_model.pkl'))
+    for file in model_files:
+        ticker = file.split("_")[0]
+        pickle_path = os.path.join(pickle_dir, file)
+        try:
+            start = time.perf_counter()
+            with open(pickle_path, 'rb') as f:
+                model = pickle.load(f)
+            pickle_seconds = time.perf_counter() - start
+
+            save_compact(ticker, model, model_dir)
+            start = time.perf_counter()
+            compact = load_compact(ticker, model_dir)
+            compact_seconds = time.perf_counter() - start
+
+            X = np.random.default_rng(0).normal(0, 0.02, (64, len(compact.feature_names)))
+            difference = np.abs(model.predict(pd.DataFrame(X, columns=compact.feature_names)) - compact.predict(X)).max()
+            rows.append({
+                'ticker': ticker,
+                'pickle_bytes': os.path.getsize(pickle_path),
+                'compact_bytes': _dir_size(compact_path(ticker, model_dir)),
+                'pickle_load_seconds': pickle_seconds,
+                'compact_load_seconds': compact_seconds,
+                'max_prediction_difference': float(difference),
+            })
+        except Exception as e:
+            print(f"Could not convert the model for {ticker}: {e}")
+
+    report = pd.DataFrame(rows, columns=['ticker', 'pickle_bytes', 'compact_bytes', 'pickle_load_seconds',
+                                         'compact_load_seconds', 'max_prediction_difference'])
+    write_format_report(report, report_path)
+    return report
+
+def write_format_report(report:pd.DataFrame, path=REPORT_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w+') as f:
+        f.write("# Pickled vs Compact Model Format\n\n")
+        f.write("## Summary\n")
+        if not report.empty:
+            f.write(f"- **Models converted**: {len(report)}\n")
+            f.write(f"- **Total size**: pickle {report['pickle_bytes'].sum() / 1e6:.1f} MB, compact {report['compact_bytes'].sum() / 1e6:.1f} MB\n")
+            f.write(f"- **Total load time**: pickle {report['pickle_load_seconds'].sum():.2f}s, compact {report['compact_load_seconds'].sum():.2f}s\n")
+            f.write(f"- **Largest prediction difference**: {report['max_prediction_difference'].max():.2e}\n")
+        f.write("\n## By Ticker\n")
+        f.write("| Ticker | Pickle MB | Compact MB | Pickle Load (s) | Compact Load (s) |\n")
+        f.write("|---|---|---|---|---|\n")
+        for row in report.itertuples():
+            f.write(f"| {row.ticker} | {row.pickle_bytes / 1e6:.2f} | {row.compact_bytes / 1e6:.2f} | "
+                    f"{row.pickle_load_seconds:.3f} | {row.compact_load_seconds:.3f} |\n")
+    print(f"Model format report written to {path}")
+
+if __name__ == "__main__":
+    convert_all()
@@ -0,0 +1,168 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+STORE_DIR = os.path.join(os.path.dirname(__file__), 'price_store')
+MANIFEST_FILE = 'manifest.json'
+PRICE_COLUMNS = ['Adj Close', 'Close', 'High', 'Low', 'Open', 'Volume']
+
+# One structured record per trading day. Prices are float64, volume is int64 and the
+# date is stored as a day-resolution datetime so the whole file can be memory-mapped.
+RECORD_DTYPE = np.dtype([
+    ('Date', 'datetime64[D]'),
+    ('Adj Close', 'f8'),
+    ('Close', 'f8'),
+    ('High', 'f8'),
+    ('Low', 'f8'),
+    ('Open', 'f8'),
+    ('Volume', 'i8'),
+])
+
+def _ticker_path(ticker, store_dir=STORE_DIR):
+    return os.path.join(store_dir, f"{ticker}.npy")
+
+def read_manifest(store_dir=STORE_DIR) -> dict:
+    '''
+    Returns the store manifest mapping each ticker to its row count and date range
+    '''
+    manifest_path = os.path.join(store_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+def write_manifest(manifest:dict, store_dir=STORE_DIR):
+    os.makedirs(store_dir, exist_ok=True)
+    manifest_path = os.path.join(store_dir, MANIFEST_FILE)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def to_records(data:pd.DataFrame) -> np.ndarray:
+    '''
+    Converts a yfinance style OHLCV frame into a typed record array.
+    Rows without a numeric Close are dropped.
+    '''
+    data = data.copy()
+    # yf.download returns (Price, Ticker) column levels even for a single symbol
+    if isinstance(data.columns, pd.MultiIndex):
+        data.columns = data.columns.get_level_values(0)
+    if 'Adj Close' not in data.columns and 'Close' in data.columns:
+        data['Adj Close'] = data['Close']
+
+    missing_cols = [col for col in PRICE_COLUMNS if col not in data.columns]
+    if missing_cols:
+        raise ValueError(f"Missing columns in stock data: {missing_cols}")
+
+    data = data[PRICE_COLUMNS].apply(pd.to_numeric, errors='coerce')
+    data.index = pd.to_datetime(data.index)
+    if data.index.tz is not None:
+        data.index = data.index.tz_localize(None)
+    data = data[data['Close'].notna()]
+    data = data[~data.index.duplicated(keep='last')].sort_index()
+
+    records = np.empty(len(data), dtype=RECORD_DTYPE)
+    records['Date'] = data.index.values.astype('datetime64[D]')
+    for col in PRICE_COLUMNS[:-1]:
+        records[col] = data[col].to_numpy(dtype='f8')
+    records['Volume'] = data['Volume'].fillna(0).to_numpy(dtype='i8')
+    return records
+
+def from_records(records:np.ndarray) -> pd.DataFrame:
+    index = pd.DatetimeIndex(records['Date'].astype('datetime64[ns]'), name='Date')
+    return pd.DataFrame({col: records[col] for col in PRICE_COLUMNS}, index=index)
+
+def _manifest_entry(records:np.ndarray) -> dict:
+    return {
+        'rows': int(len(records)),
+        'first_date': str(records['Date'][0]) if len(records) else None,
+        'last_date': str(records['Date'][-1]) if len(records) else None,
+    }
+
+def write_ticker(ticker:str, data:pd.DataFrame, store_dir=STORE_DIR, manifest=None):
+    '''
+    Writes the OHLCV data for one ticker to its own file and records it in the manifest.
+    Pass a manifest dict to batch several writes and save it once with write_manifest.
+    '''
+    records = to_records(data)
+    os.makedirs(store_dir, exist_ok=True)
+    path = _ticker_path(ticker, store_dir)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, records)
+    os.replace(tmp_path, path)
+
+    save_manifest = manifest is None
+    if save_manifest:
+        manifest = read_manifest(store_dir)
+    manifest[ticker] = _manifest_entry(records)
+    if save_manifest:
+        write_manifest(manifest, store_dir)
+    return records
+
+def read_records(ticker:str, store_dir=STORE_DIR, mmap=True) -> np.ndarray:
+    path = _ticker_path(ticker, store_dir)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No stored price data for {ticker}")
+    return np.load(path, mmap_mode='r' if mmap else None)
+
+def read_ticker(ticker:str, store_dir=STORE_DIR) -> pd.DataFrame:
+    '''
+    Loads one ticker from the store as a float64/int64 DataFrame indexed by date
+    '''
+    return from_records(read_records(ticker, store_dir))
+
+def last_date(ticker:str, store_dir=STORE_DIR, manifest=None):
+    '''
+    Returns the last stored trading day for a ticker, or None if it has not been stored yet
+    '''
+    if manifest is None:
+        manifest = read_manifest(store_dir)
+    entry = manifest.get(ticker)
+    if not entry or not entry.get('last_date') or not os.path.exists(_ticker_path(ticker, store_dir)):
+        return None
+    return pd.Timestamp(entry['last_date'])
+
+def append_ticker(ticker:str, data:pd.DataFrame, store_dir=STORE_DIR, manifest=None):
+    '''
+    Merges new bars into the stored data for a ticker. Bars on dates that are already
+    stored are replaced by the new values.
+    '''
+    new_records = to_records(data)
+    path = _ticker_path(ticker, store_dir)
+    if os.path.exists(path):
+        old_records = read_records(ticker, store_dir, mmap=False)
+        old_records = old_records[~np.isin(old_records['Date'], new_records['Date'])]
+        new_records = np.concatenate([old_records, new_records])
+        new_records = new_records[np.argsort(new_records['Date'], kind='stable')]
+    return write_ticker(ticker, from_records(new_records), store_dir, manifest=manifest)
+
+def load_all(tickers=None, store_dir=STORE_DIR) -> dict:
+    '''
+    Loads every ticker listed in the manifest (or the given subset) into a dictionary
+    of data frames, the same shape preprocess_all_stocks_data returns
+    '''
+    manifest = read_manifest(store_dir)
+    if tickers is None:
+        tickers = sorted(manifest.keys())
+
+    ticker_data = {}
+    for ticker in tickers:
+        if ticker not in manifest:
+            continue
+        try:
+            ticker_data[ticker] = read_ticker(ticker, store_dir)
+        except Exception as e:
+            print(f"could not load stored data for {ticker}: {e}")
+    return ticker_data
+
+def write_all(ticker_data:dict, store_dir=STORE_DIR):
+    manifest = read_manifest(store_dir)
+    for ticker, data in ticker_data.items():
+        try:
+            write_ticker(ticker, data, store_dir, manifest=manifest)
+        except Exception as e:
+            print(f"could not store data for {ticker}: {e}")
+    write_manifest(manifest, store_dir)
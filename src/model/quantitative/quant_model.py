@@ -11,7 +11,11 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.ensemble import StackingRegressor
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import root_mean_squared_error
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
 import platform
+import time
+from math import prod
 
 # Suppress TensorFlow logs
 import absl.logging
@@ -60,6 +64,61 @@ def preprocess_all_stocks_data(filepath:str) -> dict:
     
     return reformatted_data
 
+# Bump whenever the features a model is trained on change meaning
+FEATURE_VERSION = 1
+MODEL_DIR = os.path.join(os.path.dirname(__file__), 'models')
+
+FEATURE_COLUMNS = ['Return_Lag1', 'Return_Lag2', 'Return_Lag3', 'Return_Lag4',
+                   'ROC_5', 'MA_Return_5', 'Volatility_5', 'Volatility_10', 'RSI', 'OBV', 'MACD',
+                   'MACD_Signal']
+
+FULL_SEARCH_ITER = 50
+WARM_SEARCH_ITER = 10
+
+XGB_PARAM_GRID = {
+    'n_estimators': [100, 200, 300, 400],
+    'learning_rate': [0.01, 0.05, 0.1, 0.2],
+    'max_depth': [3, 5, 7, 10],
+    'subsample': [0.6, 0.8, 1.0],
+    'colsample_bytree': [0.6, 0.8, 1.0],
+    'reg_alpha': [0, 0.01, 0.1, 1],
+    'reg_lambda': [0.1, 1, 10]
+}
+
+RF_PARAM_GRID = {
+    'n_estimators': [100, 200, 300, 400, 500],
+    'max_depth': [None, 10, 20, 30, 40],
+    'min_samples_split': [2, 5, 10],
+    'min_samples_leaf': [1, 2, 4],
+    # 1.0 is what 'auto' meant for regressors, sklearn no longer accepts the alias
+    'max_features': [1.0, 'sqrt', 'log2'],
+    'bootstrap': [True, False]
+}
+
+def neighborhood_grid(param_grid:dict, best_params:dict) -> dict:
+    '''
+    Narrows a search grid to each parameter's previous best value and its neighbours
+    in the grid's own ordering, so None, boolean and categorical options move too
+    '''
+    grid = {}
+    for name, values in param_grid.items():
+        best = best_params.get(name, values[0])
+        if best not in values:
+            grid[name] = values
+        else:
+            i = values.index(best)
+            grid[name] = values[max(0, i - 1):i + 2]
+    return grid
+
+def search_space(param_grid:dict, best_params=None):
+    '''
+    Returns the grid and candidate budget for a hyperparameter search
+    '''
+    if not best_params:
+        return param_grid, FULL_SEARCH_ITER
+    grid = neighborhood_grid(param_grid, best_params)
+    return grid, min(WARM_SEARCH_ITER, prod(len(v) for v in grid.values()))
+
 def compute_rsi(series, period=14):
     delta = series.diff(1)
     gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
@@ -69,14 +128,7 @@ def compute_rsi(series, period=14):
     return rsi
 
 def compute_obv(close, volume):
-    obv = [0]
-    for i in range(1, len(close)):
-        if close.iloc[i] > close.iloc[i - 1]:
-            obv.append(obv[-1] + volume.iloc[i])
-        elif close.iloc[i] < close.iloc[i - 1]:
-            obv.append(obv[-1] - volume.iloc[i])
-        else:
-            obv.append(obv[-1])
+    obv = _obv(close.to_numpy(dtype='f8'), volume.to_numpy(dtype='f8'))
     return pd.Series(obv, index=close.index)
 
 def compute_macd(series, short_period=12, long_period=26, signal_period=9):
@@ -92,6 +144,9 @@ def save_model(model, filename):
         pickle.dump(model, f)
     print(f"Model saved to {filename}")
 
+def model_path(ticker:str) -> str:
+    return os.path.join(MODEL_DIR, f"{ticker}_quant_model.pkl")
+
 def load_model(filename):
     if os.path.exists(filename):
         print(f"Loading model from {filename}")
@@ -101,49 +156,154 @@ def load_model(filename):
         print(f"No model found at {filename}")
         return None
 
-def preprocess_ticker_data(data: pd.DataFrame) -> pd.DataFrame:
-    for col in data.columns:
-        # Ensure 'Close' column is numeric
-        data[col] = pd.to_numeric(data[col], errors='coerce')
-
-        # Handle cases where  values are converted to NaN
-        if data[col].isnull().any():
-            print(f"Warning: Non-numeric data found in 'Close' column. {data['Close'].isnull().sum()} rows will be dropped.")
-            data.dropna(subset=['Close'], inplace=True)
-
-    data['Daily_Return'] = data['Close'].pct_change()
+def _shift(values, periods):
+    out = np.full_like(values, np.nan)
+    out[periods:] = values[:-periods]
+    return out
+
+def _pct_change(values, periods=1):
+    out = np.full_like(values, np.nan)
+    out[periods:] = values[periods:] / values[:-periods] - 1
+    return out
+
+def _rolling(values, window, func, **kwargs):
+    # Windows containing a NaN come out NaN, matching pandas' min_periods=window
+    out = np.full_like(values, np.nan)
+    if len(values) >= window:
+        out[window - 1:] = func(sliding_window_view(values, window, axis=0), axis=-1, **kwargs)
+    return out
+
+def _ema(values, span):
+    # Same recursion as Series.ewm(span=span, adjust=False).mean(), seeded with the first value
+    alpha = 2 / (span + 1)
+    if len(values) == 0:
+        return values.copy()
+    zi = (1 - alpha) * values[:1]
+    out, _ = lfilter([alpha], [1, alpha - 1], values, axis=0, zi=zi)
+    return out
+
+def _obv(close, volume):
+    direction = np.sign(np.diff(close, axis=0))
+    obv = np.zeros_like(volume)
+    obv[1:] = np.cumsum(direction * volume[1:], axis=0)
+    return obv
+
+def compute_features(close:np.ndarray, volume:np.ndarray) -> dict:
+    '''
+    Computes every model feature from contiguous float64 close and volume arrays.
+    Returns a dictionary of arrays aligned with the inputs, with leading rows NaN
+    where a window is not yet full.
+    '''
+    close = np.ascontiguousarray(close, dtype='f8')
+    volume = np.ascontiguousarray(volume, dtype='f8')
+    features = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily_return = _pct_change(close)
+        features['Daily_Return'] = daily_return
+        for i in range(1, 5):
+            features[f'Return_Lag{i}'] = _shift(daily_return, i)
+
+        features['ROC_5'] = _pct_change(close, 5)
+        features['MA_Return_5'] = _rolling(daily_return, 5, np.mean)
+        features['Volatility_5'] = _rolling(daily_return, 5, np.std, ddof=1)
+        features['Volatility_10'] = np.nan_to_num(_rolling(daily_return, 10, np.std, ddof=1), nan=0.0)
+
+        # The first delta is NaN and counts as a zero gain/loss, as in compute_rsi
+        delta = np.empty_like(close)
+        delta[:1] = np.nan
+        delta[1:] = np.diff(close, axis=0)
+        gain = _rolling(np.where(delta > 0, delta, 0), 14, np.mean)
+        loss = _rolling(np.where(delta < 0, -delta, 0), 14, np.mean)
+        rsi = 100 - (100 / (1 + gain / loss))
+        features['RSI'] = rsi / 100.0
+
+        features['OBV'] = _pct_change(_obv(close, volume))
+
+        macd = _ema(close, 12) - _ema(close, 26)
+        features['MACD'] = macd
+        features['MACD_Signal'] = _ema(macd, 9)
+    return features
 
-    for i in range(1, 5):
-        data[f'Return_Lag{i}'] = data['Daily_Return'].shift(i)
+def preprocess_ticker_data(data: pd.DataFrame) -> pd.DataFrame:
+    data = data.apply(pd.to_numeric, errors='coerce')
 
-    # Calculate additional return-based features
-    data['ROC_5'] = data['Close'].pct_change(periods=5)
-    data['MA_Return_5'] = data['Daily_Return'].rolling(window=5).mean()
-    data['Volatility_5'] = data['Daily_Return'].rolling(window=5).std()
-    data['Volatility_10'] = data['Daily_Return'].rolling(window=10).std().fillna(0)
-    data['RSI'] = compute_rsi(data['Close'])
-    data['OBV'] = compute_obv(data['Close'], data['Volume']).pct_change()
-    data['MACD'], data['MACD_Signal'] = compute_macd(data['Close'])
+    # Rows without a numeric close cannot produce features
+    missing_close = data['Close'].isnull()
+    if missing_close.any():
+        print(f"Warning: Non-numeric data found in 'Close' column. {missing_close.sum()} rows will be dropped.")
+        data = data[~missing_close]
 
-    # Scale RSI to be between 0 and 1
-    data['RSI'] = data['RSI'] / 100.0
+    features = compute_features(data['Close'].to_numpy(dtype='f8'), data['Volume'].to_numpy(dtype='f8'))
+    data = pd.concat([data, pd.DataFrame(features, index=data.index)], axis=1)
 
     data.replace([np.inf, -np.inf], np.nan, inplace=True)
     data.dropna(inplace=True)
     return data
 
-def build_quant_model(ticker:str, data:pd.DataFrame, force_rebuild=False) -> StackingRegressor:
-    model_filename = os.path.join(os.path.dirname(__file__), 'models', f"{ticker}_quant_model.pkl")
+def panel_from_ticker_data(ticker_data:dict, column:str) -> pd.DataFrame:
+    '''
+    Aligns one price column from every ticker frame into a (dates x tickers) matrix
+    '''
+    return pd.concat({ticker: pd.to_numeric(data[column], errors='coerce') for ticker, data in ticker_data.items()}, axis=1).sort_index()
+
+def compute_panel_features(close:pd.DataFrame, volume:pd.DataFrame) -> pd.DataFrame:
+    '''
+    Computes the model features for every ticker at once from (dates x tickers) close
+    and volume matrices. Returns a long frame indexed by (Date, Ticker) holding
+    Daily_Return and FEATURE_COLUMNS, with the same rows preprocess_ticker_data keeps.
+    '''
+    volume = volume.reindex(index=close.index, columns=close.columns)
+    close_values = close.to_numpy(dtype='f8')
+    volume_values = volume.to_numpy(dtype='f8')
+
+    # Move each ticker's valid closes to the top of its column so gaps and late listings
+    # behave like the per-ticker path, which drops missing closes before computing
+    missing = np.isnan(close_values)
+    order = np.argsort(missing, axis=0, kind='stable')
+    compact_close = np.take_along_axis(close_values, order, axis=0)
+    compact_volume = np.take_along_axis(volume_values, order, axis=0)
+    features = compute_features(compact_close, compact_volume)
+
+    columns = ['Daily_Return'] + FEATURE_COLUMNS
+    stacked = np.empty((len(columns),) + close_values.shape)
+    for i, col in enumerate(columns):
+        np.put_along_axis(stacked[i], order, features[col], axis=0)
+    stacked[:, missing] = np.nan
+
+    long_frame = pd.DataFrame(
+        stacked.reshape(len(columns), -1).T,
+        index=pd.MultiIndex.from_product([close.index, close.columns], names=['Date', 'Ticker']),
+        columns=columns)
+    long_frame.replace([np.inf, -np.inf], np.nan, inplace=True)
+    long_frame.dropna(inplace=True)
+    return long_frame
+
+def preprocess_panel(ticker_data:dict) -> dict:
+    '''
+    Panel version of preprocess_ticker_data: builds the features for every ticker in
+    one pass and returns a dictionary of per-ticker feature frames
+    '''
+    close = panel_from_ticker_data(ticker_data, 'Close')
+    volume = panel_from_ticker_data(ticker_data, 'Volume')
+    long_frame = compute_panel_features(close, volume)
+    return {ticker: frame.droplevel('Ticker') for ticker, frame in long_frame.groupby(level='Ticker', sort=False)}
+
+def build_quant_model(ticker:str, data:pd.DataFrame, force_rebuild=False, preprocessed=False, n_jobs=-1, warm_start=None) -> StackingRegressor:
+    '''
+    Tunes, fits and saves the stacking model for a ticker. warm_start may hold the
+    'xgb_params' and 'rf_params' found by a previous run, in which case only their
+    neighbourhood is searched, and that run's 'full_search_seconds' for reporting.
+    '''
+    model_filename = model_path(ticker)
+    warm_start = warm_start or {}
 
     loaded_model = load_model(model_filename)
     if loaded_model and not force_rebuild:
         return loaded_model
 
     try:
-        df_clean = preprocess_ticker_data(data)
-        feature_columns = ['Return_Lag1', 'Return_Lag2', 'Return_Lag3',  'Return_Lag4',
-           'ROC_5', 'MA_Return_5', 'Volatility_5', 'Volatility_10', 'RSI', 'OBV', 'MACD', 
-           'MACD_Signal']
+        df_clean = data if preprocessed else preprocess_ticker_data(data)
+        feature_columns = FEATURE_COLUMNS
 
         #Seperate data
         X = df_clean[feature_columns]
@@ -153,49 +313,35 @@ def build_quant_model(ticker:str, data:pd.DataFrame, force_rebuild=False) -> Sta
         X_train, X_test, y_train, y_test = train_test_split(X,y, test_size=.2, random_state=42, shuffle=False)
 
         #Build the XGBoost Model
-        # Define the parameter grid
-        param_grid = {
-            'n_estimators': [100, 200, 300, 400],
-            'learning_rate': [0.01, 0.05, 0.1, 0.2],
-            'max_depth': [3, 5, 7, 10],
-            'subsample': [0.6, 0.8, 1.0],
-            'colsample_bytree': [0.6, 0.8, 1.0],
-            'reg_alpha': [0, 0.01, 0.1, 1],
-            'reg_lambda': [0.1, 1, 10]
-        }
+        # Search the full grid, or only around the last run's best parameters
+        param_grid, n_iter = search_space(XGB_PARAM_GRID, warm_start.get('xgb_params'))
 
-        # Initialize the model
-        xgb_model = XGBRegressor(random_state=42)
+        # Initialize the model single threaded, the search runs candidates in parallel
+        xgb_model = XGBRegressor(random_state=42, n_jobs=1)
 
         # Set up RandomizedSearchCV
         random_search = RandomizedSearchCV(
             estimator=xgb_model,
             param_distributions=param_grid,
-            n_iter=50,  # Number of random combinations to try
+            n_iter=n_iter,  # Number of random combinations to try
             scoring='neg_mean_squared_error',
             cv=3,  # Cross-validation folds
             verbose=2,
             random_state=42,
-            n_jobs=-1  # Use all available cores
+            n_jobs=n_jobs  # Cores given to this ticker's search
         )
 
         # Fit the model
+        search_start = time.perf_counter()
         random_search.fit(X_train, y_train)
 
         # Best parameters and model
-        best_xgb_model = random_search.best_estimator_
+        best_xgb_model = random_search.best_estimator_.set_params(n_jobs=n_jobs)
         print(f"Best Parameters For XGBoost: {random_search.best_params_}")
 
         #Build the random forest model
-        # Define the parameter grid
-        param_grid = {
-            'n_estimators': [100, 200, 300, 400, 500],
-            'max_depth': [None, 10, 20, 30, 40],
-            'min_samples_split': [2, 5, 10],
-            'min_samples_leaf': [1, 2, 4],
-            'max_features': ['auto', 'sqrt', 'log2'],
-            'bootstrap': [True, False]
-        }
+        # Search the full grid, or only around the last run's best parameters
+        param_grid, n_iter = search_space(RF_PARAM_GRID, warm_start.get('rf_params'))
 
         # Initialize the model
         rf = RandomForestRegressor(
@@ -205,22 +351,29 @@ def build_quant_model(ticker:str, data:pd.DataFrame, force_rebuild=False) -> Sta
         rf_random_search = RandomizedSearchCV(
             estimator=rf,
             param_distributions=param_grid,
-            n_iter=50,  # Number of random combinations to try
+            n_iter=n_iter,  # Number of random combinations to try
             scoring='neg_mean_squared_error',
             cv=3,  # Cross-validation folds
             verbose=2,
             random_state=42,
-            n_jobs=-1  # Use all available cores
+            n_jobs=n_jobs  # Cores given to this ticker's search
         )
 
         # Fit the model
         rf_random_search.fit(X_train, y_train)
+        search_seconds = time.perf_counter() - search_start
+        if warm_start:
+            full_search_seconds = warm_start.get('full_search_seconds') or search_seconds * FULL_SEARCH_ITER / WARM_SEARCH_ITER
+            print(f"Warm-started search took {search_seconds:.1f}s, saving about {full_search_seconds - search_seconds:.1f}s over a full search")
+        else:
+            full_search_seconds = search_seconds
+            print(f"Full search took {search_seconds:.1f}s")
 
         # Print the best parameters
         print(f"Best Parameters: {rf_random_search.best_params_}")
 
         # Get the best model
-        best_rf_model = rf_random_search.best_estimator_
+        best_rf_model = rf_random_search.best_estimator_.set_params(n_jobs=n_jobs)
         # Define a meta-model
         meta_model = LinearRegression()
 
@@ -271,6 +424,19 @@ def build_quant_model(ticker:str, data:pd.DataFrame, force_rebuild=False) -> Sta
             f.write(f"## Performance Plot\n")
             f.write(f"![Performance Plot](../imgs/{ticker}.png)\n")
 
+        # Kept on the model so the training manifest can record what was trained
+        stacking_regressor.training_summary_ = {
+            'feature_version': FEATURE_VERSION,
+            'xgb_params': random_search.best_params_,
+            'rf_params': rf_random_search.best_params_,
+            'rmse': float(mse),
+            'search_mode': 'warm' if warm_start else 'full',
+            'search_seconds': search_seconds,
+            'full_search_seconds': full_search_seconds,
+            'train_rows': len(X_train),
+            'test_rows': len(X_test),
+        }
+
         #save the model
         print(f"Saving model for {ticker}. Type: {type(stacking_regressor)}")
         save_model(stacking_regressor, model_filename)
@@ -0,0 +1,128 @@
+import os
+import json
+import hashlib
+from datetime import datetime
+import pandas as pd
+from sklearn.metrics import root_mean_squared_error
+from model.quantitative import quant_model as qm
+
+MANIFEST_PATH = os.path.join(qm.MODEL_DIR, 'training_manifest.json')
+
+# A model is retrained when any of these trip. Stale history, a missing model or a
+# feature version change always trigger a retrain.
+DEFAULT_POLICY = {
+    'min_new_rows': 20,         # new bars since the last training run
+    'max_age_weeks': 4,         # age of the last training run
+    'max_score_drift': 1.25,    # RMSE on the new bars / validation RMSE at training time
+}
+
+# A warm-started search only explores around the last best parameters, so a full
+# search is forced again after this many warm runs or once the validation RMSE
+# has drifted this far from the last full search's
+DEFAULT_SEARCH_POLICY = {
+    'full_search_every': 5,
+    'max_warm_drift': 1.1,
+}
+
+def load_manifest(path=MANIFEST_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_manifest(manifest:dict, path=MANIFEST_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True, default=str)
+    os.replace(tmp_path, path)
+
+def data_fingerprint(data:pd.DataFrame, rows=None) -> str:
+    '''
+    Hashes the dates, closes and volumes of the first `rows` bars, so an unchanged
+    history prefix keeps its fingerprint as new bars are appended
+    '''
+    data = data.iloc[:rows] if rows is not None else data
+    digest = hashlib.sha1()
+    digest.update(pd.DatetimeIndex(data.index).asi8.tobytes())
+    digest.update(pd.to_numeric(data['Close'], errors='coerce').to_numpy(dtype='f8').tobytes())
+    digest.update(pd.to_numeric(data['Volume'], errors='coerce').to_numpy(dtype='f8').tobytes())
+    return digest.hexdigest()
+
+def retrain_reason(ticker:str, entry:dict, data:pd.DataFrame, features:pd.DataFrame, policy=None, now=None):
+    '''
+    Returns why a ticker should be retrained, or None if its current model can be kept.
+    data is the raw price history and features the preprocessed feature frame.
+    '''
+    policy = {**DEFAULT_POLICY, **(policy or {})}
+    now = now or datetime.now()
+
+    if not entry:
+        return "no previous training record"
+    if not os.path.exists(qm.model_path(ticker)):
+        return "model file missing"
+    if entry.get('feature_version') != qm.FEATURE_VERSION:
+        return "feature version changed"
+    if len(data) < entry['rows'] or data_fingerprint(data, entry['rows']) != entry['fingerprint']:
+        return "stored price history changed"
+
+    age_weeks = (now - datetime.fromisoformat(entry['trained_at'])).days / 7
+    if age_weeks >= policy['max_age_weeks']:
+        return f"model is {age_weeks:.1f} weeks old"
+
+    new_rows = len(data) - entry['rows']
+    if new_rows >= policy['min_new_rows']:
+        return f"{new_rows} new rows"
+
+    recent = features[features.index > pd.Timestamp(entry['last_date'])]
+    if not recent.empty:
+        model = qm.load_model(qm.model_path(ticker))
+        y_pred = model.predict(recent[qm.FEATURE_COLUMNS])
+        recent_rmse = root_mean_squared_error(recent['Daily_Return'], y_pred)
+        if entry['rmse'] > 0 and recent_rmse / entry['rmse'] > policy['max_score_drift']:
+            return f"RMSE drifted from {entry['rmse']:.4f} to {recent_rmse:.4f}"
+    return None
+
+def record_training(manifest:dict, ticker:str, data:pd.DataFrame, summary:dict, now=None):
+    '''
+    Records a finished training run for a ticker in the manifest, counting warm
+    runs since the last full search and keeping that search's RMSE
+    '''
+    previous = manifest.get(ticker) or {}
+    if summary.get('search_mode') == 'warm':
+        search_record = {
+            'warm_runs': previous.get('warm_runs', 0) + 1,
+            'full_search_rmse': previous.get('full_search_rmse', previous.get('rmse')),
+        }
+    else:
+        search_record = {'warm_runs': 0, 'full_search_rmse': summary.get('rmse')}
+    manifest[ticker] = {
+        **summary,
+        **search_record,
+        'rows': len(data),
+        'last_date': pd.Timestamp(data.index[-1]).strftime('%Y-%m-%d'),
+        'fingerprint': data_fingerprint(data),
+        'trained_at': (now or datetime.now()).isoformat(timespec='seconds'),
+    }
+
+def warm_start_params(entry:dict, policy=None):
+    '''
+    Returns the previous best hyperparameters of a ticker to warm start its search,
+    or None when it has no usable record, the features changed since or a full
+    search is due under the search policy
+    '''
+    policy = {**DEFAULT_SEARCH_POLICY, **(policy or {})}
+    if not entry or entry.get('feature_version') != qm.FEATURE_VERSION:
+        return None
+    if not entry.get('xgb_params') or not entry.get('rf_params'):
+        return None
+    if entry.get('warm_runs', 0) >= policy['full_search_every']:
+        return None
+    full_search_rmse = entry.get('full_search_rmse')
+    if full_search_rmse and entry.get('rmse', 0) / full_search_rmse > policy['max_warm_drift']:
+        return None
+    return {
+        'xgb_params': entry['xgb_params'],
+        'rf_params': entry['rf_params'],
+        'full_search_seconds': entry.get('full_search_seconds'),
+    }
@@ -10,13 +10,13 @@ from matplotlib.figure import Figure
 import webbrowser
 import os
 import pandas as pd
-import yfinance as yf
 import matplotlib.pyplot as plt
 from scheduler import Scheduler
 import trade_execution 
 from model.model_manager import ModelManager
+from model import market_data
 from model.quantitative import batch_train
-from model.qualitative import qual_model
+from model.qualitative import sentiment_service
 from alpaca.trading.client import TradingClient
 from alpaca.trading.requests import MarketOrderRequest
 from alpaca.trading.enums import OrderSide, TimeInForce
@@ -213,7 +213,7 @@ class ManualTrainTab(QWidget):
         self._start_training(batch_train.train_models, "Quantitative Model")
 
     def train_qual_model(self):
-        self._start_training(qual_model.determine_sentiments, "Qualitative Model")
+        self._start_training(sentiment_service.determine_sentiments, "Qualitative Model")
 
     def _start_training(self, train_func, model_name):
         # Disable buttons and show progress
@@ -610,8 +610,11 @@ class DataFetchThread(QThread):
             for _, row in self.positions.iterrows():
                 ticker = row['Ticker']
                 quantity = row['Quantity']
-                stock = yf.Ticker(ticker)
-                hist = stock.history(period="1mo", interval="1d")  # Daily data
+                try:
+                    hist = market_data.get_history(ticker, period="1mo", interval="1d")  # Daily data
+                except Exception as e:
+                    print(f"Failed to fetch data for {ticker}: {e}")
+                    continue
                 if hist.empty:
                     continue
                 data[ticker] = hist['Close'] * quantity
@@ -742,13 +745,12 @@ class ReportTab(QWidget):
             "Quantity": [float(pos.qty) for pos in positions]
         }
         portfolio_df = pd.DataFrame(data)
-        portfolio_df["Price"] = portfolio_df["Ticker"].apply(lambda ticker: yf.Ticker(ticker).info.get("regularMarketPrice", 0))
+        portfolio_df["Price"] = portfolio_df["Ticker"].apply(market_data.get_latest_close)
         return portfolio_df
 
     def fetch_sp500_data(self):
         """Fetch historical S&P 500 data."""
-        sp500 = yf.Ticker("^GSPC")
-        hist = sp500.history(period="1mo")
+        hist = market_data.get_history("^GSPC", period="1mo")
         return hist["Close"]
 
     def generate_report(self):
@@ -796,7 +798,7 @@ class ReportTab(QWidget):
             portfolio_values = pd.DataFrame(index=sp500_data.index)
             for ticker in tickers:
                 try:
-                    stock_data = yf.Ticker(ticker).history(start=sp500_data.index.min(), end=sp500_data.index.max())
+                    stock_data = market_data.get_history(ticker, start=sp500_data.index.min(), end=sp500_data.index.max())
                     stock_data = stock_data.reindex(sp500_data.index, method="ffill")  # Align with S&P 500 index
                     portfolio_values[ticker] = stock_data["Close"] * quantities[ticker]
                 except Exception as e:
@@ -1,14 +1,18 @@
 from apscheduler.schedulers.background import BackgroundScheduler
-from model.qualitative import qual_model
+from model.qualitative import sentiment_service
 from model.quantitative import batch_train
 from model.model_manager import ModelManager
 import trade_execution
 import os
 import logging
+from datetime import datetime, timedelta
 
 LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
 os.makedirs(LOG_DIR, exist_ok=True)
 
+# Time the 9:00 job gives decision making before trades are submitted with what is done
+DECISION_BUDGET = timedelta(minutes=20)
+
 # Clear the log file
 with open(os.path.join(LOG_DIR, 'scheduler.log'), 'w') as log_file:
     log_file.write("") 
@@ -30,7 +34,10 @@ class Scheduler:
         '''
         try:
             logging.info("Starting qualitative model execution...")
-            qual_model.determine_sentiments()
+            summary = sentiment_service.determine_sentiments()
+            if summary:
+                logging.info(f"Scored {summary['tickers']} tickers from {summary['unique_links']} unique articles "
+                             f"({summary['listings']} listings, dedup ratio {summary['dedup_ratio']:.2f})")
             logging.info("Qualitative model execution completed successfully")
         except Exception as e:
             logging.error(f"Error running qualitative model: {e}")
@@ -54,9 +61,11 @@ class Scheduler:
             logging.info("Starting trade execution...")
             sentiment_file = os.path.join(os.path.dirname(__file__), 'qualitative', 'sentiment_scores.csv')
             model_dir = os.path.join(os.path.dirname(__file__), 'quantitative', 'models')
+            deadline = datetime.now() + DECISION_BUDGET
             mm = ModelManager(sentiment_file, model_dir)
             decisions_file = os.path.join(LOG_DIR, 'buy_sell_decisions.csv')
-            mm.make_decisions(decisions_file)
+            # Open positions are decided first so they are covered even if the deadline hits
+            mm.make_decisions(decisions_file, deadline=deadline, priority_tickers=trade_execution.held_tickers())
             trade_execution.execute_trades()  # Call the function directly
             logging.info("Trade execution completed successfully")
         except Exception as e:
@@ -80,6 +89,13 @@ class Scheduler:
         logging.info("Scheduler started successfully.")
         print("Scheduler started successfully.")
 
+        # Load the sentiment model now so the morning job does not pay for it
+        try:
+            sentiment_service.ensure_worker()
+            logging.info("Sentiment worker started.")
+        except Exception as e:
+            logging.error(f"Could not start sentiment worker, it will be retried by the qualitative job: {e}")
+
     def stop(self):
         if not self.running:
             print("Scheduler is not running.")
@@ -94,4 +110,5 @@ class Scheduler:
             logging.error(f"Error during scheduler shutdown: {e}")
             print(f"Error stopping scheduler: {e}")
         finally:
+            sentiment_service.stop_worker()
             self.running = False
\ No newline at end of file
@@ -29,6 +29,20 @@ def load_credentials():
         print(f"Error loading credentials - {str(e)}")
         return False
 
+def held_tickers():
+    '''
+    Returns the symbols of the open positions, or an empty list if they cannot be read
+    '''
+    credentials = load_credentials()
+    if not credentials or not credentials.get("api_key") or not credentials.get("api_secret"):
+        return []
+    try:
+        trading_client = TradingClient(credentials.get("api_key"), credentials.get("api_secret"), paper=True)
+        return [position.symbol for position in trading_client.get_all_positions()]
+    except Exception as e:
+        print(f"Error reading open positions: {str(e)}")
+        return []
+
 def execute_trades():
     credentials = load_credentials()
     if not credentials:
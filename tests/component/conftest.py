@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+def _make_prices(rows=300, seed=11, start='2023-01-02'):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.02, rows))
+    index = pd.date_range(start, periods=rows, freq='B')
+    return pd.DataFrame({
+        'Open': close,
+        'High': close * 1.01,
+        'Low': close * 0.99,
+        'Close': close,
+        'Volume': rng.integers(1_000, 100_000, rows).astype(float),
+    }, index=index)
+
+@pytest.fixture(scope='class')
+def make_prices(request):
+    '''
+    Factory for synthetic daily bars, also set on unittest classes as self.make_prices
+    '''
+    if request.cls is not None:
+        request.cls.make_prices = staticmethod(_make_prices)
+    return _make_prices
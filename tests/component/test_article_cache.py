@@ -0,0 +1,62 @@
+import unittest
+from unittest.mock import patch
+from datetime import datetime, timedelta
+import tempfile
+import sys
+import os
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'src'))
+from model.qualitative import article_cache
+
+class TestArticleCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.cache = article_cache.ArticleCache(os.path.join(self.tmp_dir.name, 'cache.sqlite'))
+        self.addCleanup(self.cache.close)
+
+    def test_texts_and_sentiments_round_trip(self):
+        self.assertIsNone(self.cache.get_text('http://a'))
+        self.cache.put_text('http://a', 'Shares rose.')
+        self.assertEqual(self.cache.get_text('http://a'), 'Shares rose.')
+
+        key = article_cache.content_hash('Shares rose.')
+        self.cache.put_sentiments({key: {'label': 'POSITIVE', 'score': 0.98}}, 'model-a')
+        self.assertEqual(self.cache.get_sentiments([key, key, 'other'], 'model-a'), {key: {'label': 'POSITIVE', 'score': 0.98}})
+        # Results of another model are not reused
+        self.assertEqual(self.cache.get_sentiments([key], 'model-b'), {})
+
+    def test_evicts_entries_not_seen_recently(self):
+        with patch('model.qualitative.article_cache.datetime') as mock_datetime:
+            mock_datetime.now.return_value = datetime.now() - timedelta(days=30)
+            self.cache.put_text('http://old', 'Old news.')
+            self.cache.put_sentiments({article_cache.content_hash('Old news.'): {'label': 'NEGATIVE', 'score': 0.7}}, 'model-a')
+        self.cache.put_text('http://new', 'New news.')
+
+        self.assertEqual(self.cache.evict(timedelta(days=14)), 2)
+        self.assertIsNone(self.cache.get_text('http://old'))
+        self.assertEqual(self.cache.get_text('http://new'), 'New news.')
+
+    def test_ticker_articles_are_added_once(self):
+        now = datetime.now().timestamp()
+        articles = pd.DataFrame({'link': ['http://a', 'http://b'], 'published': [now, now - 40 * 86400],
+                                 'polarity': [1, -1], 'confidence': [0.9, 0.6]})
+        # The article published 40 days ago is past the eviction cutoff and never recorded
+        self.assertEqual(list(self.cache.add_ticker_articles('AAPL', articles)['link']), ['http://a'])
+        self.assertTrue(self.cache.add_ticker_articles('AAPL', articles).empty)
+        # The same link under another ticker is its own entry
+        self.assertEqual(len(self.cache.add_ticker_articles('MSFT', articles.iloc[:1])), 1)
+
+        self.cache.put_ticker_state('AAPL', 0.3, 1.5, now)
+        self.assertEqual(self.cache.get_ticker_state('AAPL'), (0.3, 1.5, now))
+        self.assertIsNone(self.cache.get_ticker_state('MSFT'))
+
+        # Once old enough to go, articles are evicted and not recorded again
+        later = datetime.now() + timedelta(days=20)
+        self.assertEqual(self.cache.evict(timedelta(days=14), now=later), 2)
+        self.assertTrue(self.cache.add_ticker_articles('AAPL', articles, later.timestamp()).empty)
+
+if __name__ == '__main__':
+    unittest.main()
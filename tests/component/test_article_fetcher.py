@@ -0,0 +1,98 @@
+import unittest
+import threading
+import time
+import sys
+import os
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'src'))
+from model.qualitative.article_fetcher import ArticleFetcher
+from model.qualitative import qual_model
+
+class ArticleHandler(BaseHTTPRequestHandler):
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.peak = max(cls.peak, cls.in_flight)
+        try:
+            time.sleep(0.05)
+            if self.path == '/missing':
+                self.send_response(404)
+                self.end_headers()
+                return
+            charset = 'utf-8'
+            if self.path == '/article':
+                body = b'<html><body>' + b'<p>Shares rose today.</p>' * 20_000 + b'</body></html>'
+            elif self.path == '/latin1':
+                charset = 'iso-8859-1'
+                body = '<p>Caf\u00e9 shares rose.</p><p>D\u00e9j\u00e0 vu'.encode('latin-1')
+            else:
+                body = b'<p>' + b'x' * (10_000 if self.path == '/large' else 10) + b'</p>'
+            self.send_response(200)
+            self.send_header('Content-Type', f'text/html; charset={charset}')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+class TestArticleFetcher(unittest.TestCase):
+
+    def setUp(self):
+        ArticleHandler.in_flight = ArticleHandler.peak = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), ArticleHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def test_responses_are_capped(self):
+        with ArticleFetcher(max_bytes=1_000) as fetcher:
+            large = fetcher.get(f"{self.base_url}/large")
+            small = fetcher.get(f"{self.base_url}/small")
+            missing = fetcher.get(f"{self.base_url}/missing")
+        self.assertEqual((len(large.text), large.truncated), (1_000, True))
+        self.assertEqual((small.text, small.truncated), ("<p>xxxxxxxxxx</p>", False))
+        self.assertEqual(missing.status_code, 404)
+
+    def test_map_limits_requests_per_host(self):
+        urls = [f"{self.base_url}/page{i}" for i in range(12)]
+        progress = []
+        with ArticleFetcher(max_connections=8, max_per_host=2) as fetcher:
+            results = fetcher.map(lambda url: fetcher.get(url).status_code, urls, on_done=lambda done, total: progress.append(done))
+        self.assertEqual(results, [200] * 12)
+        self.assertLessEqual(ArticleHandler.peak, 2)
+        self.assertEqual(progress, list(range(1, 13)))
+
+    def test_stream_backend_stops_reading_early(self):
+        chunks = []
+        with ArticleFetcher() as fetcher:
+            streamed = qual_model.get_article_text(f"{self.base_url}/article", fetcher, backend='stream')
+            response = fetcher.get(f"{self.base_url}/article", on_chunk=lambda chunk: chunks.append(chunk) or len(chunks) == 2)
+            full = qual_model.get_article_text(f"{self.base_url}/article", fetcher, backend='lxml')
+        self.assertTrue(full.startswith(streamed))
+        self.assertGreaterEqual(len(streamed), qual_model.MAX_ARTICLE_CHARS)
+        self.assertLess(len(streamed), len(full) / 10)
+        self.assertEqual(len(chunks), 2)
+        self.assertTrue(response.truncated)
+        self.assertEqual(len(response.text), sum(map(len, chunks)))
+
+    def test_stream_backend_uses_declared_charset(self):
+        with ArticleFetcher() as fetcher:
+            streamed = qual_model.get_article_text(f"{self.base_url}/latin1", fetcher, backend='stream')
+            full = qual_model.get_article_text(f"{self.base_url}/latin1", fetcher, backend='bs4')
+        self.assertEqual(streamed, full)
+        # Accents decoded rather than replaced, and the unclosed last paragraph kept
+        self.assertEqual(streamed, "Cafe shares rose. Deja vu")
+
+if __name__ == '__main__':
+    unittest.main()
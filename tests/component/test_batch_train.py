@@ -4,39 +4,62 @@ import sys
 import os
 
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'src'))
-from model.quantitative.batch_train import train_models
+from model.quantitative.batch_train import train_models, split_core_budget, select_tickers
 
 class TestBatchTrain(unittest.TestCase):
 
-    @patch('model.quantitative.batch_train.qm.preprocess_all_stocks_data')
+    @patch('model.quantitative.batch_train.training_manifest')
+    @patch('model.quantitative.batch_train.qm.preprocess_panel', side_effect=lambda ticker_data: ticker_data)
+    @patch('model.quantitative.batch_train.price_store.load_all')
     @patch('model.quantitative.batch_train.batch_train')
     @patch('model.quantitative.data_download.get_data')
-    def test_train_models(self, mock_get_data, mock_batch_train, mock_preprocess_all_stocks_data):
-        # Mock the data returned by preprocess_all_stocks_data
-        mock_preprocess_all_stocks_data.return_value = {
+    def test_train_models(self, mock_get_data, mock_batch_train, mock_load_all, mock_preprocess_panel, mock_manifest):
+        # Mock the data returned by the price store
+        mock_load_all.return_value = {
             'AAPL': 'mock_data_1',
             'GOOGL': 'mock_data_2'
         }
 
+        # Only AAPL has previous best parameters to warm start from
+        mock_manifest.warm_start_params.side_effect = lambda entry, policy=None: {'xgb_params': {'max_depth': 5}} if entry == 'aapl_entry' else None
+        mock_manifest.load_manifest.return_value = {'AAPL': 'aapl_entry'}
+
         # Mock the progress callback
         progress_callback = MagicMock()
 
         # Call the function with pull_data=True
-        train_models(pull_data=True, progress_callback=progress_callback)
+        train_models(pull_data=True, progress_callback=progress_callback, max_workers=1, total_cores=2, retrain='all')
 
         # Check if get_data was called
         mock_get_data.assert_called_once()
 
-        # Check if preprocess_all_stocks_data was called
-        mock_preprocess_all_stocks_data.assert_called_once()
+        # Check if the price store was read
+        mock_load_all.assert_called_once()
+        mock_preprocess_panel.assert_called_once()
 
         # Check if batch_train was called for each ticker
         self.assertEqual(mock_batch_train.call_count, 2)
-        mock_batch_train.assert_any_call('AAPL', 'mock_data_1')
-        mock_batch_train.assert_any_call('GOOGL', 'mock_data_2')
+        mock_batch_train.assert_any_call('AAPL', 'mock_data_1', n_jobs=2, warm_start={'xgb_params': {'max_depth': 5}})
+        mock_batch_train.assert_any_call('GOOGL', 'mock_data_2', n_jobs=2, warm_start=None)
 
         # Check if progress_callback was called
         self.assertEqual(progress_callback.call_count, 2)
 
+        # Check each trained model was recorded in the manifest
+        self.assertEqual(mock_manifest.record_training.call_count, 2)
+
+    @patch('model.quantitative.batch_train.training_manifest.retrain_reason')
+    def test_select_tickers(self, mock_retrain_reason):
+        mock_retrain_reason.side_effect = lambda t, *args: "25 new rows" if t == 'AAPL' else None
+        selected = select_tickers({'AAPL': 'raw_1', 'GOOGL': 'raw_2'}, {'AAPL': 'features_1', 'GOOGL': 'features_2'}, {})
+        self.assertEqual(selected, {'AAPL': 'features_1'})
+
+    def test_split_core_budget(self):
+        self.assertEqual(split_core_budget(total_cores=16), (4, 4))
+        self.assertEqual(split_core_budget(total_cores=16, max_workers=8), (8, 2))
+        # Never more workers than tickers or cores
+        self.assertEqual(split_core_budget(total_cores=16, n_tickers=2), (2, 8))
+        self.assertEqual(split_core_budget(total_cores=2, max_workers=8), (2, 1))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,105 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'src'))
+from model.quantitative.data_download import download_batch, plan_batches, RateLimiter
+import yfinance.shared as yf_shared
+
+def make_batch_frame(tickers, failed=()):
+    index = pd.date_range('2024-01-01', periods=3)
+    columns = pd.MultiIndex.from_product([tickers, ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']])
+    data = pd.DataFrame(np.random.rand(3, len(columns)), index=index, columns=columns)
+    for ticker in failed:
+        data[ticker] = np.nan
+    return data
+
+class TestDataDownload(unittest.TestCase):
+
+    @patch('model.quantitative.data_download.price_store.last_date')
+    def test_plan_batches_groups_by_start_date(self, mock_last_date):
+        mock_last_date.side_effect = lambda t, manifest=None: {
+            'AAPL': pd.Timestamp('2024-01-05'),
+            'MSFT': pd.Timestamp('2024-01-05'),
+            'NVDA': pd.Timestamp('2024-01-09'),
+        }.get(t)
+
+        batches = plan_batches(['AAPL', 'MSFT', 'NVDA', 'TSLA'], {}, '2024-01-10', batch_size=1)
+
+        self.assertIn(('2013-01-01', ['TSLA'], True), batches)
+        self.assertIn(('2024-01-06', ['AAPL'], False), batches)
+        self.assertIn(('2024-01-06', ['MSFT'], False), batches)
+        # NVDA is already up to date
+        self.assertFalse(any('NVDA' in tickers for _, tickers, _ in batches))
+
+    @patch('model.quantitative.data_download.sleep')
+    @patch('model.quantitative.data_download.yf.download')
+    def test_download_batch_retries_failed_tickers(self, mock_download, mock_sleep):
+        responses = [
+            (make_batch_frame(['AAPL', 'MSFT'], failed=['MSFT']), {'MSFT': "YFRateLimitError('Too Many Requests. Rate limited.')"}),
+            (make_batch_frame(['MSFT']), {}),
+        ]
+        def download(tickers, **kwargs):
+            data, errors = responses.pop(0)
+            yf_shared._ERRORS = errors
+            return data
+        mock_download.side_effect = download
+        limiter = RateLimiter(rate=100)
+
+        frames, _ = download_batch(['AAPL', 'MSFT'], '2024-01-01', '2024-01-10', limiter)
+
+        self.assertEqual(set(frames), {'AAPL', 'MSFT'})
+        self.assertEqual(mock_download.call_args_list[1].args[0], ['MSFT'])
+        mock_sleep.assert_called_once_with(1.0)
+
+    @patch('model.quantitative.data_download.sleep')
+    @patch('model.quantitative.data_download.yf.download')
+    def test_download_batch_does_not_retry_tickers_without_new_bars(self, mock_download, mock_sleep):
+        def download(tickers, **kwargs):
+            yf_shared._ERRORS = {}
+            return make_batch_frame(['AAPL', 'MSFT'], failed=['MSFT'])
+        mock_download.side_effect = download
+        limiter = RateLimiter(rate=100)
+
+        frames, _ = download_batch(['AAPL', 'MSFT'], '2024-01-06', '2024-01-10', limiter)
+
+        self.assertEqual(set(frames), {'AAPL'})
+        mock_download.assert_called_once()
+        mock_sleep.assert_not_called()
+        self.assertEqual(limiter.rate, 100)
+
+        # A failed request is still retried
+        mock_download.side_effect = [ConnectionError("reset"), make_batch_frame(['AAPL'])]
+        frames, _ = download_batch(['AAPL'], '2024-01-06', '2024-01-10', limiter)
+        self.assertEqual(set(frames), {'AAPL'})
+        self.assertLess(limiter.rate, 100)
+
+    @patch('model.quantitative.data_download.sleep')
+    @patch('model.quantitative.data_download.yf.download')
+    def test_overlapping_batches_keep_their_tickers(self, mock_download, mock_sleep):
+        # Like yfinance, every call resets the shared results and fills them one ticker at a time
+        def download(tickers, **kwargs):
+            yf_shared._DFS, yf_shared._ERRORS = {}, {}
+            for ticker in tickers:
+                time.sleep(0.02)
+                yf_shared._DFS[ticker] = make_batch_frame([ticker])
+            return pd.concat([yf_shared._DFS[ticker] for ticker in tickers], axis=1)
+        mock_download.side_effect = download
+        limiter = RateLimiter(rate=100)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first = executor.submit(download_batch, ['AAPL', 'MSFT', 'NVDA'], '2024-01-01', '2024-01-10', limiter, 0)
+            # Starts once the first batch has stored some of its tickers
+            time.sleep(0.03)
+            second = executor.submit(download_batch, ['TSLA', 'AMZN', 'META'], '2024-01-01', '2024-01-10', limiter, 0)
+
+        self.assertEqual(set(first.result()[0]), {'AAPL', 'MSFT', 'NVDA'})
+        self.assertEqual(set(second.result()[0]), {'TSLA', 'AMZN', 'META'})
+
+if __name__ == '__main__':
+    unittest.main()
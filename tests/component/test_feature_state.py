@@ -0,0 +1,43 @@
+import unittest
+import tempfile
+import sys
+import os
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'src'))
+from model.quantitative import feature_state
+from model.quantitative import quant_model as qm
+
+@pytest.mark.usefixtures('make_prices')
+class TestFeatureState(unittest.TestCase):
+
+    def test_advanced_state_matches_full_recompute(self):
+        data = self.make_prices()
+        state = feature_state.init_state(data.iloc[:-5])
+        committed, latest = feature_state.apply_bars(state, data.iloc[-7:], commit_before='2100-01-01')
+
+        expected = qm.preprocess_ticker_data(data)[qm.FEATURE_COLUMNS].iloc[-1]
+        actual = feature_state.state_features(latest)
+
+        self.assertEqual(latest['last_date'], data.index[-1].strftime('%Y-%m-%d'))
+        self.assertEqual(committed, latest)
+        for col in qm.FEATURE_COLUMNS:
+            self.assertAlmostEqual(actual[col], expected[col], places=9, msg=col)
+
+    def test_partial_bar_is_not_committed(self):
+        data = self.make_prices()
+        state = feature_state.init_state(data.iloc[:-2])
+        committed, latest = feature_state.apply_bars(state, data.iloc[-2:], commit_before=data.index[-1])
+
+        self.assertEqual(committed['last_date'], data.index[-2].strftime('%Y-%m-%d'))
+        self.assertEqual(latest['last_date'], data.index[-1].strftime('%Y-%m-%d'))
+
+    def test_state_round_trip(self):
+        with tempfile.TemporaryDirectory() as state_dir:
+            state = feature_state.init_state(self.make_prices())
+            feature_state.save_state('AAPL', state, state_dir=state_dir)
+            self.assertEqual(feature_state.load_state('AAPL', state_dir=state_dir), state)
+            self.assertIsNone(feature_state.load_state('MSFT', state_dir=state_dir))
+
+if __name__ == '__main__':
+    unittest.main()
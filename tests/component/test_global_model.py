@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'src'))
+from model.quantitative import global_model
+from model.quantitative import quant_model as qm
+
+def make_features(rows=120, seed=3):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2023-01-02', periods=rows, freq='B')
+    frame = pd.DataFrame(rng.normal(0, 0.02, (rows, len(qm.FEATURE_COLUMNS))), index=index, columns=qm.FEATURE_COLUMNS)
+    frame['Daily_Return'] = 0.5 * frame['Return_Lag1'] + rng.normal(0, 0.005, rows)
+    return frame
+
+class TestGlobalModel(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.feature_data = {'AAPL': make_features(seed=1), 'MSFT': make_features(seed=2), 'XOM': make_features(80, seed=3)}
+        self.sectors = {'AAPL': 'Technology', 'MSFT': 'Technology', 'XOM': 'Energy'}
+
+    def test_split_matches_per_ticker_split(self):
+        train, test = global_model.split_panel(self.feature_data)
+        for ticker, frame in self.feature_data.items():
+            _, expected_test = qm.train_test_split(frame, test_size=.2, shuffle=False)
+            self.assertTrue(test[test['Ticker'] == ticker].index.equals(expected_test.index), ticker)
+        self.assertEqual(len(train) + len(test), sum(len(frame) for frame in self.feature_data.values()))
+
+    def test_build_predict_and_report(self):
+        model_path = os.path.join(self.tmp_dir.name, 'global_quant_model.pkl')
+        with patch('model.quantitative.global_model.GLOBAL_MODEL_PATH', model_path):
+            model = global_model.build_global_model(self.feature_data, self.sectors, n_jobs=1, params={'n_estimators': 20})
+        self.assertTrue(os.path.exists(model_path))
+        self.assertEqual(set(model.training_summary_['ticker_rmse']), set(self.feature_data))
+
+        # One call scores every ticker, including one the model never saw
+        latest = pd.DataFrame([frame[qm.FEATURE_COLUMNS].iloc[-1] for frame in self.feature_data.values()],
+                              index=list(self.feature_data))
+        latest.loc['NEW'] = latest.iloc[0]
+        self.assertEqual(model.predict(latest).shape, (4,))
+
+        manifest = {'AAPL': {'rmse': 0.01}, 'MSFT': {'rmse': 0.02}}
+        comparison = global_model.compare_models(model.training_summary_, manifest)
+        self.assertEqual(comparison['per_ticker_rmse'].isna().sum(), 1)
+        report_path = os.path.join(self.tmp_dir.name, 'report.md')
+        global_model.write_comparison_report(comparison, model.training_summary_, manifest, path=report_path)
+        with open(report_path) as f:
+            report = f.read()
+        self.assertIn("| XOM | n/a |", report)
+        self.assertIn("of 2 tickers", report)
+
+    @patch('model.quantitative.global_model.yf.Ticker')
+    def test_sectors_are_cached(self, mock_ticker):
+        mock_ticker.return_value.info = {'sector': 'Technology'}
+        path = os.path.join(self.tmp_dir.name, 'sectors.json')
+        self.assertEqual(global_model.load_sectors(['AAPL'], path=path), {'AAPL': 'Technology'})
+        self.assertEqual(global_model.load_sectors(['AAPL', 'XOM'], path=path, fetch=False), {'AAPL': 'Technology', 'XOM': 'Unknown'})
+        mock_ticker.assert_called_once_with('AAPL')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import sys
+import os
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'src'))
+from model import market_data
+
+def make_history(start, end):
+    index = pd.date_range(start, end, freq='D', tz='America/New_York', inclusive='left')
+    return pd.DataFrame({'Close': range(len(index)), 'Volume': 100}, index=index)
+
+class TestMarketData(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        market_data.clear_memory_cache()
+
+    def tearDown(self):
+        market_data.clear_memory_cache()
+        self.tmp_dir.cleanup()
+
+    @patch('model.market_data.fetch_history')
+    def test_covered_range_is_served_from_memory(self, mock_fetch):
+        mock_fetch.return_value = make_history('2024-01-01', '2024-02-01')
+
+        first = market_data.get_history('AAPL', start='2024-01-01', end='2024-02-01', cache_dir=self.tmp_dir.name)
+        second = market_data.get_history('AAPL', start='2024-01-10', end='2024-01-20', cache_dir=self.tmp_dir.name)
+
+        self.assertEqual(mock_fetch.call_count, 1)
+        self.assertEqual(len(first), 31)
+        self.assertEqual(len(second), 10)
+        self.assertEqual(second.index[0].day, 10)
+
+    @patch('model.market_data.fetch_history')
+    def test_disk_cache_survives_memory_clear(self, mock_fetch):
+        mock_fetch.return_value = make_history('2024-01-01', '2024-02-01')
+
+        market_data.get_history('AAPL', start='2024-01-01', end='2024-02-01', cache_dir=self.tmp_dir.name)
+        market_data.clear_memory_cache()
+        cached = market_data.get_history('AAPL', start='2024-01-01', end='2024-02-01', cache_dir=self.tmp_dir.name)
+
+        self.assertEqual(mock_fetch.call_count, 1)
+        self.assertEqual(len(cached), 31)
+
+    @patch('model.market_data.fetch_history')
+    def test_wider_range_refetches_union(self, mock_fetch):
+        mock_fetch.side_effect = [make_history('2024-01-10', '2024-02-01'), make_history('2024-01-01', '2024-02-01')]
+
+        market_data.get_history('AAPL', start='2024-01-10', end='2024-02-01', cache_dir=self.tmp_dir.name)
+        market_data.get_history('AAPL', start='2024-01-01', end='2024-01-15', cache_dir=self.tmp_dir.name)
+
+        _, start, end, _ = mock_fetch.call_args_list[1].args
+        self.assertEqual(start, pd.Timestamp('2024-01-01'))
+        self.assertEqual(end, pd.Timestamp('2024-02-01'))
+
+    @patch('model.market_data.yf.Ticker')
+    def test_empty_history_raises_and_is_not_cached(self, mock_ticker):
+        mock_ticker.return_value.history.side_effect = [pd.DataFrame(), make_history('2024-01-01', '2024-02-01')]
+
+        with self.assertRaises(ValueError):
+            market_data.get_history('AAPL', start='2024-01-01', end='2024-02-01', cache_dir=self.tmp_dir.name)
+        self.assertEqual(os.listdir(self.tmp_dir.name), [])
+        history = market_data.get_history('AAPL', start='2024-01-01', end='2024-02-01', cache_dir=self.tmp_dir.name)
+
+        self.assertEqual(len(history), 31)
+        self.assertEqual(mock_ticker.return_value.history.call_count, 2)
+        self.assertTrue(mock_ticker.return_value.history.call_args.kwargs['raise_errors'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import time
+import threading
+import tempfile
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'src'))
+from model import model_handler as mh
+from model import market_data
+
+def make_bars(rows, seed=3):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.02, rows))
+    index = pd.date_range('2024-01-02', periods=rows, freq='B')
+    return pd.DataFrame({'Open': close, 'High': close, 'Low': close, 'Close': close,
+                         'Volume': rng.integers(1_000, 100_000, rows).astype(float)}, index=index)
+
+class TestFeatureMatrix(unittest.TestCase):
+
+    @patch('model.model_handler.get_recent_data')
+    @patch('model.model_handler.incremental_features')
+    def test_tickers_without_state_are_recomputed_as_one_panel(self, mock_incremental, mock_get_recent_data):
+        state_row = pd.DataFrame([np.full(len(mh.FEATURE_COLUMNS), 0.5)], columns=mh.FEATURE_COLUMNS)
+        def incremental(ticker):
+            if ticker == 'AAPL':
+                return state_row
+            raise FileNotFoundError("no feature state")
+        mock_incremental.side_effect = incremental
+        bars = {'NEW': make_bars(60), 'IPO': make_bars(40, seed=4), 'THIN': make_bars(3)}
+        mock_get_recent_data.side_effect = lambda ticker: bars[ticker]
+
+        with patch('model.model_handler.preprocess_panel_for_prediction', wraps=mh.preprocess_panel_for_prediction) as mock_panel, \
+                self.assertLogs(level='WARNING') as logs:
+            features = mh.feature_matrix(['NEW', 'AAPL', 'THIN', 'IPO'], prefetch_data=False)
+
+        mock_panel.assert_called_once()
+        # THIN has too little history for any feature row
+        self.assertEqual(list(features.index), ['NEW', 'AAPL', 'IPO'])
+        self.assertIn("Error preparing features for THIN", '\n'.join(logs.output))
+        np.testing.assert_allclose(features.loc['AAPL'].to_numpy(), 0.5)
+        for ticker in ['NEW', 'IPO']:
+            expected = mh.preprocess_for_prediction(bars[ticker]).iloc[0]
+            np.testing.assert_allclose(features.loc[ticker].to_numpy(dtype=float), expected.to_numpy(dtype=float), rtol=1e-9)
+
+class TestPrefetch(unittest.TestCase):
+
+    @patch('model.model_handler.price_store.last_date', return_value=None)
+    @patch('model.model_handler.feature_state.load_state')
+    def test_prefetch_start_covers_state_and_fallback(self, mock_load_state, mock_last_date):
+        month_ago = pd.Timestamp.today().normalize() - pd.DateOffset(months=1)
+
+        mock_load_state.return_value = {'last_date': '2020-03-02'}
+        self.assertEqual(mh.prefetch_start('AAPL'), pd.Timestamp('2020-03-03'))
+
+        # A recent state still fetches the month the recompute fallback reads
+        mock_load_state.return_value = {'last_date': pd.Timestamp.today().strftime('%Y-%m-%d')}
+        self.assertEqual(mh.prefetch_start('AAPL'), month_ago)
+
+        mock_load_state.return_value = None
+        self.assertEqual(mh.prefetch_start('AAPL'), month_ago)
+
+    @patch('model.model_handler.time.sleep')
+    @patch('model.model_handler.price_store.read_manifest', return_value={})
+    @patch('model.model_handler.prefetch_start', return_value=pd.Timestamp('2024-01-02'))
+    @patch('model.model_handler.market_data.get_history')
+    def test_prefetch_retries_and_logs_latency(self, mock_get_history, mock_prefetch_start, mock_read_manifest, mock_sleep):
+        attempts = {}
+        def get_history(ticker, start, timeout):
+            attempts[ticker] = attempts.get(ticker, 0) + 1
+            if ticker == 'DOWN' or (ticker == 'FLAKY' and attempts[ticker] == 1):
+                raise ConnectionError("timed out")
+            return pd.DataFrame({'Close': [1.0, 2.0]})
+        mock_get_history.side_effect = get_history
+
+        with self.assertLogs(level='INFO') as logs:
+            latencies = mh.prefetch(['AAPL', 'FLAKY', 'DOWN'], max_workers=2, retries=3, timeout=5)
+
+        self.assertEqual(set(latencies), {'AAPL', 'FLAKY'})
+        self.assertEqual(attempts, {'AAPL': 1, 'FLAKY': 2, 'DOWN': 3})
+        mock_get_history.assert_any_call('AAPL', start=pd.Timestamp('2024-01-02'), timeout=5)
+        output = '\n'.join(logs.output)
+        self.assertIn("Prefetched 2 bars for FLAKY", output)
+        self.assertIn("Could not prefetch data for DOWN", output)
+        self.assertIn("Prefetched 2/3 tickers", output)
+
+    @patch('model.model_handler.time.sleep')
+    @patch('model.model_handler.prefetch_start', return_value=pd.Timestamp('2024-01-02'))
+    @patch('model.market_data.yf.Ticker')
+    def test_empty_history_is_retried(self, mock_ticker, mock_prefetch_start, mock_sleep):
+        # yfinance reports failed requests as empty frames
+        bars = pd.DataFrame({'Close': [1.0, 2.0]}, index=pd.date_range('2024-01-02', periods=2))
+        mock_ticker.return_value.history.side_effect = [pd.DataFrame(), bars]
+        market_data.clear_memory_cache()
+        self.addCleanup(market_data.clear_memory_cache)
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+
+        with patch('model.market_data._cache_path', return_value=os.path.join(tmp_dir.name, 'AAPL_1d.pkl')), \
+                self.assertLogs(level='INFO') as logs:
+            mh.fetch_recent('AAPL', retries=3)
+
+        self.assertEqual(mock_ticker.return_value.history.call_count, 2)
+        output = '\n'.join(logs.output)
+        self.assertIn("failed on attempt 1", output)
+        self.assertIn("Prefetched 2 bars for AAPL", output)
+
+    @patch('model.model_handler.price_store.read_manifest', return_value={})
+    @patch('model.model_handler.prefetch_start', return_value=pd.Timestamp('2024-01-02'))
+    @patch('model.model_handler.market_data.get_history')
+    def test_prefetch_abandons_fetches_at_deadline(self, mock_get_history, mock_prefetch_start, mock_read_manifest):
+        release = threading.Event()
+        def get_history(ticker, start, timeout):
+            if ticker == 'SLOW':
+                release.wait(5)
+            return pd.DataFrame({'Close': [1.0]})
+        mock_get_history.side_effect = get_history
+        self.addCleanup(release.set)
+
+        started = time.perf_counter()
+        latencies = mh.prefetch(['AAPL', 'SLOW'], max_workers=2, deadline=datetime.now() + timedelta(seconds=0.3))
+
+        self.assertEqual(set(latencies), {'AAPL'})
+        self.assertLess(time.perf_counter() - started, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import tempfile
+import pickle
+import sys
+import os
+import numpy as np
+import pandas as pd
+from xgboost import XGBRegressor
+from sklearn.ensemble import RandomForestRegressor, StackingRegressor
+from sklearn.linear_model import LinearRegression
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'src'))
+from model.quantitative import model_store
+from model.quantitative import quant_model as qm
+
+def make_model(seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(0, 0.02, (300, len(qm.FEATURE_COLUMNS))), columns=qm.FEATURE_COLUMNS)
+    y = 0.5 * X['Return_Lag1'] - 0.2 * X['RSI'] + rng.normal(0, 0.005, len(X))
+    model = StackingRegressor(
+        estimators=[
+            ('xgb', XGBRegressor(n_estimators=20, max_depth=4, random_state=42, n_jobs=1)),
+            ('rf', RandomForestRegressor(n_estimators=10, random_state=42))],
+        final_estimator=LinearRegression())
+    model.fit(X, y)
+    model.training_summary_ = {'rmse': 0.01}
+    return model, X
+
+class TestModelStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.compact_dir = os.path.join(self.tmp_dir.name, 'compact')
+
+    def test_compact_model_predicts_like_pickle(self):
+        model, X = make_model()
+        model_store.save_compact('AAPL', model, self.compact_dir)
+        compact = model_store.load_compact('AAPL', self.compact_dir)
+
+        X_new = np.random.default_rng(1).normal(0, 0.02, (50, len(qm.FEATURE_COLUMNS)))
+        np.testing.assert_allclose(compact.predict_forest(X_new), model.named_estimators_['rf'].predict(X_new), rtol=1e-12)
+        np.testing.assert_allclose(compact.predict(X_new), model.predict(pd.DataFrame(X_new, columns=qm.FEATURE_COLUMNS)), rtol=1e-6, atol=1e-9)
+        # A single feature row, as predict_ticker passes it
+        np.testing.assert_allclose(compact.predict(X.iloc[[0]]), model.predict(X.iloc[[0]]), rtol=1e-6, atol=1e-9)
+        self.assertIsInstance(compact.nodes, np.memmap)
+        self.assertEqual(compact.training_summary_, {'rmse': 0.01})
+
+    def test_convert_all_reports_both_formats(self):
+        pickle_dir = os.path.join(self.tmp_dir.name, 'models')
+        os.makedirs(pickle_dir)
+        for ticker in ['AAPL', 'MSFT']:
+            with open(os.path.join(pickle_dir, f"{ticker}_quant_model.pkl"), 'wb') as f:
+                pickle.dump(make_model()[0], f)
+
+        report_path = os.path.join(self.tmp_dir.name, 'report.md')
+        report = model_store.convert_all(pickle_dir, self.compact_dir, report_path)
+        self.assertEqual(list(report['ticker']), ['AAPL', 'MSFT'])
+        self.assertTrue((report['max_prediction_difference'] < 1e-6).all())
+        self.assertTrue(model_store.is_current('AAPL', os.path.join(pickle_dir, 'AAPL_quant_model.pkl'), self.compact_dir))
+
+        # Saving again replaces the previous artifact
+        model_store.save_compact('AAPL', make_model(seed=2)[0], self.compact_dir)
+        self.assertEqual(sorted(os.listdir(self.compact_dir)), ['AAPL', 'MSFT'])
+        with open(report_path) as f:
+            self.assertIn("| MSFT |", f.read())
+
+if __name__ == '__main__':
+    unittest.main()
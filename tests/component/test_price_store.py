@@ -0,0 +1,65 @@
+import unittest
+import tempfile
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'src'))
+from model.quantitative import price_store
+
+class TestPriceStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store_dir = self.tmp_dir.name
+        index = pd.date_range('2024-01-01', periods=5, freq='D')
+        self.data = pd.DataFrame({
+            'Adj Close': ['10.0', '10.5', '11.0', '10.8', '11.2'],
+            'Close': ['10.0', '10.5', '11.0', '10.8', '11.2'],
+            'High': [10.2, 10.7, 11.1, 11.0, 11.3],
+            'Low': [9.8, 10.1, 10.6, 10.5, 10.9],
+            'Open': [9.9, 10.2, 10.7, 11.0, 10.9],
+            'Volume': [1000, 1500, 1200, 900, 1100],
+        }, index=index)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip_is_typed(self):
+        price_store.write_ticker('AAPL', self.data, store_dir=self.store_dir)
+        loaded = price_store.read_ticker('AAPL', store_dir=self.store_dir)
+
+        self.assertEqual(list(loaded.columns), price_store.PRICE_COLUMNS)
+        self.assertEqual(loaded['Close'].dtype, np.float64)
+        self.assertEqual(loaded['Volume'].dtype, np.int64)
+        np.testing.assert_allclose(loaded['Close'].values, [10.0, 10.5, 11.0, 10.8, 11.2])
+        self.assertTrue(loaded.index.equals(self.data.index))
+
+    def test_manifest_tracks_tickers(self):
+        price_store.write_all({'AAPL': self.data, 'MSFT': self.data.iloc[:3]}, store_dir=self.store_dir)
+        manifest = price_store.read_manifest(self.store_dir)
+
+        self.assertEqual(manifest['AAPL']['rows'], 5)
+        self.assertEqual(manifest['MSFT']['last_date'], '2024-01-03')
+        self.assertEqual(set(price_store.load_all(store_dir=self.store_dir)), {'AAPL', 'MSFT'})
+
+    def test_append_only_adds_new_bars(self):
+        price_store.write_ticker('AAPL', self.data.iloc[:3], store_dir=self.store_dir)
+        self.assertEqual(price_store.last_date('AAPL', store_dir=self.store_dir), pd.Timestamp('2024-01-03'))
+
+        # Overlapping bar on 2024-01-03 replaces the stored one
+        price_store.append_ticker('AAPL', self.data.iloc[2:], store_dir=self.store_dir)
+        loaded = price_store.read_ticker('AAPL', store_dir=self.store_dir)
+
+        self.assertEqual(len(loaded), 5)
+        self.assertTrue(loaded.index.is_monotonic_increasing)
+        self.assertEqual(price_store.last_date('AAPL', store_dir=self.store_dir), pd.Timestamp('2024-01-05'))
+
+    def test_multiindex_columns_are_flattened(self):
+        data = pd.concat({'AAPL': self.data}, axis=1).swaplevel(axis=1)
+        records = price_store.to_records(data)
+        self.assertEqual(len(records), 5)
+
+if __name__ == '__main__':
+    unittest.main()
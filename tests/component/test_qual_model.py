@@ -2,30 +2,39 @@ import unittest
 from unittest.mock import Mock, patch
 import sys
 import os
+import tempfile
+from datetime import datetime
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'src'))
-from model.qualitative.qual_model import determine_sentiments, basic_cleanup, add_sentiment, get_article_text, preprocess_data, preprocess_and_update
+from model.qualitative import article_cache
+from model.qualitative.qual_model import determine_sentiments, basic_cleanup, add_sentiment, get_article_text, cached_article_text, classify_texts, add_sentiments, resolve_device, stream_sentiments, write_scores, read_scores, ArticleIndex, update_ticker_sentiment, sentiment_key
 import pandas as pd
 
 class TestQualModel(unittest.TestCase):
 
-    @patch('model.qualitative.qual_model.fetch_news')
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        patcher = patch('model.qualitative.article_cache.CACHE_PATH', os.path.join(self.tmp_dir.name, 'article_cache.sqlite'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('model.qualitative.qual_model.load_tickers', return_value=['AAPL', 'GOOGL'])
+    @patch('model.qualitative.qual_model.news_fetcher_helper')
     @patch('model.qualitative.qual_model.get_article_text')
-    @patch('model.qualitative.qual_model.pipeline')
-    def test_update_progress(self, mock_pipeline, mock_get_article_text, mock_fetch_news):
+    @patch('model.qualitative.sentiment_backends.pipeline')
+    def test_update_progress(self, mock_pipeline, mock_get_article_text, mock_news_fetcher_helper, mock_load_tickers):
         # Mock progress callback
         progress_callback = Mock()
 
-        # Mock fetch_news to return a controlled set of data
-        mock_fetch_news.return_value = {
-            'AAPL': pd.DataFrame({'link': ['http://example.com'], 'summary': ['summary'], 'published': ['date'], 'title': ['title']}),
-            'GOOGL': pd.DataFrame({'link': ['http://example.com'], 'summary': ['summary'], 'published': ['date'], 'title': ['title']})
-        }
+        # Mock the RSS fetch to return a controlled set of data
+        news = pd.DataFrame({'link': ['http://example.com'], 'summary': ['summary'], 'published': ['date'], 'title': ['title']})
+        mock_news_fetcher_helper.side_effect = lambda ticker: (ticker, news)
 
         # Mock get_article_text to return a controlled text
         mock_get_article_text.return_value = "This is a test article text."
 
-        # Mock sentiment_pipeline to return a controlled sentiment
-        mock_pipeline.return_value = lambda text: [{'label': 'POSITIVE'}]
+        # Mock sentiment_pipeline to return a controlled sentiment for each text in a batch
+        mock_pipeline.return_value = lambda texts: [{'label': 'POSITIVE'}] * len(texts)
 
         # Call determine_sentiments with the mock progress callback
         determine_sentiments(progress_callback=progress_callback)
@@ -33,5 +42,248 @@ class TestQualModel(unittest.TestCase):
         # Check if progress callback was called with the correct progress percentage
         progress_callback.assert_called_with(100.0)
 
+    @patch('model.qualitative.qual_model.torch.cuda.device_count', return_value=1)
+    def test_resolve_device(self, mock_device_count):
+        self.assertEqual(resolve_device('cpu'), -1)
+        self.assertEqual(resolve_device('cuda'), 0)
+        # Missing GPUs fall back to the CPU instead of failing
+        self.assertEqual(resolve_device('cuda:1'), -1)
+        self.assertEqual(resolve_device(-1), -1)
+        with self.assertRaises(ValueError):
+            resolve_device('tpu')
+
+    def test_classify_texts_sorts_by_token_length(self):
+        sentiment_pipeline = Mock(side_effect=lambda texts: [{'label': 'POSITIVE' if 'good' in text else 'NEGATIVE'} for text in texts])
+        sentiment_pipeline.tokenizer = Mock(side_effect=lambda texts, **kwargs: {'input_ids': [text.split() for text in texts]})
+        texts = ["a long and good article text", "bad", "good news"]
+
+        labels = classify_texts(texts, sentiment_pipeline)
+
+        # Shortest first into the model, labels back in input order
+        sentiment_pipeline.assert_called_once_with(["bad", "good news", "a long and good article text"])
+        sentiment_pipeline.tokenizer.assert_called_once_with(texts, truncation=True, max_length=512)
+        self.assertEqual([result['label'] for result in labels], ['POSITIVE', 'NEGATIVE', 'POSITIVE'])
+
+    def test_add_sentiments_batches_across_tickers(self):
+        sentiment_pipeline = Mock(side_effect=lambda texts: [{'label': 'POSITIVE'}] * len(texts), tokenizer=None)
+        frames = {
+            'AAPL': pd.DataFrame({'article_text': ['text one', 'N/A']}),
+            'GOOGL': pd.DataFrame({'article_text': ['text two']}),
+            'MSFT': None,
+        }
+        frames = add_sentiments(frames, sentiment_pipeline)
+
+        sentiment_pipeline.assert_called_once()
+        self.assertEqual(list(frames['AAPL']['sentiment']), ['POSITIVE', 'UNKNOWN'])
+        self.assertEqual(list(frames['GOOGL']['sentiment']), ['POSITIVE'])
+        self.assertIsNone(frames['MSFT'])
+
+    @patch('model.qualitative.qual_model.get_article_text')
+    def test_repeat_articles_skip_fetch_and_model(self, mock_get_article_text):
+        cache = article_cache.ArticleCache(os.path.join(self.tmp_dir.name, 'cache.sqlite'))
+        self.addCleanup(cache.close)
+        mock_get_article_text.side_effect = lambda url, fetcher=None: f"text of {url}"
+        sentiment_pipeline = Mock(side_effect=lambda texts: [{'label': 'POSITIVE', 'score': 0.9}] * len(texts), tokenizer=None)
+        news = pd.DataFrame({'link': ['http://a', 'http://b'], 'summary': ['s', 's'], 'published': ['d', 'd'], 'title': ['t', 't']})
+
+        def score(news):
+            news = news.assign(article_text=[cached_article_text(link, cache) for link in news['link']])
+            return add_sentiment(news, sentiment_pipeline, cache)
+
+        first = score(news)
+        second = score(news)
+
+        self.assertEqual(mock_get_article_text.call_count, 2)
+        sentiment_pipeline.assert_called_once()
+        self.assertEqual(list(second['sentiment']), ['POSITIVE', 'POSITIVE'])
+        self.assertEqual(list(second['confidence']), list(first['confidence']))
+
+    def test_cached_sentiments_are_kept_per_backend(self):
+        cache = article_cache.ArticleCache(os.path.join(self.tmp_dir.name, 'cache.sqlite'))
+        self.addCleanup(cache.close)
+        sentiment_pipeline = Mock(side_effect=lambda texts: [{'label': 'POSITIVE', 'score': 0.9}] * len(texts), tokenizer=None)
+        articles = lambda: pd.DataFrame({'article_text': ['Shares rose.', 'Shares fell.']})
+
+        for backend in ['pytorch', 'openvino', 'pytorch']:
+            with patch('model.qualitative.qual_model.SENTIMENT_BACKEND', backend):
+                add_sentiment(articles(), sentiment_pipeline, cache)
+        # The pytorch results are reused, the openvino ones are not mixed in
+        self.assertEqual(sentiment_pipeline.call_count, 2)
+
+        # OpenVINO results are also kept apart per inference precision
+        f32_key = sentiment_key('openvino')
+        with patch('model.qualitative.qual_model.sentiment_backends.OPENVINO_PRECISION', 'bf16'):
+            self.assertNotEqual(sentiment_key('openvino'), f32_key)
+
+class SequentialFetcher:
+    def map(self, func, items, on_done=None):
+        return [func(item) for item in items]
+
+class TestStreamSentiments(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.output_path = os.path.join(self.tmp_dir.name, 'sentiment_scores.csv')
+        self.tickers = [f"T{i:02d}" for i in range(30)]
+
+        def news(ticker):
+            if ticker == 'T05':
+                raise ConnectionError("feed down")
+            n = int(ticker[1:]) % 3
+            return ticker, pd.DataFrame({'link': [f"http://{ticker}/{j}" for j in range(n)], 'summary': ['s'] * n,
+                                         'published': ['d'] * n, 'title': ['t'] * n})
+        patcher = patch('model.qualitative.qual_model.news_fetcher_helper', side_effect=news)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('model.qualitative.qual_model.get_article_text',
+                        side_effect=lambda url, fetcher=None: "good news" if url.endswith('/0') else "bad news")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_scores_every_ticker_in_order(self):
+        sentiment_pipeline = Mock(side_effect=lambda texts: [{'label': 'POSITIVE' if 'good' in text else 'NEGATIVE', 'score': 0.9} for text in texts],
+                                  tokenizer=None)
+        progress = []
+        scores = stream_sentiments(self.tickers, sentiment_pipeline, None, SequentialFetcher(), self.output_path,
+                                   progress.append, queue_size=2, score_batch=8, checkpoint_every=5)
+
+        # One confident fresh positive article against the neutral prior
+        expected = {ticker: [0, 0.9 / 1.9, 0][int(ticker[1:]) % 3] for ticker in self.tickers}
+        expected['T05'] = 0
+        self.assertEqual(scores.keys(), expected.keys())
+        for ticker, score in scores.items():
+            self.assertAlmostEqual(score, expected[ticker], places=6)
+        self.assertEqual(list(read_scores(self.output_path)), self.tickers)
+        self.assertEqual(progress[-1], 100.0)
+        self.assertEqual(progress, sorted(progress))
+
+    @patch('model.qualitative.qual_model.get_article_text', side_effect=lambda url, fetcher=None: f"text of {url}")
+    @patch('model.qualitative.qual_model.news_fetcher_helper')
+    def test_shared_articles_are_fetched_and_scored_once(self, mock_news_fetcher_helper, mock_get_article_text):
+        # Every ticker lists the same sector article next to one of its own
+        mock_news_fetcher_helper.side_effect = lambda ticker: (ticker, pd.DataFrame({
+            'link': ['http://sector', f"http://{ticker}"], 'summary': ['s', 's'], 'published': ['d', 'd'], 'title': ['t', 't']}))
+        scored = []
+        def sentiment_pipeline(texts):
+            scored.extend(texts)
+            return [{'label': 'POSITIVE', 'score': 0.9}] * len(texts)
+        cache = article_cache.ArticleCache(os.path.join(self.tmp_dir.name, 'cache.sqlite'))
+        self.addCleanup(cache.close)
+        index = ArticleIndex()
+
+        scores = stream_sentiments(self.tickers, sentiment_pipeline, cache, SequentialFetcher(), self.output_path,
+                                   queue_size=4, score_batch=16, index=index)
+
+        self.assertTrue(all(score == scores['T00'] > 0 for score in scores.values()))
+        self.assertEqual(mock_get_article_text.call_count, 31)
+        self.assertEqual(len(scored), 31)
+        self.assertEqual(index.summary(), {'listings': 60, 'unique_links': 31, 'shared_links': 1, 'dedup_ratio': 60 / 31})
+        self.assertEqual(index.tickers['http://sector'], set(self.tickers))
+
+    @patch('model.qualitative.qual_model.get_article_text', side_effect=lambda url, fetcher=None: "N/A" if url == 'http://sector' else f"text of {url}")
+    @patch('model.qualitative.qual_model.news_fetcher_helper')
+    def test_failed_shared_article_is_fetched_once(self, mock_news_fetcher_helper, mock_get_article_text):
+        # The sector article every ticker lists fails to download, and failures are not cached
+        mock_news_fetcher_helper.side_effect = lambda ticker: (ticker, pd.DataFrame({
+            'link': ['http://sector', f"http://{ticker}"], 'summary': ['s', 's'], 'published': ['d', 'd'], 'title': ['t', 't']}))
+        def sentiment_pipeline(texts):
+            return [{'label': 'POSITIVE', 'score': 0.9}] * len(texts)
+        cache = article_cache.ArticleCache(os.path.join(self.tmp_dir.name, 'cache.sqlite'))
+        self.addCleanup(cache.close)
+
+        stream_sentiments(self.tickers, sentiment_pipeline, cache, SequentialFetcher(), self.output_path,
+                          queue_size=4, score_batch=16)
+
+        fetched = [call.args[0] for call in mock_get_article_text.call_args_list]
+        self.assertEqual(fetched.count('http://sector'), 1)
+        self.assertEqual(len(fetched), 31)
+        self.assertIsNone(cache.get_text('http://sector'))
+
+    @patch('model.qualitative.qual_model.get_article_text', side_effect=lambda url, fetcher=None: f"text of {url}")
+    @patch('model.qualitative.qual_model.news_fetcher_helper')
+    def test_links_repeated_in_a_feed_are_fetched_once(self, mock_news_fetcher_helper, mock_get_article_text):
+        mock_news_fetcher_helper.side_effect = lambda ticker: (ticker, pd.DataFrame({
+            'link': ['http://a', 'http://b', 'http://a'], 'summary': ['s'] * 3, 'published': ['d'] * 3, 'title': ['t'] * 3}))
+        frames = []
+        def sentiment_pipeline(texts):
+            return [{'label': 'POSITIVE', 'score': 0.9}] * len(texts)
+        index = ArticleIndex()
+
+        with patch('model.qualitative.qual_model.update_ticker_sentiment', side_effect=lambda ticker, frame, cache, now: frames.append(frame) or 0.0):
+            stream_sentiments(['AAPL'], sentiment_pipeline, None, SequentialFetcher(), self.output_path, index=index)
+
+        self.assertEqual(mock_get_article_text.call_count, 2)
+        self.assertEqual(list(frames[0]['article_text']), ['text of http://a', 'text of http://b', 'text of http://a'])
+        self.assertEqual(index.summary(), {'listings': 2, 'unique_links': 2, 'shared_links': 0, 'dedup_ratio': 1.0})
+
+    def test_failure_keeps_checkpointed_scores(self):
+        write_scores({ticker: 0.5 for ticker in self.tickers}, self.output_path)
+        calls = []
+        def sentiment_pipeline(texts):
+            calls.append(texts)
+            if len(calls) > 2:
+                raise RuntimeError("model crashed")
+            return [{'label': 'NEGATIVE', 'score': 0.9}] * len(texts)
+
+        with self.assertRaisesRegex(RuntimeError, "model crashed"):
+            stream_sentiments(self.tickers, sentiment_pipeline, None, SequentialFetcher(), self.output_path,
+                              queue_size=2, score_batch=1, checkpoint_every=1)
+
+        # Tickers scored before the failure are updated, the rest keep the previous run's score
+        saved = read_scores(self.output_path)
+        self.assertEqual(set(saved), set(self.tickers))
+        self.assertTrue(any(score < 0 for score in saved.values()))
+        self.assertIn(0.5, saved.values())
+
+class TestSentimentAggregation(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.cache = article_cache.ArticleCache(os.path.join(self.tmp_dir.name, 'cache.sqlite'))
+        self.addCleanup(self.cache.close)
+        self.now = pd.Timestamp('2024-10-14 12:00', tz='UTC').timestamp()
+
+    def frame(self, rows):
+        return pd.DataFrame(rows, columns=['link', 'published', 'sentiment', 'confidence'])
+
+    def test_weights_confidence_and_recency(self):
+        frame = self.frame([
+            ('http://new', 'Mon, 14 Oct 2024 12:00:00 +0000', 'POSITIVE', 0.9),
+            # Three days old, one half-life
+            ('http://old', 'Fri, 11 Oct 2024 12:00:00 +0000', 'NEGATIVE', 0.6),
+            ('http://failed', 'Mon, 14 Oct 2024 12:00:00 +0000', 'UNKNOWN', float('nan')),
+        ])
+        score = update_ticker_sentiment('AAPL', frame, now=self.now)
+        self.assertAlmostEqual(score, (0.9 - 0.3) / (0.9 + 0.3 + 1.0))
+
+    def test_rerun_only_adds_new_articles(self):
+        first = self.frame([('http://a', 'Mon, 14 Oct 2024 12:00:00 +0000', 'POSITIVE', 0.8)])
+        score = update_ticker_sentiment('AAPL', first, self.cache, self.now)
+        self.assertAlmostEqual(score, 0.8 / 1.8)
+
+        # A day later the feed still lists the first article next to a new one
+        day_later = self.now + 86400
+        second = pd.concat([first, self.frame([('http://b', 'Tue, 15 Oct 2024 12:00:00 +0000', 'NEGATIVE', 0.5)])])
+        score = update_ticker_sentiment('AAPL', second, self.cache, day_later)
+        carried = 0.8 * 2 ** (-1 / 3)
+        self.assertAlmostEqual(score, (carried - 0.5) / (carried + 0.5 + 1.0))
+
+        # Same as scoring everything from scratch
+        self.assertAlmostEqual(score, update_ticker_sentiment('MSFT', second, now=day_later))
+        # With no new news the score fades toward neutral
+        faded = update_ticker_sentiment('AAPL', None, self.cache, day_later + 30 * 86400)
+        self.assertLess(abs(faded), abs(score) / 10)
+
+    def test_evicted_articles_still_in_the_feed_are_not_counted_again(self):
+        # Each day the feed still lists an article from well past the eviction cutoff
+        stale = self.frame([('http://stale', 'Tue, 24 Sep 2024 12:00:00 +0000', 'POSITIVE', 0.9)])
+        for day in range(5):
+            now = self.now + day * 86400
+            self.cache.evict(now=datetime.fromtimestamp(now))
+            self.assertEqual(update_ticker_sentiment('AAPL', stale, self.cache, now), 0.0)
+        self.assertEqual(self.cache.get_ticker_state('AAPL')[1], 0.0)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,116 @@
+import unittest
+import sys
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'src'))
+from model.quantitative import quant_model as qm
+
+def reference_obv(close, volume):
+    obv = [0]
+    for i in range(1, len(close)):
+        if close.iloc[i] > close.iloc[i - 1]:
+            obv.append(obv[-1] + volume.iloc[i])
+        elif close.iloc[i] < close.iloc[i - 1]:
+            obv.append(obv[-1] - volume.iloc[i])
+        else:
+            obv.append(obv[-1])
+    return pd.Series(obv, index=close.index)
+
+def reference_features(data):
+    '''Row-by-row feature pipeline the vectorized engine replaced'''
+    data = data.copy()
+    for col in data.columns:
+        data[col] = pd.to_numeric(data[col], errors='coerce')
+        if data[col].isnull().any():
+            data.dropna(subset=['Close'], inplace=True)
+
+    data['Daily_Return'] = data['Close'].pct_change()
+    for i in range(1, 5):
+        data[f'Return_Lag{i}'] = data['Daily_Return'].shift(i)
+    data['ROC_5'] = data['Close'].pct_change(periods=5)
+    data['MA_Return_5'] = data['Daily_Return'].rolling(window=5).mean()
+    data['Volatility_5'] = data['Daily_Return'].rolling(window=5).std()
+    data['Volatility_10'] = data['Daily_Return'].rolling(window=10).std().fillna(0)
+    data['RSI'] = qm.compute_rsi(data['Close']) / 100.0
+    data['OBV'] = reference_obv(data['Close'], data['Volume']).pct_change()
+    data['MACD'], data['MACD_Signal'] = qm.compute_macd(data['Close'])
+
+    data.replace([np.inf, -np.inf], np.nan, inplace=True)
+    data.dropna(inplace=True)
+    return data
+
+@pytest.mark.usefixtures('make_prices')
+class TestQuantFeatures(unittest.TestCase):
+
+    def csv_prices(self, seed=7):
+        data = self.make_prices(rows=400, seed=seed, start='2020-01-01')
+        # Repeat a few closes so the flat OBV branch is exercised
+        data.iloc[50:53, data.columns.get_loc('Close')] = data['Close'].iloc[50]
+        data.insert(0, 'Adj Close', data['Close'])
+        # String values as they came out of the wide CSV, plus one unparsable close
+        data = data.astype(str)
+        data.iloc[120, data.columns.get_loc('Close')] = 'bad'
+        return data
+
+    def test_obv_matches_loop(self):
+        data = self.csv_prices().apply(pd.to_numeric, errors='coerce').dropna()
+        expected = reference_obv(data['Close'], data['Volume'])
+        actual = qm.compute_obv(data['Close'], data['Volume'])
+        np.testing.assert_array_equal(actual.values, expected.values)
+
+    def test_preprocess_matches_reference(self):
+        data = self.csv_prices()
+        expected = reference_features(data)
+        actual = qm.preprocess_ticker_data(data)
+
+        self.assertTrue(actual.index.equals(expected.index))
+        self.assertEqual(list(actual.columns), list(expected.columns))
+        for col in expected.columns:
+            np.testing.assert_allclose(actual[col].values, expected[col].values, rtol=1e-9, atol=1e-12, err_msg=col)
+
+    def test_panel_matches_per_ticker(self):
+        ticker_data = {
+            'AAPL': self.csv_prices(seed=1),
+            # Listed later than the others and with a gap in its history
+            'ABNB': self.csv_prices(seed=2).iloc[150:].drop(self.csv_prices().index[250:253]),
+            'MSFT': self.csv_prices(seed=3),
+        }
+        panel = qm.preprocess_panel(ticker_data)
+
+        self.assertEqual(set(panel), set(ticker_data))
+        for ticker, data in ticker_data.items():
+            expected = qm.preprocess_ticker_data(data)
+            actual = panel[ticker]
+            self.assertTrue(actual.index.equals(expected.index), ticker)
+            for col in ['Daily_Return'] + qm.FEATURE_COLUMNS:
+                np.testing.assert_allclose(actual[col].values, expected[col].values, rtol=1e-9, atol=1e-12, err_msg=f"{ticker} {col}")
+
+class TestSearchSpace(unittest.TestCase):
+
+    def test_full_search_without_previous_params(self):
+        self.assertEqual(qm.search_space(qm.XGB_PARAM_GRID), (qm.XGB_PARAM_GRID, qm.FULL_SEARCH_ITER))
+
+    def test_neighborhood_of_previous_best(self):
+        best = {'n_estimators': 500, 'max_depth': None, 'min_samples_split': 5, 'min_samples_leaf': 1,
+                'max_features': 'sqrt', 'bootstrap': False}
+        grid, n_iter = qm.search_space(qm.RF_PARAM_GRID, best)
+        self.assertEqual(grid['n_estimators'], [400, 500])
+        self.assertEqual(grid['min_samples_split'], [2, 5, 10])
+        self.assertEqual(grid['min_samples_leaf'], [1, 2])
+        # None, categorical and boolean options move to their neighbours in the grid too
+        self.assertEqual(grid['max_depth'], [None, 10])
+        self.assertEqual(grid['max_features'], [1.0, 'sqrt', 'log2'])
+        self.assertEqual(grid['bootstrap'], [True, False])
+        self.assertEqual(n_iter, qm.WARM_SEARCH_ITER)
+
+    def test_budget_capped_by_grid_size(self):
+        best = {'n_estimators': 100, 'max_depth': 10, 'min_samples_split': 2, 'min_samples_leaf': 4,
+                'max_features': 'log2', 'bootstrap': True}
+        grid, n_iter = qm.search_space({name: qm.RF_PARAM_GRID[name] for name in ['n_estimators', 'min_samples_leaf', 'bootstrap']}, best)
+        self.assertEqual(n_iter, 2 * 2 * 2)
+
+if __name__ == '__main__':
+    unittest.main()
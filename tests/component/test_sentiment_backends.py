@@ -0,0 +1,89 @@
+import unittest
+import tempfile
+import sys
+import os
+import torch
+from transformers import AutoConfig, DistilBertConfig, DistilBertForSequenceClassification, DistilBertTokenizerFast
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'src'))
+from model.qualitative import sentiment_backends
+from model.qualitative.qual_model import classify_texts
+
+WORDS = "shares rose fell up down strong weak record loss profit beat missed guidance .".split()
+
+def make_model(model_dir):
+    '''
+    A small untrained DistilBERT classifier. Its head is scaled up so predictions are
+    confident and labels can be compared across backends.
+    '''
+    os.makedirs(model_dir)
+    vocab_path = os.path.join(model_dir, 'vocab.txt')
+    with open(vocab_path, 'w') as f:
+        f.write('\n'.join(['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + WORDS))
+    DistilBertTokenizerFast(vocab_path).save_pretrained(model_dir)
+    config = DistilBertConfig(vocab_size=5 + len(WORDS), dim=32, hidden_dim=64, n_layers=2, n_heads=2,
+                              id2label={0: 'NEGATIVE', 1: 'POSITIVE'}, label2id={'NEGATIVE': 0, 'POSITIVE': 1})
+    torch.manual_seed(0)
+    model = DistilBertForSequenceClassification(config)
+    with torch.no_grad():
+        model.classifier.weight.mul_(50)
+    model.save_pretrained(model_dir)
+
+class TestSentimentBackends(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.model_dir = os.path.join(cls.tmp_dir.name, 'model')
+        cls.openvino_dir = os.path.join(cls.tmp_dir.name, 'openvino')
+        make_model(cls.model_dir)
+        cls.texts = [' '.join(WORDS[(i * 7 + j) % len(WORDS)] for j in range(3 + i % 40)) for i in range(60)]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def load(self, backend):
+        return sentiment_backends.load_backend(backend, self.model_dir, batch_size=8, device=-1,
+                                               max_length=64, model_dir=self.openvino_dir)
+
+    def load_from(self, model_dir):
+        return sentiment_backends.load_backend('openvino', model_dir, batch_size=8, device=-1,
+                                               max_length=64, model_dir=self.openvino_dir)
+
+    def test_openvino_matches_pytorch(self):
+        reference = classify_texts(self.texts, self.load('pytorch'))
+        results = classify_texts(self.texts, self.load('openvino'))
+        self.assertEqual([r['label'] for r in results], [r['label'] for r in reference])
+        for result, expected in zip(results, reference):
+            self.assertAlmostEqual(result['score'], expected['score'], places=4)
+
+        # The converted model is kept and reused
+        revision = sentiment_backends.model_revision(self.model_dir, AutoConfig.from_pretrained(self.model_dir))
+        path = sentiment_backends.openvino_model_path(self.model_dir, revision, self.openvino_dir)
+        modified = os.path.getmtime(path)
+        self.load('openvino')
+        self.assertEqual(os.path.getmtime(path), modified)
+
+    def test_new_weights_are_converted_again(self):
+        model_dir = os.path.join(self.tmp_dir.name, 'retrained')
+        make_model(model_dir)
+        self.load_from(model_dir)
+        DistilBertForSequenceClassification.from_pretrained(model_dir).save_pretrained(model_dir)
+        os.utime(os.path.join(model_dir, 'model.safetensors'), ns=(0, 0))
+        self.load_from(model_dir)
+        converted = [name for name in os.listdir(self.openvino_dir) if 'retrained' in name]
+        self.assertEqual(len(converted), 2)
+
+    def test_int8_mostly_agrees_with_pytorch(self):
+        reference = classify_texts(self.texts, self.load('pytorch'))
+        results = classify_texts(self.texts, self.load('int8'))
+        agreement = sum(r['label'] == e['label'] for r, e in zip(results, reference)) / len(reference)
+        self.assertGreaterEqual(agreement, 0.9)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            self.load('tensorrt')
+
+if __name__ == '__main__':
+    unittest.main()
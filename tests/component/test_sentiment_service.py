@@ -0,0 +1,58 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+from multiprocessing.connection import Client
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'src'))
+from model.qualitative import sentiment_service
+
+class FakePipeline:
+    tokenizer = None
+    device = 'cpu'
+
+    def __init__(self):
+        self.loaded_in = os.getpid()
+
+    def __call__(self, texts):
+        return [{'label': 'POSITIVE' if 'up' in text else 'NEGATIVE', 'score': float(self.loaded_in)} for text in texts]
+
+def fake_loader(batch_size, device):
+    return FakePipeline()
+
+def failing_loader(batch_size, device):
+    raise OSError("model files missing")
+
+class TestSentimentWorker(unittest.TestCase):
+
+    def test_worker_loads_model_once_and_serves_batches(self):
+        worker = sentiment_service.SentimentWorker(batch_size=8, loader=fake_loader, timeout=60)
+        self.addCleanup(worker.stop)
+
+        first = worker.client(["shares up", "shares down"])
+        second = worker.client(["up again"])
+        self.assertEqual([result['label'] for result in first + second], ['POSITIVE', 'NEGATIVE', 'POSITIVE'])
+        # Every batch was scored by the model loaded in the worker process
+        self.assertEqual({result['score'] for result in first + second}, {float(worker.process.pid)})
+        self.assertEqual(worker.client.ping()['batch_size'], 8)
+
+        # A client without the key is turned away and the worker keeps serving
+        with self.assertRaises(Exception):
+            Client(worker.client.address, authkey=b'wrong').send(('ping', None))
+        self.assertEqual(worker.client(["up"])[0]['label'], 'POSITIVE')
+
+        worker.stop()
+        self.assertFalse(worker.is_alive())
+
+    def test_failed_model_load_is_reported(self):
+        with self.assertRaisesRegex(RuntimeError, "model files missing"):
+            sentiment_service.SentimentWorker(loader=failing_loader, timeout=60)
+
+    @patch('model.qualitative.sentiment_service.qual_model.determine_sentiments')
+    @patch('model.qualitative.sentiment_service.ensure_worker', side_effect=RuntimeError("no worker"))
+    def test_falls_back_to_in_process_model(self, mock_ensure_worker, mock_determine_sentiments):
+        sentiment_service.determine_sentiments(progress_callback=print)
+        mock_determine_sentiments.assert_called_once_with(print, sentiment_pipeline=None)
+
+if __name__ == '__main__':
+    unittest.main()
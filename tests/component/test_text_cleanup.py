@@ -0,0 +1,88 @@
+import unittest
+import sys
+import os
+import re
+import unicodedata
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'src'))
+from model.qualitative.qual_model import basic_cleanup, filler_texts, extract_paragraphs, ParagraphStream
+from model.qualitative.text_benchmark import load_corpus
+
+def reference_basic_cleanup(text):
+    '''Regex pipeline the precompiled cleanup replaced'''
+    cleaned_text = unicodedata.normalize('NFKD', text).encode('ascii','ignore').decode('utf-8', 'ignore')
+    cleaned_text = re.sub(r'[^a-zA-Z0-9.,;:!?\'\"()\s]', '', cleaned_text)
+    cleaned_text = re.sub(r'\s+', ' ', cleaned_text).strip()
+    filler_pattern = '|'.join(map(re.escape, filler_texts))
+    whitespace_pattern = r'\s+'
+    cleaned_text = re.sub(whitespace_pattern, ' ', re.sub(filler_pattern,'',cleaned_text)).strip()
+    return cleaned_text
+
+class TestTextCleanup(unittest.TestCase):
+
+    def test_matches_reference_on_edge_cases(self):
+        texts = [
+            "",
+            "   \t\n ",
+            "Café naïve — “quoted” ½ price rise today 　 \U0001F680 #tags @you $AAPL 50%",
+            "Line one\r\nLine\x0btwo\x1cthree\x1f four\x00five",
+            # Overlapping fillers, the combined Motley Fool blurb is listed after its parts
+            filler_texts[5] + " Shares rose. " + filler_texts[3],
+            "Read the latest financial and business news from Yahoo Finance Sign in to access your portfolio and more",
+            "Zacks Investment Research Sign in to access your portfolio",
+            "The Motley Fool has a  disclosure\n policy. Split fillers across whitespace still match after collapsing.",
+            "This post was writtenThis post was written twice",
+        ]
+        for text in texts:
+            self.assertEqual(basic_cleanup(text), reference_basic_cleanup(text), repr(text))
+
+    def test_matches_reference_on_random_articles(self):
+        rng = np.random.default_rng(11)
+        alphabet = list("abcdefghijklmnopqrstuvwxyzABC0123456789 .,;:!?'\"()-_/\\#%&*\n\téü’– ​")
+        for _ in range(200):
+            parts = [''.join(rng.choice(alphabet, rng.integers(0, 80))) for _ in range(4)]
+            fillers = rng.choice(filler_texts, 2)
+            text = parts[0] + fillers[0] + parts[1] + ' ' + fillers[1] + parts[2] + fillers[0][:10] + parts[3]
+            self.assertEqual(basic_cleanup(text), reference_basic_cleanup(text), repr(text))
+
+class TestParagraphExtraction(unittest.TestCase):
+
+    def test_backends_match_beautifulsoup(self):
+        pages = load_corpus(n_articles=20, seed=3) + [
+            "",
+            "<html><body><div>No paragraphs</div></body></html>",
+            '<?xml version="1.0" encoding="utf-8"?><html><body><p>Caf\u00e9 <b>bold</b> <a href="#">link</a></p>'
+            '<script>var p = "<p>not text</p>";</script><p>Second &amp; last</p></body></html>',
+            # The last paragraph is never closed
+            "<p>one</p><p>two",
+        ]
+        for html in pages:
+            reference = basic_cleanup(extract_paragraphs(html, 'bs4'))
+            self.assertEqual(basic_cleanup(extract_paragraphs(html, 'lxml')), reference)
+            self.assertEqual(basic_cleanup(extract_paragraphs(html, 'stream', max_chars=10**9)), reference)
+
+        # A Latin-1 page is decoded with its declared charset, and never fails the article
+        page = "<html><body><p>Caf\u00e9 cr\u00e8me</p><p>D\u00e9j\u00e0 vu</p></body></html>"
+        stream = ParagraphStream(max_chars=10**9, encoding='iso-8859-1')
+        stream.feed(page.encode('latin-1'))
+        stream.close()
+        self.assertEqual(basic_cleanup(stream.text()), basic_cleanup(extract_paragraphs(page, 'bs4')))
+        stream = ParagraphStream(max_chars=10**9)
+        stream.feed(page.encode('latin-1'))
+        stream.close()
+        self.assertEqual(stream.text(), "Caf\ufffd cr\ufffdme D\ufffdj\ufffd vu")
+
+    def test_stream_stops_after_enough_text(self):
+        stream = ParagraphStream(max_chars=100)
+        self.assertFalse(stream.feed(b"<html><body><p>" + b"a" * 60 + b"</p>"))
+        self.assertTrue(stream.feed(b"<p>" + b"b" * 60 + b"</p><p>c</p>"))
+        self.assertEqual(stream.text(), "a" * 60 + " " + "b" * 60)
+        self.assertEqual(len(extract_paragraphs("<p>x</p>" * 10_000, 'stream', max_chars=50)), 99)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            extract_paragraphs("<p>x</p>", 'regex')
+
+if __name__ == '__main__':
+    unittest.main()
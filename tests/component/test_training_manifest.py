@@ -0,0 +1,95 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from datetime import datetime, timedelta
+import tempfile
+import sys
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'src'))
+from model.quantitative import training_manifest
+from model.quantitative import quant_model as qm
+
+@pytest.mark.usefixtures('make_prices')
+class TestTrainingManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.model_file = os.path.join(self.tmp_dir.name, 'AAPL_quant_model.pkl')
+        open(self.model_file, 'wb').close()
+        patcher = patch('model.quantitative.training_manifest.qm.model_path', return_value=self.model_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        self.now = datetime(2024, 6, 1)
+        self.data = self.make_prices(seed=5)
+        self.manifest = {}
+        training_manifest.record_training(self.manifest, 'AAPL', self.data.iloc[:-3],
+                                          {'feature_version': qm.FEATURE_VERSION, 'rmse': 0.02}, now=self.now)
+
+    def reason(self, data, features=None, **kwargs):
+        if features is None:
+            features = pd.DataFrame(0.0, index=data.index[-3:], columns=['Daily_Return'] + qm.FEATURE_COLUMNS)
+        return training_manifest.retrain_reason('AAPL', self.manifest['AAPL'], data, features, **kwargs)
+
+    @patch('model.quantitative.training_manifest.qm.load_model')
+    def test_few_new_rows_are_skipped(self, mock_load_model):
+        mock_load_model.return_value = MagicMock(predict=MagicMock(return_value=np.full(3, 0.01)))
+        self.assertIsNone(self.reason(self.data, now=self.now + timedelta(days=7)))
+        # The model was scored on the three new bars only
+        self.assertEqual(len(mock_load_model.return_value.predict.call_args.args[0]), 3)
+
+    def test_policy_triggers(self):
+        self.assertEqual(self.reason(self.data, policy={'min_new_rows': 3}, now=self.now), "3 new rows")
+        self.assertIn("weeks old", self.reason(self.data, now=self.now + timedelta(weeks=5)))
+        self.assertEqual(training_manifest.retrain_reason('AAPL', None, self.data, None), "no previous training record")
+
+    def test_rewritten_history_is_detected(self):
+        adjusted = self.data.copy()
+        adjusted['Close'] = adjusted['Close'] / 2
+        self.assertEqual(self.reason(adjusted, now=self.now), "stored price history changed")
+
+    @patch('model.quantitative.training_manifest.qm.load_model')
+    def test_score_drift(self, mock_load_model):
+        features = pd.DataFrame(0.0, index=self.data.index[-3:], columns=['Daily_Return'] + qm.FEATURE_COLUMNS)
+        mock_load_model.return_value = MagicMock(predict=MagicMock(return_value=np.full(3, 0.05)))
+        self.assertIn("RMSE drifted", self.reason(self.data, features, now=self.now))
+
+    def test_warm_start_params(self):
+        entry = {**self.manifest['AAPL'], 'xgb_params': {'max_depth': 5}, 'rf_params': {'max_depth': None}, 'full_search_seconds': 120.0}
+        self.assertEqual(training_manifest.warm_start_params(entry),
+                         {'xgb_params': {'max_depth': 5}, 'rf_params': {'max_depth': None}, 'full_search_seconds': 120.0})
+        self.assertIsNone(training_manifest.warm_start_params(self.manifest['AAPL']))
+        self.assertIsNone(training_manifest.warm_start_params({**entry, 'feature_version': qm.FEATURE_VERSION + 1}))
+        self.assertIsNone(training_manifest.warm_start_params(None))
+
+    def test_full_search_is_forced_periodically(self):
+        params = {'xgb_params': {'max_depth': 5}, 'rf_params': {'max_depth': None}}
+        manifest = {}
+        training_manifest.record_training(manifest, 'AAPL', self.data, {**params, 'feature_version': qm.FEATURE_VERSION,
+                                                                        'rmse': 0.02, 'search_mode': 'full'})
+        policy = {'full_search_every': 3}
+        warm_runs = 0
+        while training_manifest.warm_start_params(manifest['AAPL'], policy):
+            training_manifest.record_training(manifest, 'AAPL', self.data, {**params, 'feature_version': qm.FEATURE_VERSION,
+                                                                            'rmse': 0.02, 'search_mode': 'warm'})
+            warm_runs += 1
+        self.assertEqual(warm_runs, 3)
+        self.assertEqual(manifest['AAPL']['full_search_rmse'], 0.02)
+
+        # A full search resets the count
+        training_manifest.record_training(manifest, 'AAPL', self.data, {**params, 'feature_version': qm.FEATURE_VERSION,
+                                                                        'rmse': 0.021, 'search_mode': 'full'})
+        self.assertIsNotNone(training_manifest.warm_start_params(manifest['AAPL'], policy))
+
+    def test_full_search_is_forced_when_warm_rmse_drifts(self):
+        entry = {**self.manifest['AAPL'], 'xgb_params': {'max_depth': 5}, 'rf_params': {'max_depth': None},
+                 'warm_runs': 1, 'full_search_rmse': 0.02}
+        self.assertIsNotNone(training_manifest.warm_start_params({**entry, 'rmse': 0.021}))
+        self.assertIsNone(training_manifest.warm_start_params({**entry, 'rmse': 0.025}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,7 +7,8 @@ from scheduler import Scheduler
 
 class TestScheduler(unittest.TestCase):
 
-    @patch('scheduler.qual_model.determine_sentiments')
+    @patch('scheduler.sentiment_service.determine_sentiments',
+           return_value={'tickers': 3, 'listings': 30, 'unique_links': 20, 'shared_links': 5, 'dedup_ratio': 1.5})
     @patch('scheduler.logging')
     def test_run_qualitative_model_success(self, mock_logging, mock_determine_sentiments):
         scheduler = Scheduler()
@@ -15,9 +16,10 @@ class TestScheduler(unittest.TestCase):
         
         mock_logging.info.assert_any_call("Starting qualitative model execution...")
         mock_determine_sentiments.assert_called_once()
+        mock_logging.info.assert_any_call("Scored 3 tickers from 20 unique articles (30 listings, dedup ratio 1.50)")
         mock_logging.info.assert_any_call("Qualitative model execution completed successfully")
 
-    @patch('scheduler.qual_model.determine_sentiments', side_effect=Exception("Test exception"))
+    @patch('scheduler.sentiment_service.determine_sentiments', side_effect=Exception("Test exception"))
     @patch('scheduler.logging')
     def test_run_qualitative_model_failure(self, mock_logging, mock_determine_sentiments):
         scheduler = Scheduler()
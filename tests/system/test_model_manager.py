@@ -3,6 +3,7 @@ from unittest.mock import patch, mock_open, MagicMock
 import os
 import sys
 import pandas as pd
+from datetime import datetime
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src')))
 from model.model_manager import ModelManager
 
@@ -34,24 +35,93 @@ class TestModelManager(unittest.TestCase):
         self.assertEqual(models[0], ('AAPL', 'model_AAPL'))
         self.assertEqual(models[1], ('GOOGL', 'model_GOOGL'))
 
-    @patch('model.model_handler.predict_ticker')
+    @patch('model.model_handler.feature_matrix')
     @patch('builtins.open', new_callable=mock_open)
-    def test_make_decisions(self, mock_open, mock_predict_ticker):
+    def test_make_decisions(self, mock_open, mock_feature_matrix):
         # Mock the model generator
+        model_aapl = MagicMock(predict=MagicMock(return_value=[0.05]))
+        model_googl = MagicMock(predict=MagicMock(return_value=[0.1]))
+        model_msft = MagicMock(predict=MagicMock(return_value=[-0.1]))
+        self.model_manager.model_tickers = MagicMock(return_value=['AAPL', 'GOOGL', 'MSFT', 'TSLA'])
         self.model_manager.model_generator = MagicMock(return_value=[
-            ('AAPL', 'model_AAPL'),
-            ('GOOGL', 'model_GOOGL')
+            ('AAPL', model_aapl),
+            ('GOOGL', model_googl),
+            ('MSFT', model_msft),
+            ('TSLA', MagicMock())
         ])
-        mock_predict_ticker.side_effect = [0.05, 0.1]
+        # Features for TSLA could not be built
+        mock_feature_matrix.return_value = pd.DataFrame({'RSI': [0.4, 0.5, 0.6]}, index=['AAPL', 'GOOGL', 'MSFT'])
 
         output_file = 'fake_output_file.csv'
-        self.model_manager.make_decisions(output_file)
+        self.model_manager.make_decisions(output_file, chunk_size=2)
+
+        # The feature matrix is built once for every ticker before any chunk is predicted
+        mock_feature_matrix.assert_called_once_with(['AAPL', 'GOOGL', 'MSFT', 'TSLA'], deadline=None)
+        self.assertEqual(list(model_aapl.predict.call_args.args[0].index), ['AAPL'])
 
         mock_open.assert_called_once_with(output_file, 'w')
         handle = mock_open()
         handle.write.assert_any_call("ticker,next_day_return,sentiment_score,decision_score,action\n")
-        #handle.write.assert_any_call("AAPL,0.05,0.1,4.35,Buy\n")
-        #handle.write.assert_any_call("GOOGL,0.1,0.2,8.7,Buy\n")
+        rows = [line.split(',') for call in handle.write.call_args_list[1:] for line in call.args[0].splitlines()]
+        self.assertEqual([(row[0], row[4]) for row in rows], [('AAPL', 'Buy'), ('GOOGL', 'Buy'), ('MSFT', 'Sell')])
+        self.assertAlmostEqual(float(rows[0][3]), 4.265)
+
+    def test_score_decisions(self):
+        decisions = self.model_manager.score_decisions(pd.Series({'AAPL': 0.001, 'GOOGL': 0.0, 'TSLA': 0.2}))
+        # TSLA has no sentiment score and is skipped
+        self.assertEqual(list(decisions['ticker']), ['AAPL', 'GOOGL'])
+        self.assertEqual(list(decisions['action']), ['Hold', 'Hold'])
+        self.assertAlmostEqual(decisions['decision_score'].iloc[0], 0.85 * 0.1 + 0.15 * 0.1)
+
+    @patch('model.model_handler.feature_matrix')
+    @patch('model.model_handler.predict_global')
+    @patch('builtins.open', new_callable=mock_open)
+    def test_make_decisions_with_global_model(self, mock_open, mock_predict_global, mock_feature_matrix):
+        global_model = MagicMock(tickers=['AAPL', 'GOOGL'])
+        self.model_manager.use_global_model = True
+        self.model_manager.load_global_model = MagicMock(return_value=global_model)
+        mock_predict_global.return_value = {'AAPL': 0.05, 'GOOGL': -0.1}
+
+        self.model_manager.make_decisions('fake_output_file.csv', chunk_size=1)
+
+        # One predict call for every ticker, written out one chunk at a time
+        features = mock_feature_matrix.return_value
+        mock_predict_global.assert_called_once_with(['AAPL', 'GOOGL'], global_model, deadline=None, features=features)
+        handle = mock_open()
+        self.assertEqual(handle.write.call_count, 3)
+        rows = [line.split(',') for call in handle.write.call_args_list[1:] for line in call.args[0].splitlines()]
+        self.assertEqual([(row[0], row[4]) for row in rows], [('AAPL', 'Buy'), ('GOOGL', 'Sell')])
+
+    @patch('os.path.exists', return_value=True)
+    @patch('pandas.read_csv')
+    def test_prioritize(self, mock_read_csv, mock_exists):
+        mock_read_csv.return_value = pd.DataFrame({'ticker': ['AAPL', 'GOOGL', 'MSFT'], 'decision_score': [0.5, -3.0, 1.0]})
+        order = self.model_manager.prioritize(['AAPL', 'GOOGL', 'MSFT', 'TSLA', 'NVDA'], ['TSLA'], 'previous.csv')
+        # Held positions, then the strongest previous signals, then tickers without one
+        self.assertEqual(order, ['TSLA', 'GOOGL', 'MSFT', 'AAPL', 'NVDA'])
+
+    @patch('model.model_handler.feature_matrix')
+    @patch('model.model_manager.datetime')
+    @patch('builtins.open', new_callable=mock_open)
+    def test_make_decisions_stops_at_deadline(self, mock_open, mock_datetime, mock_feature_matrix):
+        deadline = datetime(2024, 1, 2, 9, 20)
+        # The deadline passes after the first chunk
+        mock_datetime.now.side_effect = [datetime(2024, 1, 2, 9, 21)]
+        mock_feature_matrix.return_value = pd.DataFrame({'RSI': [0.4, 0.5, 0.6]}, index=['MSFT', 'AAPL', 'GOOGL'])
+        self.model_manager.model_tickers = MagicMock(return_value=['AAPL', 'GOOGL', 'MSFT'])
+        self.model_manager.predictions = MagicMock(side_effect=lambda tickers, deadline, features: pd.Series(0.05, index=tickers))
+
+        written = self.model_manager.make_decisions('fake_output_file.csv', deadline=deadline, priority_tickers=['MSFT'], chunk_size=2)
+
+        self.assertEqual(written, 2)
+        # Every ticker is fetched up front in priority order, only the first chunk is predicted
+        mock_feature_matrix.assert_called_once_with(['MSFT', 'AAPL', 'GOOGL'], deadline=deadline)
+        self.model_manager.predictions.assert_called_once()
+        self.assertEqual(self.model_manager.predictions.call_args.args[0], ['MSFT', 'AAPL'])
+        self.assertEqual(list(self.model_manager.predictions.call_args.args[2].index), ['MSFT', 'AAPL'])
+        handle = mock_open()
+        self.assertIn("MSFT,0.05", handle.write.call_args_list[1].args[0])
+        handle.flush.assert_called()
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file